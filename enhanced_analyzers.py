@@ -1,170 +1,68 @@
 """Enhanced issue detection and analysis functionality - Phase 1"""
 
-from typing import List, Dict, Set
+from typing import Iterator, List, Dict, Set, Optional, Tuple
 from datetime import datetime
 from models import (
-    Customer, PaymentPlan, CustomerIssue, IssueSeverity, ErrorType,
+    Customer, CustomerIssue, IssueSeverity, ErrorType,
     DataQualityReport
 )
+from invoice_store import InvoiceView
+from invoice_table import InvoiceTable
+from issue_rules import IssueRule, find_plan_issues
+from result_index import InvoiceIssueIndex, ResultIndex, worst_severity
+
+# Invoices per InvoiceTable when plans are spilled to an invoice store, so only
+# one batch of their Invoice objects is loaded at a time
+SPILLED_BATCH_INVOICES = 20000
 
 class EnhancedIssueAnalyzer:
     """Enhanced analyzer supporting multiple plans and comprehensive error detection"""
     
-    def __init__(self):
+    def __init__(self, rules: Optional[List[IssueRule]] = None):
         self.issues = []
+        self.issues_by_customer = {}
         self.quality_metrics = {}
+        self.rules = rules  # Plan checks to run; None runs every registered rule
+        self.index = ResultIndex({}, {})  # Lookups over the last analysis
         
-    def analyze_customer(self, customer: Customer) -> List[CustomerIssue]:
+    def analyze_customer(self, customer: Customer, as_of: Optional[datetime] = None) -> List[CustomerIssue]:
         """Analyze a customer with potentially multiple payment plans"""
+        return self.record_issues(customer, *self.find_issues([customer], as_of)[0])
+    
+    def find_issues(self, customers: List[Customer],
+                    as_of: Optional[datetime] = None) -> List[Tuple[List[List[CustomerIssue]], List[CustomerIssue]]]:
+        """Issues of each customer - per plan, and customer-level - without recording them on the plans
+        
+        The plan checks run as issue rules over one InvoiceTable of all the
+        customers, so each check is a handful of array operations per analysis.
+        Customers whose plans are spilled to an invoice store are checked in
+        batches of about SPILLED_BATCH_INVOICES invoices instead. Invoices
+        dated after `as_of` (default now) are future-dated.
+        """
+        as_of = as_of or datetime.now()
+        found = []
+        for batch in _table_batches(customers):
+            table = InvoiceTable.from_customers(batch)
+            plans = [plan for customer in batch for plan in customer.payment_plans]
+            plan_issues = iter(find_plan_issues(table, plans, as_of, self.rules))
+            found.extend(([next(plan_issues) for _ in customer.payment_plans],
+                          self._analyze_customer_level_issues(customer))
+                         for customer in batch)
+        return found
+    
+    @staticmethod
+    def record_issues(customer: Customer, plan_issues: List[List[CustomerIssue]],
+                       customer_level_issues: List[CustomerIssue]) -> List[CustomerIssue]:
+        """Update each plan's issue status; returns all of the customer's issues, plan issues first"""
         customer_issues = []
+        for plan, issues in zip(customer.payment_plans, plan_issues):
+            customer_issues.extend(issues)
+            plan.has_issues = len(issues) > 0
+            plan.issues = issues
         
-        # Analyze each payment plan separately
-        for plan in customer.payment_plans:
-            plan_issues = self._analyze_payment_plan(plan)
-            customer_issues.extend(plan_issues)
-            
-            # Update plan's issue status
-            plan.has_issues = len(plan_issues) > 0
-            plan.issues = plan_issues
-        
-        # Analyze customer-level issues
-        customer_level_issues = self._analyze_customer_level_issues(customer)
         customer_issues.extend(customer_level_issues)
-        
         return customer_issues
     
-    def _analyze_payment_plan(self, plan: PaymentPlan) -> List[CustomerIssue]:
-        """Analyze a single payment plan for issues"""
-        plan_issues = []
-        
-        # Check for no payment terms
-        if plan.monthly_amount == 0 or plan.frequency.value == 'undefined':
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.NO_PAYMENT_TERMS,
-                severity=IssueSeverity.CRITICAL,
-                description=f'Plan {plan.plan_id}: No payment terms specified',
-                affected_invoices=[inv.invoice_number for inv in plan.invoices],
-                impact=f'Cannot calculate payment schedule for ${plan.total_open:,.2f} balance',
-                suggested_fix='Add payment amount and frequency to FOB field',
-                field_name='FOB',
-                current_value=plan.payment_terms_raw
-            ))
-        
-        # Check for future dates
-        today = datetime.now()
-        future_invoices = []
-        for inv in plan.invoices:
-            if inv.date and inv.date > today:
-                future_invoices.append(inv.invoice_number)
-                
-        if future_invoices:
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.FUTURE_DATED,
-                severity=IssueSeverity.WARNING,
-                description=f'Plan {plan.plan_id}: Has future-dated invoices',
-                affected_invoices=future_invoices,
-                impact='Payment calculations may be incorrect',
-                suggested_fix='Verify invoice dates and correct if needed',
-                field_name='Date'
-            ))
-        
-        # Check for asterisk in invoice numbers
-        asterisk_invoices = [inv.invoice_number for inv in plan.invoices if '*' in inv.invoice_number]
-        if asterisk_invoices:
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.ASTERISK_INVOICE,
-                severity=IssueSeverity.INFO,
-                description=f'Plan {plan.plan_id}: Invoice numbers contain asterisk (*)',
-                affected_invoices=asterisk_invoices,
-                impact='May indicate special handling required',
-                suggested_fix='Review if asterisk notation is intentional'
-            ))
-        
-        # Check for missing invoice numbers
-        missing_num_invoices = []
-        for i, inv in enumerate(plan.invoices):
-            if not inv.invoice_number or inv.invoice_number.strip() == '':
-                missing_num_invoices.append(f'Invoice {i+1}')
-                
-        if missing_num_invoices:
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.MISSING_INVOICE_NUMBERS,
-                severity=IssueSeverity.INFO,
-                description=f'Plan {plan.plan_id}: {len(missing_num_invoices)} invoices have no invoice number',
-                affected_invoices=missing_num_invoices,
-                impact='May complicate tracking specific invoices',
-                suggested_fix='Add unique invoice numbers',
-                field_name='Num'
-            ))
-        
-        # Check for missing class fields
-        missing_class_invoices = [inv.invoice_number for inv in plan.invoices if not inv.class_field]
-        if missing_class_invoices:
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.MISSING_CLASS,
-                severity=IssueSeverity.WARNING,
-                description=f'Plan {plan.plan_id}: {len(missing_class_invoices)} invoices missing class designation',
-                affected_invoices=missing_class_invoices,
-                impact='Cannot filter or categorize these invoices properly',
-                suggested_fix='Add class designation (BR, TSA, KL, etc.)',
-                field_name='Class'
-            ))
-        
-        # Check for invalid amounts
-        invalid_amount_invoices = []
-        for inv in plan.invoices:
-            if inv.open_balance < 0 or inv.original_amount < 0:
-                invalid_amount_invoices.append(inv.invoice_number)
-        
-        if invalid_amount_invoices:
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.INVALID_AMOUNT,
-                severity=IssueSeverity.CRITICAL,
-                description=f'Plan {plan.plan_id}: Invoices with negative amounts',
-                affected_invoices=invalid_amount_invoices,
-                impact='Negative amounts will cause calculation errors',
-                suggested_fix='Correct negative amounts or review invoice entries',
-                field_name='Amount/Open Balance'
-            ))
-        
-        # Check if open balance > original amount (impossible scenario)
-        impossible_balance_invoices = []
-        for inv in plan.invoices:
-            if inv.open_balance > inv.original_amount and inv.original_amount > 0:
-                impossible_balance_invoices.append(inv.invoice_number)
-        
-        if impossible_balance_invoices:
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.INVALID_AMOUNT,
-                severity=IssueSeverity.CRITICAL,
-                description=f'Plan {plan.plan_id}: Open balance exceeds original amount',
-                affected_invoices=impossible_balance_invoices,
-                impact='Impossible balance scenario - data error',
-                suggested_fix='Review and correct amount fields',
-                field_name='Open Balance vs Amount'
-            ))
-        
-        # Check for nested customer
-        if plan.is_nested:
-            plan_issues.append(CustomerIssue(
-                customer_name=plan.customer_name,
-                issue_type=ErrorType.NESTED_CUSTOMER,
-                severity=IssueSeverity.WARNING,
-                description=f'Plan {plan.plan_id}: Nested under {plan.parent_customer}',
-                affected_invoices=[],
-                impact='May need to be combined with parent customer',
-                suggested_fix='Decide if this should be merged with parent customer'
-            ))
-        
-        return plan_issues
-    
     def _analyze_customer_level_issues(self, customer: Customer) -> List[CustomerIssue]:
         """Analyze issues at the customer level (across all plans)"""
         customer_issues = []
@@ -210,14 +108,35 @@ class EnhancedIssueAnalyzer:
         
         return customer_issues
     
-    def analyze_all_customers(self, customers: Dict[str, Customer]) -> Dict[str, List[Customer]]:
-        """Analyze all customers and categorize them"""
+    def analyze_all_customers(self, customers: Dict[str, Customer],
+                              reuse: Optional[Dict[str, List[CustomerIssue]]] = None,
+                              found: Optional[Dict[str, Tuple]] = None,
+                              as_of: Optional[datetime] = None) -> Dict[str, List[Customer]]:
+        """Analyze all customers and categorize them
+        
+        `reuse` maps customers whose plans (and plan issues) are unchanged since an
+        earlier analysis to the issues found then; those are not analyzed again.
+        `found` maps customers to what find_issues already returned for them,
+        e.g. in worker processes; only their plans' issue status is updated.
+        """
         clean_customers = []
         problematic_customers = []
         self.issues = []
+        self.issues_by_customer = {}
+        reuse = reuse or {}
+        found = found or {}
+        
+        to_analyze = [customer for customer_name, customer in customers.items()
+                      if customer_name not in reuse and customer_name not in found]
+        fresh = iter(self.find_issues(to_analyze, as_of))
         
         for customer_name, customer in customers.items():
-            customer_issues = self.analyze_customer(customer)
+            if customer_name in reuse:
+                customer_issues = reuse[customer_name]
+            else:
+                customer_issues = self.record_issues(customer, *(found[customer_name] if customer_name in found
+                                                                  else next(fresh)))
+            self.issues_by_customer[customer_name] = customer_issues
             
             if customer_issues:
                 problematic_customers.append(customer)
@@ -225,6 +144,8 @@ class EnhancedIssueAnalyzer:
             else:
                 clean_customers.append(customer)
         
+        self.index = ResultIndex(customers, self.issues_by_customer)
+        
         return {
             'clean': clean_customers,
             'problematic': problematic_customers
@@ -232,25 +153,19 @@ class EnhancedIssueAnalyzer:
     
     def get_issue_summary(self) -> Dict[str, int]:
         """Get summary count of issues by type"""
-        issue_counts = {}
-        for issue in self.issues:
-            issue_type = issue.issue_type.value
-            issue_counts[issue_type] = issue_counts.get(issue_type, 0) + 1
-        return issue_counts
+        return {issue_type.value: len(issues) for issue_type, issues in self.index.issues_by_type.items()}
     
     def get_critical_issues(self) -> List[CustomerIssue]:
         """Get only critical issues"""
-        return [issue for issue in self.issues if issue.severity == IssueSeverity.CRITICAL]
+        return list(self.index.issues_by_severity.get(IssueSeverity.CRITICAL, []))
     
     def get_issues_by_customer(self, customer_name: str) -> List[CustomerIssue]:
         """Get all issues for a specific customer"""
-        return [issue for issue in self.issues if issue.customer_name == customer_name]
+        return list(self.index.issues_by_customer.get(customer_name, []))
     
     def get_issues_by_class(self, class_filter: str) -> List[CustomerIssue]:
-        """Get issues filtered by class"""
-        # This would need customer data to filter properly
-        # For now, return all issues - will enhance in reporting phase
-        return self.issues
+        """Get issues filtered by class (plan issues by the plan's class, customer issues by the customer's classes)"""
+        return list(self.index.issues_by_class.get(class_filter, []))
     
     def get_typo_report(self) -> List[Dict]:
         """Generate report of all typos found"""
@@ -269,10 +184,17 @@ class EnhancedIssueAnalyzer:
     def generate_error_highlight_data(self, customers: Dict[str, Customer]) -> List[Dict]:
         """Generate data for error highlighting in downloadable reports"""
         error_highlights = []
+        if customers is self.index.customers:
+            invoice_issues = self.index.invoice_issues
+        else:
+            invoice_issues = InvoiceIssueIndex(customers, {})  # Plan issues are read off the plans
         
         for customer_name, customer in customers.items():
             for plan in customer.payment_plans:
                 for invoice in plan.invoices:
+                    # Issues found on this plan that list this specific invoice
+                    issues = invoice_issues.plan_issues(plan.plan_id, invoice.invoice_number) if plan.issues else []
+                    severity = worst_severity(issues)
                     highlight_data = {
                         'customer_name': customer_name,
                         'plan_id': plan.plan_id,
@@ -282,23 +204,34 @@ class EnhancedIssueAnalyzer:
                         'original_amount': invoice.original_amount,
                         'open_balance': invoice.open_balance,
                         'class_field': invoice.class_field,
-                        'errors': [],
-                        'highlight_fields': []
+                        'errors': [{
+                            'type': issue.issue_type.value,
+                            'severity': issue.severity.value,
+                            'description': issue.description,
+                            'field': issue.field_name
+                        } for issue in issues],
+                        'highlight_fields': [issue.field_name for issue in issues if issue.field_name],
+                        'worst_severity': severity.value if severity else None
                     }
                     
-                    # Check for errors in this specific invoice
-                    for issue in plan.issues:
-                        if invoice.invoice_number in issue.affected_invoices:
-                            highlight_data['errors'].append({
-                                'type': issue.issue_type.value,
-                                'severity': issue.severity.value,
-                                'description': issue.description,
-                                'field': issue.field_name
-                            })
-                            
-                            if issue.field_name:
-                                highlight_data['highlight_fields'].append(issue.field_name)
-                    
                     error_highlights.append(highlight_data)
         
-        return error_highlights
\ No newline at end of file
+        return error_highlights
+
+
+def _table_batches(customers: List[Customer]) -> Iterator[List[Customer]]:
+    """All customers at once, or batches of whole customers when any plan is spilled to a store"""
+    if not any(isinstance(plan.invoices, InvoiceView) for customer in customers for plan in customer.payment_plans):
+        yield customers
+        return
+    
+    batch, invoice_count = [], 0
+    for customer in customers:
+        customer_invoices = sum(len(plan.invoices) for plan in customer.payment_plans)
+        if batch and invoice_count + customer_invoices > SPILLED_BATCH_INVOICES:
+            yield batch
+            batch, invoice_count = [], 0
+        batch.append(customer)
+        invoice_count += customer_invoices
+    if batch:
+        yield batch
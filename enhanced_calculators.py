@@ -7,8 +7,10 @@ from typing import Optional, List, Dict
 import math
 from models import (
     Customer, PaymentPlan, PaymentMetrics, CustomerStatus, 
-    PaymentFrequency, PaymentRoadmapEntry
+    PaymentFrequency, PaymentRoadmap, PaymentRoadmapEntry
 )
+from metrics_engine import PlanMetricsEngine, portfolio_rollup
+from plan_schedule import plan_schedule
 
 class EnhancedPaymentCalculator:
     """Enhanced calculator with fixed logical issues"""
@@ -17,41 +19,50 @@ class EnhancedPaymentCalculator:
         # Payment date is always 15th of month
         self.payment_day = 15
         
-    def calculate_customer_metrics(self, customer: Customer) -> List[PaymentMetrics]:
-        """Calculate metrics for all payment plans for a customer"""
+    def calculate_customer_metrics(self, customer: Customer, as_of: Optional[datetime] = None) -> List[PaymentMetrics]:
+        """Calculate metrics for all payment plans for a customer, as of a date (default now)"""
         all_metrics = []
+        as_of = as_of or datetime.now()
         
         for plan in customer.payment_plans:
             if not plan.has_issues and plan.monthly_amount > 0:
-                metrics = self.calculate_plan_metrics(plan)
+                metrics = self.calculate_plan_metrics(plan, as_of)
                 if metrics:
                     all_metrics.append(metrics)
         
         return all_metrics
     
-    def calculate_plan_metrics(self, plan: PaymentPlan) -> Optional[PaymentMetrics]:
-        """Calculate payment metrics for a single payment plan - FIXED VERSION"""
+    def calculate_metrics_by_customer(self, customers: List[Customer],
+                                      as_of: Optional[datetime] = None) -> Dict[str, List[PaymentMetrics]]:
+        """calculate_customer_metrics of many customers, by name, from one PlanMetricsEngine pass"""
+        as_of = as_of or datetime.now()
+        metrics_by_customer = {customer.customer_name: [] for customer in customers}
+        engine = PlanMetricsEngine.from_customers(customers)
+        for metrics in engine.payment_metrics(as_of):
+            metrics_by_customer[metrics.customer_name].append(metrics)
+        return metrics_by_customer
+    
+    def calculate_plan_metrics(self, plan: PaymentPlan, as_of: Optional[datetime] = None) -> Optional[PaymentMetrics]:
+        """Calculate payment metrics for a single payment plan - FIXED VERSION
+        
+        Every date involved - months elapsed, completion, roadmap - is taken
+        relative to `as_of` (default now), so metrics for a fixed date are
+        reproducible.
+        """
         if plan.has_issues or plan.monthly_amount == 0:
             return None
+        as_of = as_of or datetime.now()
         
         # FIXED: Always use whole numbers for months (rounded up)
         if plan.earliest_date:
-            # Calculate months elapsed from earliest invoice date
-            days_elapsed = (datetime.now() - plan.earliest_date).days
-            months_elapsed_decimal = days_elapsed / 30.44  # Average days per month
-            months_elapsed = math.ceil(months_elapsed_decimal)  # ALWAYS round up
-            
-            # FIXED: Calculate expected payments based on frequency and actual time
-            expected_payments = self._calculate_expected_payments(plan, months_elapsed)
-            
-            # FIXED: Calculate actual payments more accurately
-            actual_payments = plan.total_original - plan.total_open
-            
-            # FIXED: Payment difference calculation
-            payment_difference = actual_payments - expected_payments
-            
-            # FIXED: Months behind calculation (always whole numbers)
-            months_behind = self._calculate_months_behind(plan, payment_difference)
+            # Months elapsed, expected and actual payments and months behind
+            # (always whole numbers) come from the plan's shared schedule
+            schedule = plan_schedule(plan, as_of)
+            months_elapsed = schedule.months_elapsed
+            expected_payments = schedule.expected_payments
+            actual_payments = schedule.actual_payments
+            payment_difference = schedule.payment_difference
+            months_behind = schedule.months_behind
             
             # FIXED: More accurate percentage calculation considering time
             percent_paid = self._calculate_percent_paid(plan, months_elapsed)
@@ -65,10 +76,10 @@ class EnhancedPaymentCalculator:
                 status = CustomerStatus.CURRENT
             
             # FIXED: Project completion using 15th of month
-            months_remaining, projected_completion = self._calculate_completion(plan)
+            months_remaining, projected_completion = self._calculate_completion(plan, as_of)
             
             # Generate payment roadmap
-            roadmap = self._generate_payment_roadmap(plan, months_remaining)
+            roadmap = self._generate_payment_roadmap(plan, months_remaining, as_of)
             
             return PaymentMetrics(
                 customer_name=plan.customer_name,
@@ -92,49 +103,6 @@ class EnhancedPaymentCalculator:
         
         return None
     
-    def _calculate_expected_payments(self, plan: PaymentPlan, months_elapsed: int) -> float:
-        """Calculate expected payments based on frequency and time elapsed"""
-        if plan.frequency == PaymentFrequency.MONTHLY:
-            # Expected one payment per month
-            return months_elapsed * plan.monthly_amount
-        elif plan.frequency == PaymentFrequency.QUARTERLY:
-            # Expected one payment every 3 months
-            quarterly_periods = months_elapsed // 3
-            return quarterly_periods * plan.monthly_amount
-        elif plan.frequency == PaymentFrequency.BIMONTHLY:
-            # Expected one payment every 2 months
-            bimonthly_periods = months_elapsed // 2
-            return bimonthly_periods * plan.monthly_amount
-        else:
-            return 0.0
-    
-    def _calculate_months_behind(self, plan: PaymentPlan, payment_difference: float) -> int:
-        """Calculate months behind - FIXED to return whole numbers only"""
-        if payment_difference >= 0:  # Not behind
-            return 0
-        
-        deficit = abs(payment_difference)
-        
-        if plan.monthly_amount <= 0:
-            return 0
-        
-        # Calculate months behind based on payment deficit
-        if plan.frequency == PaymentFrequency.MONTHLY:
-            months_behind_decimal = deficit / plan.monthly_amount
-        elif plan.frequency == PaymentFrequency.QUARTERLY:
-            # For quarterly, each missed payment represents 3 months
-            payments_behind = deficit / plan.monthly_amount
-            months_behind_decimal = payments_behind * 3
-        elif plan.frequency == PaymentFrequency.BIMONTHLY:
-            # For bimonthly, each missed payment represents 2 months
-            payments_behind = deficit / plan.monthly_amount
-            months_behind_decimal = payments_behind * 2
-        else:
-            months_behind_decimal = deficit / plan.monthly_amount
-        
-        # ALWAYS return whole numbers (rounded up)
-        return math.ceil(months_behind_decimal)
-    
     def _calculate_percent_paid(self, plan: PaymentPlan, months_elapsed: int) -> float:
         """Calculate percentage paid considering time elapsed - FIXED VERSION"""
         if plan.total_original <= 0:
@@ -160,191 +128,66 @@ class EnhancedPaymentCalculator:
         # Return the actual percentage paid (not relative to expected)
         return basic_percent
     
-    def _calculate_completion(self, plan: PaymentPlan) -> tuple[int, Optional[datetime]]:
+    def _calculate_completion(self, plan: PaymentPlan, as_of: datetime) -> tuple[int, Optional[datetime]]:
         """Calculate completion timeline - FIXED to use 15th of month"""
         if plan.monthly_amount <= 0 or plan.total_open <= 0:
             return 0, None
         
-        # Calculate remaining payments needed
-        payments_remaining = math.ceil(plan.total_open / plan.monthly_amount)
-        
-        # Convert to months based on frequency
-        if plan.frequency == PaymentFrequency.MONTHLY:
-            months_remaining = payments_remaining
-        elif plan.frequency == PaymentFrequency.QUARTERLY:
-            months_remaining = payments_remaining * 3
-        elif plan.frequency == PaymentFrequency.BIMONTHLY:
-            months_remaining = payments_remaining * 2
-        else:
-            months_remaining = payments_remaining
+        # Remaining payments, converted to months by the payment interval
+        months_remaining = plan_schedule(plan, as_of).months_remaining
         
         # FIXED: Project completion to 15th of target month
         if months_remaining > 0:
-            target_date = datetime.now().replace(day=self.payment_day)
-            # Add months
-            for _ in range(months_remaining):
-                if target_date.month == 12:
-                    target_date = target_date.replace(year=target_date.year + 1, month=1)
-                else:
-                    target_date = target_date.replace(month=target_date.month + 1)
-            
-            projected_completion = target_date
+            target_month = as_of.month - 1 + months_remaining
+            projected_completion = as_of.replace(year=as_of.year + target_month // 12, month=target_month % 12 + 1,
+                                                 day=self.payment_day)
         else:
             projected_completion = None
         
         return months_remaining, projected_completion
     
-    def _generate_payment_roadmap(self, plan: PaymentPlan, months_remaining: int) -> List[Dict]:
-        """Generate payment roadmap using 15th of month - FIXED VERSION"""
-        roadmap = []
+    def _generate_payment_roadmap(self, plan: PaymentPlan, months_remaining: int, as_of: datetime) -> PaymentRoadmap:
+        """Generate payment roadmap using 15th of month - FIXED VERSION
         
+        The roadmap starts on this month's payment day and lists its entries
+        only when they are read.
+        """
         if plan.monthly_amount <= 0 or months_remaining <= 0:
-            return roadmap
-        
-        current_balance = plan.total_open
-        current_date = datetime.now().replace(day=self.payment_day)
-        
-        # Determine payment interval in months
-        if plan.frequency == PaymentFrequency.MONTHLY:
-            interval_months = 1
-        elif plan.frequency == PaymentFrequency.QUARTERLY:
-            interval_months = 3
-        elif plan.frequency == PaymentFrequency.BIMONTHLY:
-            interval_months = 2
-        else:
-            interval_months = 1
-        
-        payment_number = 1
-        max_payments = 60  # Limit to 5 years
-        
-        while current_balance > 0 and payment_number <= max_payments:
-            # Calculate payment amount (final payment may be less)
-            payment_amount = min(plan.monthly_amount, current_balance)
-            
-            # Add entry to roadmap
-            roadmap_entry = {
-                'payment_number': payment_number,
-                'date': current_date.strftime('%Y-%m-%d'),
-                'expected_payment': round(payment_amount, 2),
-                'remaining_balance': round(current_balance - payment_amount, 2),
-                'is_overdue': current_date < datetime.now(),
-                'description': f'Payment {payment_number} - {plan.frequency.value}'
-            }
-            
-            roadmap.append(roadmap_entry)
-            
-            # Update for next iteration
-            current_balance -= payment_amount
-            payment_number += 1
-            
-            # Move to next payment date
-            for _ in range(interval_months):
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
-        
-        return roadmap
+            return PaymentRoadmap()
+        
+        return PaymentRoadmap(
+            start=as_of.replace(day=self.payment_day),
+            interval_months=plan_schedule(plan, as_of).interval_months,
+            amount=plan.monthly_amount,
+            balance=plan.total_open,
+            frequency=plan.frequency.value,
+            as_of=as_of
+        )
     
     def calculate_portfolio_metrics(self, all_metrics: List[PaymentMetrics]) -> Dict:
-        """Calculate aggregate metrics - FIXED VERSION"""
+        """Calculate aggregate metrics - FIXED VERSION
+        
+        The rollups are grouped reductions over the metrics' columns; totals
+        match what folding each plan into a PortfolioAggregate gives.
+        """
         if not all_metrics:
             return self._empty_portfolio_metrics()
-        
-        # Group by customer to avoid double counting
-        customers_by_status = {}
-        plans_by_class = {}
-        plans_by_frequency = {}
-        
-        total_outstanding = sum(m.total_owed for m in all_metrics)
-        expected_monthly = 0
-        total_behind_amount = 0  # FIXED: Track actual behind amount
-        
-        for metric in all_metrics:
-            # Track plans by class
-            class_key = metric.class_field or 'Unknown'
-            if class_key not in plans_by_class:
-                plans_by_class[class_key] = {'count': 0, 'total_owed': 0}
-            plans_by_class[class_key]['count'] += 1
-            plans_by_class[class_key]['total_owed'] += metric.total_owed
-            
-            # Track plans by frequency
-            freq_key = metric.frequency
-            if freq_key not in plans_by_frequency:
-                plans_by_frequency[freq_key] = {'count': 0, 'total_owed': 0}
-            plans_by_frequency[freq_key]['count'] += 1
-            plans_by_frequency[freq_key]['total_owed'] += metric.total_owed
-            
-            # Calculate expected monthly (normalize all to monthly)
-            if metric.frequency == 'monthly':
-                expected_monthly += metric.monthly_payment
-            elif metric.frequency == 'quarterly':
-                expected_monthly += metric.monthly_payment / 3
-            elif metric.frequency == 'bimonthly':
-                expected_monthly += metric.monthly_payment / 2
-            
-            # FIXED: Calculate behind amount (capped at total owed)
-            if metric.status == CustomerStatus.BEHIND:
-                # Payment deficit should never exceed total owed
-                deficit = min(abs(metric.payment_difference), metric.total_owed)
-                total_behind_amount += deficit
-            
-            # Track customer status (use worst status per customer)
-            customer_key = metric.customer_name
-            current_status = customers_by_status.get(customer_key, CustomerStatus.CURRENT)
-            
-            if metric.status == CustomerStatus.BEHIND or current_status == CustomerStatus.BEHIND:
-                customers_by_status[customer_key] = CustomerStatus.BEHIND
-            elif metric.status == CustomerStatus.COMPLETED and current_status == CustomerStatus.CURRENT:
-                customers_by_status[customer_key] = CustomerStatus.COMPLETED
-            elif current_status == CustomerStatus.CURRENT:
-                customers_by_status[customer_key] = metric.status
-        
-        # Count customers by status
-        status_counts = {
-            CustomerStatus.CURRENT: 0,
-            CustomerStatus.BEHIND: 0,
-            CustomerStatus.COMPLETED: 0
-        }
-        
-        for status in customers_by_status.values():
-            status_counts[status] += 1
-        
-        # Calculate average months behind for behind customers
-        behind_metrics = [m for m in all_metrics if m.status == CustomerStatus.BEHIND]
-        average_months_behind = (sum(m.months_behind for m in behind_metrics) / len(behind_metrics) 
-                               if behind_metrics else 0)
-        
-        return {
-            'total_customers': len(customers_by_status),
-            'total_plans': len(all_metrics),
-            'total_outstanding': total_outstanding,
-            'expected_monthly': expected_monthly,
-            'customers_current': status_counts[CustomerStatus.CURRENT],
-            'customers_behind': status_counts[CustomerStatus.BEHIND], 
-            'customers_completed': status_counts[CustomerStatus.COMPLETED],
-            'average_months_behind': math.ceil(average_months_behind),  # FIXED: Whole number
-            'total_behind_amount': total_behind_amount,  # FIXED: Capped amount
-            'percentage_behind': (status_counts[CustomerStatus.BEHIND] / len(customers_by_status) * 100) if customers_by_status else 0,
-            'plans_by_class': plans_by_class,
-            'plans_by_frequency': plans_by_frequency
-        }
+        return portfolio_rollup(all_metrics)
     
     def _empty_portfolio_metrics(self) -> Dict:
         """Return empty portfolio metrics"""
-        return {
-            'total_customers': 0,
-            'total_plans': 0,
-            'total_outstanding': 0,
-            'expected_monthly': 0,
-            'customers_current': 0,
-            'customers_behind': 0,
-            'customers_completed': 0,
-            'average_months_behind': 0,
-            'total_behind_amount': 0,
-            'plans_by_class': {},
-            'plans_by_frequency': {}
-        }
+        return PortfolioAggregate().to_dict()
+    
+    def metrics_as_of_key(self, customer: Customer, now: Optional[datetime] = None) -> tuple:
+        """Everything about "now" that calculate_customer_metrics depends on for this customer
+        
+        Metrics computed under an equal key are the same apart from the time of
+        day carried in projected_completion, so they can be reused.
+        """
+        now = now or datetime.now()
+        months_elapsed = tuple(plan_schedule(plan, now).months_elapsed for plan in customer.payment_plans)
+        # Roadmaps start on this month's payment day, overdue only from the day after it
+        return (now.year, now.month, now.day > self.payment_day, months_elapsed)
     
     def prioritize_collections(self, all_metrics: List[PaymentMetrics]) -> List[PaymentMetrics]:
         """Prioritize customers for collections - FIXED VERSION"""
@@ -361,4 +204,107 @@ class EnhancedPaymentCalculator:
             capped_difference = min(abs(metric.payment_difference), metric.total_owed)
             return (-metric.months_behind, -metric.total_owed, -capped_difference)
         
-        return sorted(behind_customers, key=sort_key)
\ No newline at end of file
+        return sorted(behind_customers, key=sort_key)
+
+
+class PortfolioAggregate:
+    """Running portfolio totals that plans can be added to and removed from
+    
+    calculate_portfolio_metrics folds every plan in; incremental runs keep the
+    previous aggregate and only remove/add the plans of changed customers.
+    """
+    
+    def __init__(self):
+        self.total_plans = 0
+        self.total_outstanding = 0
+        self.expected_monthly = 0
+        self.total_behind_amount = 0  # FIXED: Track actual behind amount
+        self.behind_plans = 0
+        self.behind_months = 0
+        self.plans_by_class = {}
+        self.plans_by_frequency = {}
+        self.customer_statuses = {}  # Customer -> {status: plan count}
+    
+    def add(self, metric: PaymentMetrics):
+        """Fold one plan's metrics into the totals"""
+        self._apply(metric, 1)
+    
+    def remove(self, metric: PaymentMetrics):
+        """Take back a plan previously passed to add()"""
+        self._apply(metric, -1)
+    
+    def _apply(self, metric: PaymentMetrics, sign: int):
+        self.total_plans += sign
+        self.total_outstanding += sign * metric.total_owed
+        
+        # Track plans by class and by frequency
+        self._bucket(self.plans_by_class, metric.class_field or 'Unknown', metric.total_owed, sign)
+        self._bucket(self.plans_by_frequency, metric.frequency, metric.total_owed, sign)
+        
+        # Calculate expected monthly (normalize all to monthly)
+        if metric.frequency == 'monthly':
+            self.expected_monthly += sign * metric.monthly_payment
+        elif metric.frequency == 'quarterly':
+            self.expected_monthly += sign * (metric.monthly_payment / 3)
+        elif metric.frequency == 'bimonthly':
+            self.expected_monthly += sign * (metric.monthly_payment / 2)
+        
+        # FIXED: Calculate behind amount (capped at total owed)
+        if metric.status == CustomerStatus.BEHIND:
+            # Payment deficit should never exceed total owed
+            self.total_behind_amount += sign * min(abs(metric.payment_difference), metric.total_owed)
+            self.behind_plans += sign
+            self.behind_months += sign * metric.months_behind
+        
+        # Track plan statuses per customer (worst status wins in to_dict)
+        statuses = self.customer_statuses.setdefault(metric.customer_name, {})
+        statuses[metric.status] = statuses.get(metric.status, 0) + sign
+        if statuses[metric.status] == 0:
+            del statuses[metric.status]
+        if not statuses:
+            del self.customer_statuses[metric.customer_name]
+    
+    @staticmethod
+    def _bucket(buckets: Dict, key, total_owed: float, sign: int):
+        if key not in buckets:
+            buckets[key] = {'count': 0, 'total_owed': 0}
+        buckets[key]['count'] += sign
+        buckets[key]['total_owed'] += sign * total_owed
+        if buckets[key]['count'] == 0:
+            del buckets[key]
+    
+    def to_dict(self) -> Dict:
+        """Portfolio metrics in the calculate_portfolio_metrics format"""
+        # Count customers by status (use worst status per customer)
+        status_counts = {
+            CustomerStatus.CURRENT: 0,
+            CustomerStatus.BEHIND: 0,
+            CustomerStatus.COMPLETED: 0
+        }
+        for statuses in self.customer_statuses.values():
+            if CustomerStatus.BEHIND in statuses:
+                status_counts[CustomerStatus.BEHIND] += 1
+            elif CustomerStatus.COMPLETED in statuses:
+                status_counts[CustomerStatus.COMPLETED] += 1
+            else:
+                status_counts[CustomerStatus.CURRENT] += 1
+        
+        total_customers = len(self.customer_statuses)
+        
+        # Calculate average months behind for behind plans
+        average_months_behind = self.behind_months / self.behind_plans if self.behind_plans else 0
+        
+        return {
+            'total_customers': total_customers,
+            'total_plans': self.total_plans,
+            'total_outstanding': self.total_outstanding,
+            'expected_monthly': self.expected_monthly,
+            'customers_current': status_counts[CustomerStatus.CURRENT],
+            'customers_behind': status_counts[CustomerStatus.BEHIND],
+            'customers_completed': status_counts[CustomerStatus.COMPLETED],
+            'average_months_behind': math.ceil(average_months_behind),  # FIXED: Whole number
+            'total_behind_amount': self.total_behind_amount,  # FIXED: Capped amount
+            'percentage_behind': (status_counts[CustomerStatus.BEHIND] / total_customers * 100) if total_customers else 0,
+            'plans_by_class': {key: dict(bucket) for key, bucket in self.plans_by_class.items()},
+            'plans_by_frequency': {key: dict(bucket) for key, bucket in self.plans_by_frequency.items()}
+        }
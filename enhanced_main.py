@@ -1,110 +1,363 @@
 """Enhanced main orchestration for payment plan analysis - Phase 1"""
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from datetime import datetime
+import copy
+import io
+import logging
+import os
+import pickle
 import sys
 import pandas as pd
 
 # Import enhanced modules
-from enhanced_parsers import EnhancedPaymentPlanParser
+from enhanced_parsers import EnhancedPaymentPlanParser, PARSER_VERSION, DEFAULT_CHUNK_ROWS
+from ingestion import is_workbook
 from enhanced_analyzers import EnhancedIssueAnalyzer
-from enhanced_calculators import EnhancedPaymentCalculator
+from enhanced_calculators import EnhancedPaymentCalculator, PortfolioAggregate
 from enhanced_reporters import EnhancedReportGenerator
 from payment_projections import PaymentProjectionCalculator
+from snapshots import ParseCache, paused_gc, read_snapshot, write_snapshot
+from incremental import AnalysisState, CustomerRecord, customer_fingerprint
+from invoice_store import SQLiteInvoiceStore
+from result_index import ResultIndex
+from metrics_engine import PlanMetricsEngine, month_ends
+from models import Customer, RawRowStore
+
+logger = logging.getLogger(__name__)
+
+# Fewer rows than this per worker and process start-up outweighs the parse
+MIN_SECTION_ROWS = 20000
+
+# Customers per analysis worker batch; with fewer than two batches analysis stays serial
+ANALYSIS_BATCH_CUSTOMERS = 5000
+
+
+def _parse_file(csv_path: str, parse_mode: str, chunksize: int, reference_date: datetime) -> EnhancedPaymentPlanParser:
+    """Parse one export in a worker process; the parser comes back with its customers and errors"""
+    parser = EnhancedPaymentPlanParser(parse_mode=parse_mode, reference_date=reference_date)
+    if chunksize or is_workbook(csv_path):
+        parser.parse_streaming(csv_path, chunksize or DEFAULT_CHUNK_ROWS)
+    else:
+        parser.load_csv(csv_path)
+        parser.parse_customers()
+    
+    # Invoices keep their source rows in raw_rows; the full frame is not sent back
+    parser.raw_data = None
+    return parser
+
+
+def _parse_section(frame: pd.DataFrame, parse_mode: str, reference_date: datetime) -> bytes:
+    """Parse one run of customer sections from EnhancedPaymentPlanParser.split_sections in a worker process
+    
+    The parser comes back already pickled so _load_parsed can unpickle it with
+    garbage collection paused.
+    """
+    parser = EnhancedPaymentPlanParser(parse_mode=parse_mode, reference_date=reference_date)
+    parser.raw_data = frame
+    parser.total_rows_processed = len(frame)
+    parser.parse_customers()
+    
+    parser.raw_data = None
+    return pickle.dumps(parser, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_parsed(payload: bytes) -> EnhancedPaymentPlanParser:
+    """Unpickle a worker's parser in the parent process
+    
+    With the collector running, rebuilding tens of thousands of customers,
+    plans and invoices would serialize a large part of the parallel parse in
+    the parent.
+    """
+    with paused_gc():
+        return pickle.loads(payload)
+
+
+class _BatchPickler(pickle.Pickler):
+    """Pickles customers for an analysis worker without the source rows their invoices point into"""
+    
+    def persistent_id(self, obj):
+        return 'raw_rows' if isinstance(obj, RawRowStore) else None
+
+
+class _BatchUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return None  # Workers never read source rows
+
+
+def _dump_batch(customers: List[Customer]) -> bytes:
+    buffer = io.BytesIO()
+    _BatchPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(customers)
+    return buffer.getvalue()
+
+
+def _analyze_batch(payload: bytes, as_of: datetime) -> bytes:
+    """Find the issues of a batch of customers in a worker process, and the metrics of its clean customers
+    
+    Returns (plan issues, customer-level issues, metrics or None) per customer,
+    pickled, in batch order; both are evaluated as of the parent's analysis date.
+    """
+    customers = _BatchUnpickler(io.BytesIO(payload)).load()
+    analyzer = EnhancedIssueAnalyzer()
+    calculator = EnhancedPaymentCalculator()
+    
+    found = analyzer.find_issues(customers, as_of)
+    clean = [customer for customer, issues in zip(customers, found) if not analyzer.record_issues(customer, *issues)]
+    metrics = calculator.calculate_metrics_by_customer(clean, as_of)
+    
+    results = [(plan_issues, customer_level_issues, metrics.get(customer.customer_name))
+               for customer, (plan_issues, customer_level_issues) in zip(customers, found)]
+    return pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)
 
 
 class EnhancedPaymentPlanAnalysisSystem:
     """Enhanced system orchestrating all components with multi-plan support"""
     
-    def __init__(self, output_dir: str = './reports'):
-        self.parser = EnhancedPaymentPlanParser()
+    def __init__(self, output_dir: str = './reports', parse_mode: str = 'vectorized', quiet: bool = False,
+                 parse_cache: ParseCache = None, incremental: bool = False, previous_state: AnalysisState = None,
+                 invoice_store: SQLiteInvoiceStore = None, as_of: datetime = None):
+        self.parser = EnhancedPaymentPlanParser(parse_mode=parse_mode, reference_date=as_of, invoice_store=invoice_store)
         self.analyzer = EnhancedIssueAnalyzer()
         self.calculator = EnhancedPaymentCalculator()
         self.reporter = EnhancedReportGenerator(output_dir)
+        self.quiet = quiet  # Skip the console summary (web app); progress still goes to logging
+        self.parse_cache = parse_cache  # Parsed exports by content hash; None disables caching
+        self.invoice_store = invoice_store  # Plan invoices spilled to disk; None keeps them in memory
+        self.as_of = as_of  # Date issues, metrics and projections are evaluated at; None uses the time of each run
+        
+        # Incremental mode only rebuilds customers whose invoices changed since analysis_state.
+        # Spilled invoices live in a store replaced with the next upload, so they are never carried over
+        self.incremental = incremental and invoice_store is None
+        self.analysis_state = previous_state if self.incremental else None
+        self._fingerprints = {}
         self.results = None
         
-    def analyze_file(self, csv_path: str, class_filter: str = None) -> Dict:
-        """Run complete enhanced analysis on a CSV file"""
+    def analyze_file(self, csv_path: str, class_filter: str = None, chunksize: int = None,
+                     max_workers: int = 1, batch_size: int = None) -> Dict:
+        """Run complete enhanced analysis on a CSV file or .xlsx workbook
         
-        print("\n" + "="*80)
-        print("ENHANCED PAYMENT PLAN ANALYSIS SYSTEM")
-        print("="*80 + "\n")
+        Passing chunksize streams the export in chunks of that many rows instead
+        of loading the whole file into memory; workbooks are always streamed.
+        Otherwise max_workers above 1 splits a large export at customer total
+        rows and parses the pieces in worker processes. max_workers above 1
+        also spreads issue analysis and metrics over worker processes in
+        batches of batch_size customers (ANALYSIS_BATCH_CUSTOMERS by default)
+        once there are at least two batches. Progress is reported through the
+        module logger, one summary record per stage.
+        """
+        
+        logger.info("ENHANCED PAYMENT PLAN ANALYSIS SYSTEM - %s", csv_path)
+        
+        # Step 1: Load and parse data (only unpaid invoices), unless this exact file was parsed before
+        if self.incremental:
+            state = self._previous_state()
+            self.parser.reusable_customers = {
+                name: (record.fingerprint, record.customer) for name, record in state.records.items()
+            } if state else {}
+        
+        cache_key = None
+        if self.parse_cache is not None and self.invoice_store is None:
+            try:
+                cache_key = self._parse_cache_key(csv_path)
+                snapshot = self.parse_cache.get(cache_key)
+            except OSError as e:
+                logger.error("❌ Error loading file: %s", e)
+                return None
+            
+            if snapshot is not None:
+                customers = self.parser.restore_snapshot(snapshot)
+                logger.info("♻️  Parse cache hit - reusing parsed results for %s", csv_path)
+                return self._run_analysis(customers, class_filter, max_workers, batch_size)
+        
+        if chunksize or is_workbook(csv_path):
+            chunksize = chunksize or DEFAULT_CHUNK_ROWS
+            logger.info("📂 Streaming %s in chunks of %d rows...",
+                        "Excel workbook" if is_workbook(csv_path) else "CSV file", chunksize)
+            try:
+                customers = self.parser.parse_streaming(csv_path, chunksize)
+                logger.info("✅ File streamed successfully")
+            except Exception as e:
+                logger.error("❌ Error loading file: %s", e)
+                return None
+        else:
+            logger.info("📂 Loading CSV file...")
+            try:
+                self.parser.load_csv(csv_path)
+                logger.info("✅ File loaded successfully")
+            except Exception as e:
+                logger.error("❌ Error loading file: %s", e)
+                return None
+            
+            logger.info("📊 Parsing customer data (focusing on unpaid invoices only)...")
+            parts = min(max_workers or os.cpu_count() or 1, len(self.parser.raw_data) // MIN_SECTION_ROWS)
+            if self.invoice_store is not None:
+                parts = 1  # Worker processes cannot write to this process's store
+            sections = self.parser.split_sections(self.parser.raw_data, parts) if parts > 1 else []
+            if len(sections) > 1:
+                customers = self._parse_sections(sections)
+            else:
+                customers = self.parser.parse_customers()
+        
+        if cache_key is not None:
+            size = self.parse_cache.put(cache_key, self.parser.to_snapshot())
+            logger.info("💾 Cached parsed results (%.1f MB)", size / 1e6)
+        
+        return self._run_analysis(customers, class_filter, max_workers, batch_size)
+    
+    def _parse_sections(self, sections: List[pd.DataFrame]) -> Dict:
+        """Parse section runs of one export in worker processes and merge the results"""
+        reference_date = self.parser.reference_date or datetime.now()
+        logger.info("🧩 Parsing %d sections of %d-%d rows with %d worker processes...", len(sections),
+                    min(len(s) for s in sections), max(len(s) for s in sections), len(sections))
+        with ProcessPoolExecutor(max_workers=len(sections)) as executor:
+            parsed = [_load_parsed(payload) for payload in executor.map(
+                _parse_section, sections, [self.parser.parse_mode] * len(sections), [reference_date] * len(sections))]
+        return self.parser.merge_parsed(parsed)
+    
+    def _parse_cache_key(self, csv_path: str) -> str:
+        """Content hash plus parser version and the day future dates are checked against"""
+        as_of = (self.parser.reference_date or datetime.now()).strftime('%Y%m%d')
+        return self.parse_cache.key_for_file(csv_path, f"v{PARSER_VERSION}-{as_of}")
+    
+    def analyze_files(self, csv_paths: List[str], class_filter: str = None, chunksize: int = None,
+                      max_workers: int = None, batch_size: int = None) -> Dict:
+        """Run complete enhanced analysis over several exports (e.g. one per class)
         
-        # Step 1: Load and parse data (only unpaid invoices)
-        print("📂 Loading CSV file...")
+        Each file is parsed in its own worker process, then the customers are
+        merged - plans of a customer that appears in several files are combined -
+        and analysis, metrics and reports run once over the merged set, in
+        worker batches as in analyze_file.
+        """
+        csv_paths = list(csv_paths)
+        if not csv_paths:
+            raise ValueError("No CSV files given")
+        
+        logger.info("ENHANCED PAYMENT PLAN ANALYSIS SYSTEM - %d files", len(csv_paths))
+        
+        # Every file is checked against the same "today"
+        reference_date = self.parser.reference_date or datetime.now()
+        parse_args = (self.parser.parse_mode, chunksize, reference_date)
+        workers = min(len(csv_paths), max_workers or os.cpu_count() or 1)
+        
+        # Step 1: Parse each file (only unpaid invoices), in parallel when there are several
+        logger.info("📂 Parsing %d CSV files with %d worker processes...", len(csv_paths), workers)
         try:
-            self.parser.load_csv(csv_path)
-            print("✅ File loaded successfully")
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    parsed = list(executor.map(_parse_file, csv_paths,
+                                               *[[arg] * len(csv_paths) for arg in parse_args]))
+            else:
+                parsed = [_parse_file(csv_path, *parse_args) for csv_path in csv_paths]
         except Exception as e:
-            print(f"❌ Error loading file: {str(e)}")
+            logger.error("❌ Error loading file: %s", e)
             return None
         
-        print("\n📊 Parsing customer data (focusing on unpaid invoices only)...")
-        customers = self.parser.parse_customers()
+        customers = self.parser.merge_parsed(parsed)
+        return self._run_analysis(customers, class_filter, max_workers, batch_size)
+    
+    def _run_analysis(self, customers: Dict, class_filter: str = None, max_workers: int = 1,
+                      batch_size: int = None) -> Dict:
+        """Steps 2-5 shared by analyze_file and analyze_files: issues, metrics, reports"""
         total_plans = sum(len(c.payment_plans) for c in customers.values())
         customers_with_multiple_plans = sum(1 for c in customers.values() if c.has_multiple_plans)
         
-        print(f"✅ Found {len(customers)} customers with {total_plans} payment plans")
-        print(f"   📋 {customers_with_multiple_plans} customers have multiple payment plans")
+        logger.info("✅ Found %d customers with %d payment plans (%d with multiple plans)",
+                    len(customers), total_plans, customers_with_multiple_plans)
         
         # Show data quality summary
         if self.parser.data_quality_report:
             report = self.parser.data_quality_report
-            print(f"   📊 Processed {report.total_invoices_processed} invoices")
-            print(f"   💰 {report.total_invoices_with_open_balance} with open balances")
-            print(f"   ✅ {report.total_invoices_ignored} paid invoices ignored")
-            print(f"   🏷️  Classes found: {', '.join(report.classes_found)}")
-        
-        # Step 2: Analyze data quality
-        print("\n🔍 Analyzing data quality...")
-        categorized = self.analyzer.analyze_all_customers(customers)
+            logger.info("   📊 Processed %d invoices: %d with open balances, %d paid invoices ignored; classes found: %s",
+                        report.total_invoices_processed, report.total_invoices_with_open_balance,
+                        report.total_invoices_ignored, ', '.join(report.classes_found))
+        
+        terms_cache = self.parser.terms_normalizer.cache_info()
+        logger.info("   🧮 Payment terms cache: %d hits, %d misses (%.1f%% hit rate)",
+                    terms_cache['hits'], terms_cache['misses'], terms_cache['hit_rate'])
+        
+        # Step 2: Analyze data quality (incremental runs reuse unchanged customers' issues)
+        now = self.as_of or datetime.now()
+        unchanged = self._match_previous_customers(customers, now) if self.incremental else {}
+        reuse_issues = {
+            name: record.issues for name, record in unchanged.items()
+            if record.issues_valid_until is None or now < record.issues_valid_until
+        }
+        
+        logger.info("🔍 Analyzing data quality...")
+        found, batch_metrics = self._analyze_in_workers(
+            [customer for name, customer in customers.items() if name not in reuse_issues],
+            max_workers, batch_size or ANALYSIS_BATCH_CUSTOMERS, now)
+        categorized = self.analyzer.analyze_all_customers(customers, reuse=reuse_issues, found=found, as_of=now)
         clean_customers = categorized['clean']
         problematic_customers = categorized['problematic']
         
-        print(f"  ✅ Clean customers: {len(clean_customers)}")
-        print(f"  ⚠️  Problematic customers: {len(problematic_customers)}")
-        print(f"  📋 Total issues found: {len(self.analyzer.issues)}")
+        logger.info("  ✅ Clean customers: %d, ⚠️  problematic customers: %d, 📋 total issues found: %d",
+                    len(clean_customers), len(problematic_customers), len(self.analyzer.issues))
         
         # Show issue breakdown
         issue_summary = self.analyzer.get_issue_summary()
         if issue_summary:
-            print("\n  Issue types found:")
-            for issue_type, count in sorted(issue_summary.items(), key=lambda x: x[1], reverse=True):
-                print(f"    - {issue_type.replace('_', ' ').title()}: {count}")
+            logger.info("  Issue types found: %s", ', '.join(
+                f"{issue_type.replace('_', ' ').title()}: {count}"
+                for issue_type, count in sorted(issue_summary.items(), key=lambda x: x[1], reverse=True)))
+        
+        # Step 3: Calculate metrics for clean customers, all those not computed already in one pass
+        logger.info("💰 Calculating payment metrics...")
+        known_metrics = dict(batch_metrics)
+        metrics_keys = {}  # Customer -> as-of key its metrics are computed under
+        if self.incremental:
+            for customer in clean_customers:
+                name = customer.customer_name
+                metrics_keys[name] = self.calculator.metrics_as_of_key(customer, now)
+                record = unchanged.get(name)
+                if name in reuse_issues and record.metrics_key == metrics_keys[name]:
+                    known_metrics[name] = record.metrics
+        known_metrics.update(self.calculator.calculate_metrics_by_customer(
+            [customer for customer in clean_customers if customer.customer_name not in known_metrics], now))
         
-        # Step 3: Calculate metrics for clean customers
-        print("\n💰 Calculating payment metrics...")
         all_metrics = []
+        metrics_by_customer = {}  # Customer -> (plan metrics, as-of key they were computed under)
         for customer in clean_customers:
-            customer_metrics = self.calculator.calculate_customer_metrics(customer)
+            name = customer.customer_name
+            customer_metrics = known_metrics[name]
+            if self.incremental:
+                metrics_by_customer[name] = (customer_metrics, metrics_keys[name])
             all_metrics.extend(customer_metrics)
         
-        print(f"✅ Calculated metrics for {len(all_metrics)} payment plans")
-        print(f"   👥 Covering {len(set(m.customer_name for m in all_metrics))} customers")
+        logger.info("✅ Calculated metrics for %d payment plans covering %d customers",
+                    len(all_metrics), len(set(m.customer_name for m in all_metrics)))
         
         # Apply class filter if specified
         if class_filter:
             filtered_metrics = [m for m in all_metrics if m.class_field == class_filter]
-            print(f"🏷️  Filtered to {len(filtered_metrics)} plans in class '{class_filter}'")
+            logger.info("🏷️  Filtered to %d plans in class '%s'", len(filtered_metrics), class_filter)
             all_metrics = filtered_metrics
+        self.analyzer.index.add_metrics(all_metrics)
         
-        # Calculate portfolio metrics
-        portfolio_metrics = self.calculator.calculate_portfolio_metrics(all_metrics)
-        print(f"\n  Portfolio summary:")
-        print(f"    - Total customers tracked: {portfolio_metrics['total_customers']}")
-        print(f"    - Total plans tracked: {portfolio_metrics['total_plans']}")
-        print(f"    - Total tracked balance: ${portfolio_metrics['total_outstanding']:,.2f}")
-        print(f"    - Expected monthly: ${portfolio_metrics['expected_monthly']:,.2f}")
-        print(f"    - Customers behind: {portfolio_metrics['customers_behind']} ({portfolio_metrics['percentage_behind']:.1f}%)")
+        # Calculate portfolio metrics (patched from the previous run when incremental)
+        if self.incremental:
+            portfolio = self._update_portfolio(customers, metrics_by_customer, class_filter)
+            portfolio_metrics = portfolio.to_dict()
+            self.analysis_state = self._build_state(customers, metrics_by_customer, class_filter, portfolio, now)
+        else:
+            portfolio_metrics = self.calculator.calculate_portfolio_metrics(all_metrics)
+        logger.info("  Portfolio summary: %d customers, %d plans tracked, balance $%s, expected monthly $%s, "
+                    "%d customers behind (%.1f%%)",
+                    portfolio_metrics['total_customers'], portfolio_metrics['total_plans'],
+                    f"{portfolio_metrics['total_outstanding']:,.2f}", f"{portfolio_metrics['expected_monthly']:,.2f}",
+                    portfolio_metrics['customers_behind'], portfolio_metrics['percentage_behind'])
         
         # Show class breakdown
         if portfolio_metrics['plans_by_class']:
-            print(f"\n  Breakdown by class:")
-            for class_name, data in sorted(portfolio_metrics['plans_by_class'].items(), 
-                                         key=lambda x: x[1]['total_owed'], reverse=True):
-                print(f"    - {class_name}: {data['count']} plans, ${data['total_owed']:,.2f}")
+            logger.info("  Breakdown by class: %s", ', '.join(
+                f"{class_name}: {data['count']} plans, ${data['total_owed']:,.2f}"
+                for class_name, data in sorted(portfolio_metrics['plans_by_class'].items(),
+                                               key=lambda x: x[1]['total_owed'], reverse=True)))
         
         # Step 4: Generate enhanced reports
-        print("\n📝 Generating enhanced reports...")
+        logger.info("📝 Generating enhanced reports...")
         quality_report = self.reporter.generate_comprehensive_quality_report(
             customers, 
             clean_customers,
@@ -125,11 +378,13 @@ class EnhancedPaymentPlanAnalysisSystem:
             dashboard_data,
             self.analyzer.issues,
             all_metrics,
-            customers
+            customers,
+            self.analyzer.index.invoice_issues
         )
         
         # Step 5: Display enhanced summary
-        self._print_enhanced_summary(quality_report, dashboard_data, portfolio_metrics)
+        if not self.quiet:
+            self._print_enhanced_summary(quality_report, dashboard_data, portfolio_metrics)
         
         # Store results
         self.results = {
@@ -137,13 +392,185 @@ class EnhancedPaymentPlanAnalysisSystem:
             'dashboard_data': dashboard_data,
             'portfolio_metrics': portfolio_metrics,
             'timestamp': timestamp,
+            'as_of': now,
             'all_customers': customers,
             'all_metrics': all_metrics,
-            'data_quality_report': self.parser.data_quality_report
+            'data_quality_report': self.parser.data_quality_report,
+            'terms_cache': terms_cache
         }
         
         return self.results
     
+    def _analyze_in_workers(self, customers: List[Customer], max_workers: int, batch_size: int,
+                            as_of: datetime) -> Tuple[Dict[str, Tuple], Dict[str, List]]:
+        """Issues and clean customers' metrics, found in worker processes a batch of customers at a time
+        
+        Returns what EnhancedIssueAnalyzer.find_issues gives per customer and
+        the metrics of clean customers, both by name; both are empty when the
+        work stays in this process - fewer than two batches, one worker, plan
+        invoices spilled to a store, or an analyzer with its own rules (rules
+        are not sent to workers, which run the registered ones).
+        """
+        batches = [customers[start:start + batch_size] for start in range(0, len(customers), batch_size)]
+        workers = min(max_workers or os.cpu_count() or 1, len(customers) // batch_size)
+        if workers < 2 or self.invoice_store is not None or self.analyzer.rules is not None:
+            return {}, {}
+        
+        logger.info("🧩 Analyzing %d customers in %d batches with %d worker processes...",
+                    len(customers), len(batches), workers)
+        found, metrics = {}, {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            payloads = executor.map(_analyze_batch, map(_dump_batch, batches), [as_of] * len(batches))
+            for batch, payload in zip(batches, payloads):
+                with paused_gc():
+                    results = pickle.loads(payload)
+                for customer, (plan_issues, customer_level_issues, customer_metrics) in zip(batch, results):
+                    found[customer.customer_name] = (plan_issues, customer_level_issues)
+                    if customer_metrics is not None:
+                        metrics[customer.customer_name] = customer_metrics
+        return found, metrics
+    
+    def _previous_state(self) -> AnalysisState:
+        """The previous run's state when it can be built on, otherwise None"""
+        state = self.analysis_state
+        if state is None or state.parser_version != PARSER_VERSION:
+            return None
+        return state
+    
+    def _match_previous_customers(self, customers: Dict, now: datetime) -> Dict[str, CustomerRecord]:
+        """Records of customers whose invoices are unchanged since the previous run
+        
+        Those customers continue as the previous run's objects (the parser has
+        usually kept them already), with invoices pointed at this run's rows.
+        """
+        state = self._previous_state()
+        self._fingerprints = {
+            name: self.parser.customer_fingerprints.get(name) or customer_fingerprint(customer)
+            for name, customer in customers.items()
+        }
+        if state is None:
+            return {}
+        
+        unchanged = {}
+        for name, fingerprint in self._fingerprints.items():
+            record = state.records.get(name)
+            if record is None or record.fingerprint != fingerprint:
+                continue
+            
+            current = customers[name]
+            if current is not record.customer:
+                kept_invoices = [inv for plan in record.customer.payment_plans for inv in plan.invoices]
+                fresh_invoices = [inv for plan in current.payment_plans for inv in plan.invoices]
+                for kept, fresh in zip(kept_invoices, fresh_invoices):
+                    kept.row_index = fresh.row_index
+                    kept.raw_store = fresh.raw_store
+                customers[name] = record.customer
+            unchanged[name] = record
+        
+        removed = sum(1 for name in state.records if name not in customers)
+        logger.info("♻️  Incremental run: %d unchanged, %d changed or added, %d removed customers",
+                    len(unchanged), len(customers) - len(unchanged), removed)
+        return unchanged
+    
+    def _update_portfolio(self, customers: Dict, metrics_by_customer: Dict, class_filter: str = None) -> PortfolioAggregate:
+        """Portfolio aggregate for this run - the previous one patched for changed customers"""
+        def tracked(metrics):
+            return [m for m in metrics if not class_filter or m.class_field == class_filter]
+        
+        state = self._previous_state()
+        if state is None or state.portfolio is None or state.class_filter != class_filter:
+            portfolio = PortfolioAggregate()
+            for metrics, _ in metrics_by_customer.values():
+                for metric in tracked(metrics):
+                    portfolio.add(metric)
+            return portfolio
+        
+        portfolio = copy.deepcopy(state.portfolio)  # The previous state stays usable if this run fails
+        for name in set(state.records) | set(customers):
+            old_metrics = state.records[name].metrics if name in state.records else []
+            new_metrics = metrics_by_customer.get(name, ([], None))[0]
+            if old_metrics is new_metrics:
+                continue
+            for metric in tracked(old_metrics):
+                portfolio.remove(metric)
+            for metric in tracked(new_metrics):
+                portfolio.add(metric)
+        return portfolio
+    
+    def _build_state(self, customers: Dict, metrics_by_customer: Dict, class_filter: str,
+                     portfolio: PortfolioAggregate, now: datetime) -> AnalysisState:
+        """Everything the next incremental run needs from this one"""
+        records = {}
+        for name, customer in customers.items():
+            metrics, metrics_key = metrics_by_customer.get(name, ([], None))
+            records[name] = CustomerRecord(
+                fingerprint=self._fingerprints[name],
+                customer=customer,
+                issues=self.analyzer.issues_by_customer.get(name, []),
+                metrics=metrics,
+                metrics_key=metrics_key,
+                issues_valid_until=self._first_date_after(customer, now)
+            )
+        return AnalysisState(parser_version=PARSER_VERSION, as_of=now, class_filter=class_filter,
+                             records=records, portfolio=portfolio)
+    
+    @staticmethod
+    def _first_date_after(customer, now: datetime):
+        """Earliest invoice date later than `now` - when the customer's future-dated check next changes"""
+        if not customer.latest_date or customer.latest_date <= now:
+            return None
+        return min(inv.date for plan in customer.payment_plans for inv in plan.invoices if inv.date and inv.date > now)
+    
+    def save_results(self, path) -> int:
+        """Snapshot the full results of the last analysis to `path`; returns its size
+        
+        Customers with their plans and invoices, issues, metrics, the quality
+        report, dashboard data and the incremental state go into one
+        compressed pickle that load_results restores far faster than the
+        export can be analyzed again. Spilled invoices are written out in full.
+        """
+        if not self.results:
+            raise ValueError("No analysis results to save. Run analyze_file first.")
+        
+        return write_snapshot(path, {
+            'parser_version': PARSER_VERSION,
+            'results': self.results,
+            'parsed': self.parser.to_snapshot(),
+            'issues': self.analyzer.issues,
+            'issues_by_customer': self.analyzer.issues_by_customer,
+            'analysis_state': self.analysis_state,
+            'report_timestamp': self.reporter.timestamp
+        })
+    
+    def load_results(self, path) -> Dict:
+        """Restore results written by save_results instead of analyzing again"""
+        snapshot = read_snapshot(path)
+        if snapshot.get('parser_version') != PARSER_VERSION:
+            raise ValueError(f"Results snapshot is from parser version {snapshot.get('parser_version')}, "
+                             f"expected {PARSER_VERSION}")
+        
+        self.parser.restore_snapshot(snapshot['parsed'])
+        self.analyzer.issues = snapshot['issues']
+        self.analyzer.issues_by_customer = snapshot['issues_by_customer']
+        self.reporter.timestamp = snapshot['report_timestamp']
+        if self.incremental:
+            self.analysis_state = snapshot['analysis_state']
+        self.results = snapshot['results']
+        self.analyzer.index = ResultIndex(self.results['all_customers'], self.analyzer.issues_by_customer)
+        self.analyzer.index.add_metrics(self.results['all_metrics'])
+        
+        logger.info("♻️  Restored results for %d customers from %s", len(self.results['all_customers']), path)
+        return self.results
+    
+    @property
+    def index(self) -> ResultIndex:
+        """Lookups over the current results: customers, plans, issues and metrics by key"""
+        return self.analyzer.index
+    
+    def customers_in_class(self, class_name: str) -> Dict:
+        """Customers with invoices in a class, by name, in analysis order"""
+        return {customer.customer_name: customer for customer in self.index.customers_by_class.get(class_name, [])}
+    
     def get_customer_details(self, customer_name: str) -> Dict:
         """Get detailed information for a specific customer"""
         if not self.results:
@@ -158,7 +585,7 @@ class EnhancedPaymentPlanAnalysisSystem:
             return None
         
         # Get metrics for this customer
-        customer_metrics = [m for m in self.results['all_metrics'] if m.customer_name == customer_name]
+        customer_metrics = self.index.metrics_by_customer.get(customer_name, [])
         
         return {
             'customer_info': {
@@ -177,8 +604,24 @@ class EnhancedPaymentPlanAnalysisSystem:
                 'has_issues': plan.has_issues,
                 'issues': [issue.to_dict() for issue in plan.issues]
             } for plan in customer.payment_plans],
-            'metrics': [m.__dict__ for m in customer_metrics],
-            'payment_roadmaps': [m.payment_roadmap for m in customer_metrics]
+            'metrics': [{f.name: getattr(m, f.name) for f in fields(m)} for m in customer_metrics],
+            'payment_roadmaps': [list(m.payment_roadmap) for m in customer_metrics]
+        }
+    
+    def get_payment_roadmap(self, plan_id: str, page: int = 1, page_size: int = 6) -> Dict:
+        """One page of a tracked plan's payment roadmap; only that page's entries are computed"""
+        metrics = self.index.metrics_by_plan.get(plan_id)
+        if metrics is None:
+            return None
+        
+        roadmap = metrics.payment_roadmap
+        return {
+            'plan_id': plan_id,
+            'customer_name': metrics.customer_name,
+            'page': page,
+            'page_size': page_size,
+            'total_payments': len(roadmap),
+            'payments': roadmap.page(page, page_size)
         }
     
     def get_customers_by_class(self, class_name: str) -> List[Dict]:
@@ -186,17 +629,15 @@ class EnhancedPaymentPlanAnalysisSystem:
         if not self.results:
             return []
         
-        customers = self.results['all_customers']
         class_customers = []
         
-        for customer in customers.values():
-            if class_name in customer.all_classes:
-                class_customers.append({
-                    'customer_name': customer.customer_name,
-                    'total_open_balance': customer.total_open_balance,
-                    'total_plans': len(customer.payment_plans),
-                    'has_issues': any(plan.has_issues for plan in customer.payment_plans)
-                })
+        for customer in self.index.customers_by_class.get(class_name, []):
+            class_customers.append({
+                'customer_name': customer.customer_name,
+                'total_open_balance': customer.total_open_balance,
+                'total_plans': len(customer.payment_plans),
+                'has_issues': any(plan.has_issues for plan in customer.payment_plans)
+            })
         
         return sorted(class_customers, key=lambda x: x['total_open_balance'], reverse=True)
     
@@ -207,7 +648,7 @@ class EnhancedPaymentPlanAnalysisSystem:
         
         metrics = self.results['all_metrics']
         if class_filter:
-            metrics = [m for m in metrics if m.class_field == class_filter]
+            metrics = self.index.metrics_by_class.get(class_filter, [])
         
         prioritized = self.calculator.prioritize_collections(metrics)
         
@@ -221,6 +662,22 @@ class EnhancedPaymentPlanAnalysisSystem:
             'recovery_scenarios': self.calculator.calculate_recovery_scenarios(m)
         } for m in prioritized[:20]]  # Top 20
     
+    def get_delinquency_trend(self, months: int = 24, class_filter: str = None) -> List[Dict]:
+        """Plans and customers behind at each of the last `months` month-ends
+        
+        Every tracked plan's schedule is evaluated at all the month-ends at once
+        against the balances of the analyzed export - no export is parsed or
+        analyzed again per date. Like the portfolio metrics, it covers the
+        plans of customers without issues.
+        """
+        if not self.results:
+            return []
+        
+        customers = [customer for name, customer in self.results['all_customers'].items()
+                     if not self.index.issues_by_customer.get(name)]
+        engine = PlanMetricsEngine.from_customers(customers, class_filter)
+        return engine.delinquency_trend(month_ends(self.results.get('as_of') or datetime.now(), months))
+    
     def export_for_excel(self, output_path: str = None, include_roadmaps: bool = True):
         """Export enhanced analysis results to Excel"""
         if not self.results:
@@ -358,18 +815,14 @@ class EnhancedPaymentPlanAnalysisSystem:
             return None
         
         try:
-            calculator = PaymentProjectionCalculator()
+            calculator = PaymentProjectionCalculator(self.results['as_of'])
             
             # Get customer data
             customers_data = self.results['all_customers']
             
             # Apply class filter if specified
             if class_filter:
-                filtered_customers = {}
-                for name, customer in customers_data.items():
-                    if class_filter in customer.all_classes:
-                        filtered_customers[name] = customer
-                customers_data = filtered_customers
+                customers_data = self.customers_in_class(class_filter)
             
             # Calculate projections
             projections = calculator.calculate_customer_projections(
@@ -415,7 +868,7 @@ class EnhancedPaymentPlanAnalysisSystem:
             return None
         
         try:
-            calculator = PaymentProjectionCalculator()
+            calculator = PaymentProjectionCalculator(self.results['as_of'])
             
             # Calculate projections for this customer only
             single_customer_data = {customer_name: customers[customer_name]}
@@ -661,17 +1114,19 @@ class EnhancedPaymentPlanAnalysisSystem:
 def main():
     """Enhanced main function for command line usage"""
     if len(sys.argv) < 2:
-        print("Usage: python enhanced_main.py <csv_file_path> [output_directory] [class_filter]")
+        print("Usage: python enhanced_main.py <csv_or_xlsx_file_path> [output_directory] [class_filter]")
         print("Example: python enhanced_main.py 'payment_plans.csv' './reports' 'BR'")
         sys.exit(1)
     
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    
     csv_path = sys.argv[1]
     output_dir = sys.argv[2] if len(sys.argv) > 2 else './reports'
     class_filter = sys.argv[3] if len(sys.argv) > 3 else None
     
-    # Create and run enhanced analysis
+    # Create and run enhanced analysis (large exports are parsed on every core)
     system = EnhancedPaymentPlanAnalysisSystem(output_dir)
-    results = system.analyze_file(csv_path, class_filter)
+    results = system.analyze_file(csv_path, class_filter, max_workers=None)
     
     if results:
         # Optionally export to Excel
@@ -1,59 +1,123 @@
 """Fixed CSV parsing functionality - Resolves customer attribution issues"""
 
+import logging
+import numpy as np
 import pandas as pd
 import re
+import warnings
 from typing import List, Tuple, Optional, Dict
 from datetime import datetime, date
 from models import (
     Invoice, PaymentPlan, Customer, PaymentFrequency, 
-    CustomerIssue, IssueSeverity, ErrorType, DataQualityReport
+    CustomerIssue, IssueSeverity, ErrorType, DataQualityReport, RawRowStore
 )
+from payment_terms import PaymentTermsNormalizer
+from ingestion import IngestionSchema, is_workbook
+from error_log import ErrorLog
+from incremental import invoice_fingerprint
+from invoice_table import InvoiceTable
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change alters what parsing produces; cached parse snapshots
+# from another version are never reused
+PARSER_VERSION = '5'
+
+# Rows per frame when streaming a large export
+DEFAULT_CHUNK_ROWS = 50000
+
+# Customers whose plans are built together from one InvoiceTable
+CUSTOMER_BATCH_SIZE = 8192
+
+# Rows classified at a time while looking for a section end to split at
+SECTION_SCAN_ROWS = 1024
+
+# Row classes used by the columnar attribution pass
+ROW_OTHER, ROW_INVOICE, ROW_HEADER, ROW_NESTED, ROW_TOTAL = range(5)
+
+# Error codes produced by the column parsers (0 means the cell parsed cleanly)
+AMOUNT_OK, AMOUNT_EXCEL_REF, AMOUNT_INVALID_CHARS, AMOUNT_UNPARSEABLE = range(4)
+DATE_OK, DATE_INVALID, DATE_FUTURE, DATE_FAR_FUTURE = range(4)
+
+AMOUNT_ERROR_MESSAGES = {
+    AMOUNT_EXCEL_REF: "Excel reference error",
+    AMOUNT_INVALID_CHARS: "Invalid characters in amount: {}",
+    AMOUNT_UNPARSEABLE: "Cannot parse amount: {}"
+}
+DATE_ERROR_MESSAGES = {
+    DATE_INVALID: "Invalid date format: {}",
+    DATE_FUTURE: "Future date: {}",
+    DATE_FAR_FUTURE: "Date far in future: {}"
+}
 
 class EnhancedPaymentPlanParser:
     """Fixed parser with correct customer attribution logic"""
     
-    def __init__(self):
+    PARSE_MODES = ('vectorized', 'iterrows')
+    
+    def __init__(self, parse_mode: str = 'vectorized', reference_date: Optional[datetime] = None,
+                 csv_engine: str = 'auto', invoice_store=None):
+        if parse_mode not in self.PARSE_MODES:
+            raise ValueError(f"Unknown parse mode '{parse_mode}'. Expected one of: {', '.join(self.PARSE_MODES)}")
+        
+        self.parse_mode = parse_mode
+        self.schema = IngestionSchema(engine=csv_engine)  # Columns read, dtypes, header checks
         self.raw_data = None
+        self.raw_rows = RawRowStore()  # Source rows of parsed invoices, read lazily
+        self.invoice_store = invoice_store  # invoice_store.SQLiteInvoiceStore to keep plan invoices on disk
         self.customers = {}
         self.data_quality_report = None
-        self.errors_found = []
+        self.errors_found = ErrorLog()
         self.total_rows_processed = 0
         self.total_invoices_ignored = 0
         
-        # Enhanced typo corrections
-        self.payment_term_corrections = {
-            'quaterly': 'quarterly',
-            'qtrly': 'quarterly',
-            'montly': 'monthly',
-            'monthl;y': 'monthly',
-            'bimonthly': 'bimonthly',
-            'bi-monthly': 'bimonthly',
-            'a month': 'monthly',
-            'month': 'monthly',
-            'per month': 'monthly'
-        }
+        # Incremental runs: customer -> (fingerprint, Customer) from the previous run
+        self.reusable_customers = None
+        self.customer_fingerprints = {}
+        self.reused_customers = 0
+        
+        # "Today" for future-date checks; fixed once per parse run unless given
+        self.reference_date = reference_date
+        self._run_date = None
+        
+        # Compiled, cached payment terms handling (typo corrections live there)
+        self.terms_normalizer = PaymentTermsNormalizer()
+        self.payment_term_corrections = self.terms_normalizer.corrections
         
     def load_csv(self, file_path: str) -> pd.DataFrame:
-        """Load CSV file with enhanced error tracking"""
+        """Load CSV file with enhanced error tracking
+        
+        Only the columns in the ingestion schema are read; a header missing any
+        required column is rejected before the body is parsed.
+        """
         try:
-            self.raw_data = pd.read_csv(file_path, header=0)
+            self.raw_data = self.schema.read_csv(file_path)
             self.total_rows_processed = len(self.raw_data)
         except Exception as e:
             raise ValueError(f"Failed to load CSV: {str(e)}")
         
-        # Standardize column names
-        column_mapping = {
-            'Unnamed: 0': '_0',
-            'Unnamed: 1': '_1', 
-            'Unnamed: 2': '_2',
-        }
-        
-        for old_col, new_col in column_mapping.items():
-            if old_col in self.raw_data.columns:
-                self.raw_data.rename(columns={old_col: new_col}, inplace=True)
-                
         return self.raw_data
     
+    def iter_csv_chunks(self, file_path: str, chunksize: int = DEFAULT_CHUNK_ROWS):
+        """Yield the CSV in frames of at most `chunksize` rows with standardized columns"""
+        try:
+            for chunk in self.schema.iter_csv(file_path, chunksize):
+                yield chunk
+        except Exception as e:
+            raise ValueError(f"Failed to load CSV: {str(e)}")
+    
+    def iter_xlsx_chunks(self, file_path: str, chunksize: int = DEFAULT_CHUNK_ROWS):
+        """Yield the first worksheet of an .xlsx export in frames shaped like iter_csv_chunks"""
+        try:
+            for chunk in self.schema.iter_xlsx(file_path, chunksize):
+                yield chunk
+        except Exception as e:
+            raise ValueError(f"Failed to load Excel workbook: {str(e)}")
+    
+    def _standardize_columns(self, frame: pd.DataFrame):
+        """Rename pandas' placeholder headers to the _0/_1/_2 names used by the parser"""
+        self.schema.standardize(frame)
+    
     def parse_amount(self, value) -> Tuple[float, Optional[str]]:
         """Convert amount with enhanced error tracking"""
         error = None
@@ -79,92 +143,391 @@ class EnhancedPaymentPlanParser:
     
     def parse_date(self, date_str) -> Tuple[Optional[datetime], Optional[str]]:
         """Parse date with enhanced validation"""
+        parsed_date, code = self._parse_date_code(date_str)
+        if code == DATE_OK:
+            return parsed_date, None
+        return parsed_date, DATE_ERROR_MESSAGES[code].format(date_str)
+    
+    def _parse_date_code(self, date_str) -> Tuple[Optional[datetime], int]:
+        """Scalar date parse returning a DATE_* code instead of a message"""
         if pd.isna(date_str):
-            return None, None
+            return None, DATE_OK
             
         try:
             parsed_date = pd.to_datetime(date_str)
             
             # Check for future dates (flag but don't reject)
-            current_date = datetime.now().date()
+            current_date = self._today()
             if parsed_date.date() > current_date:
                 days_in_future = (parsed_date.date() - current_date).days
                 if days_in_future > 365:
-                    return parsed_date, f"Date far in future: {date_str}"
+                    return parsed_date, DATE_FAR_FUTURE
                 else:
-                    return parsed_date, f"Future date: {date_str}"
+                    return parsed_date, DATE_FUTURE
             
-            return parsed_date, None
+            return parsed_date, DATE_OK
         except:
-            return None, f"Invalid date format: {date_str}"
+            return None, DATE_INVALID
+    
+    def _today(self) -> date:
+        """Reference day for future-date checks - one value for a whole parse run"""
+        return (self._run_date or self.reference_date or datetime.now()).date()
+    
+    def _start_run(self):
+        """Pin "today" so every row of this parse is checked against the same day"""
+        self._run_date = self.reference_date or datetime.now()
+        self.customer_fingerprints = {}
+        self.reused_customers = 0
+    
+    def parse_amount_column(self, values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """Column version of parse_amount - float amounts plus an AMOUNT_* code per cell
+        
+        Same rules as the scalar parser: blanks are 0, numbers pass through, text
+        has '$' and ',' stripped, and '#REF!', stray characters and unparseable
+        text are flagged.
+        """
+        amounts = np.zeros(len(values), dtype=float)
+        codes = np.full(len(values), AMOUNT_OK, dtype=np.int8)
+        if values.empty:
+            return amounts, codes
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            amounts[:] = values.fillna(0).to_numpy(dtype=float)
+            return amounts, codes
+        
+        raw = values.to_numpy(dtype=object)
+        present = values.notna().to_numpy()
+        is_number = present & np.fromiter((isinstance(v, (int, float)) for v in raw), dtype=bool, count=len(raw))
+        if is_number.any():
+            amounts[is_number] = raw[is_number].astype(float)
+        
+        is_text = present & ~is_number
+        if not is_text.any():
+            return amounts, codes
+        
+        # Object dtype keeps the .str methods on Python's re, like the scalar parser
+        text = pd.Series(raw[is_text], dtype=object).astype(str).astype(object)
+        text_values = text.to_numpy(dtype=object)
+        nonblank = text_values != ''
+        has_ref = text.str.contains('#REF!', regex=False).to_numpy(dtype=bool)
+        valid_chars = text.str.match(r'^[\d.,\s$-]+$').to_numpy(dtype=bool)
+        cleaned = (text.str.replace('$', '', regex=False)
+                       .str.replace(',', '', regex=False)
+                       .str.strip()
+                       .to_numpy(dtype=object))
+        
+        text_codes = np.where(has_ref, AMOUNT_EXCEL_REF,
+                              np.where(nonblank & ~valid_chars, AMOUNT_INVALID_CHARS, AMOUNT_OK)).astype(np.int8)
+        
+        to_parse = nonblank & ~has_ref & (cleaned != '')
+        parsed = np.zeros(len(text_values), dtype=float)
+        try:
+            parsed[to_parse] = cleaned[to_parse].astype(float)
+        except (ValueError, TypeError):
+            # Some cell is not a number - parse one at a time to find which
+            for i in np.flatnonzero(to_parse):
+                try:
+                    parsed[i] = float(cleaned[i])
+                except (ValueError, TypeError):
+                    text_codes[i] = AMOUNT_UNPARSEABLE
+        
+        amounts[is_text] = parsed
+        codes[is_text] = text_codes
+        return amounts, codes
+    
+    def parse_date_column(self, values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """Column version of parse_date - Timestamps (None when missing) plus a DATE_* code per cell
+        
+        The column goes through a single format-inferring to_datetime call; cells
+        that do not fit the inferred format fall back to the scalar parser.
+        """
+        dates = np.full(len(values), None, dtype=object)
+        codes = np.full(len(values), DATE_OK, dtype=np.int8)
+        if values.empty:
+            return dates, codes
+        
+        present = values.notna().to_numpy()
+        try:
+            with warnings.catch_warnings():
+                # "Could not infer format" - those cells are retried one by one below
+                warnings.simplefilter('ignore', UserWarning)
+                parsed = pd.to_datetime(values, errors='coerce')
+        except (ValueError, TypeError, OverflowError):
+            parsed = None
+        
+        if parsed is not None and pd.api.types.is_datetime64_dtype(parsed.dtype):
+            ok = present & parsed.notna().to_numpy()
+            if ok.any():
+                today = pd.Timestamp(self._today())
+                days_ahead = (parsed[ok].dt.normalize() - today).dt.days.to_numpy()
+                codes[ok] = np.where(days_ahead > 365, DATE_FAR_FUTURE,
+                                     np.where(days_ahead > 0, DATE_FUTURE, DATE_OK))
+                dates[ok] = parsed[ok].tolist()
+        else:
+            ok = np.zeros(len(values), dtype=bool)
+        
+        for i in np.flatnonzero(present & ~ok):
+            dates[i], codes[i] = self._parse_date_code(values.iat[i])
+        
+        return dates, codes
     
     def normalize_payment_terms(self, terms: str) -> Tuple[float, PaymentFrequency, List[str]]:
         """Enhanced payment terms parsing with better pattern recognition"""
-        issues_found = []
-        
-        if pd.isna(terms) or not terms:
-            return (0.0, PaymentFrequency.UNDEFINED, issues_found)
-        
-        original_terms = str(terms).strip()
-        terms_lower = original_terms.lower()
-        
-        # Check for typos and suggest corrections
-        for typo, correction in self.payment_term_corrections.items():
-            if typo in terms_lower and typo != correction:
-                issues_found.append({
-                    'original': original_terms,
-                    'typo': typo,
-                    'suggested': correction,
-                    'field': 'payment_terms',
-                    'type': 'typo'
-                })
-                terms_lower = terms_lower.replace(typo, correction)
-        
-        # Extract amount with improved regex
-        amount_match = re.search(r'(\d+(?:\.\d{2})?)', terms_lower)
-        amount = float(amount_match.group(1)) if amount_match else 0.0
-        
-        # Determine frequency
-        if any(term in terms_lower for term in ['bimonthly', 'bi-monthly']):
-            frequency = PaymentFrequency.BIMONTHLY
-        elif any(term in terms_lower for term in ['quarterly', 'qtrly']):
-            frequency = PaymentFrequency.QUARTERLY
-        elif any(term in terms_lower for term in ['monthly', 'month', 'per month', 'a month']):
-            frequency = PaymentFrequency.MONTHLY
-        else:
-            frequency = PaymentFrequency.UNDEFINED
-            if amount > 0:
-                issues_found.append({
-                    'original': original_terms,
-                    'issue': 'unclear_frequency',
-                    'suggested': 'Specify monthly, quarterly, or bimonthly',
-                    'field': 'payment_terms',
-                    'type': 'unclear_terms'
-                })
-            
-        return (amount, frequency, issues_found)
+        return self.terms_normalizer.parse_terms(terms)
     
-    def parse_customers(self) -> Dict[str, Customer]:
-        """FIXED customer parsing with proper invoice attribution"""
+    def parse_customers(self, parse_mode: Optional[str] = None) -> Dict[str, Customer]:
+        """FIXED customer parsing with proper invoice attribution
+
+        parse_mode overrides the parser default for this call: 'vectorized'
+        classifies rows with column operations, 'iterrows' is the original
+        row-by-row loop kept as a reference implementation.
+        """
         if self.raw_data is None:
             raise ValueError("No data loaded. Call load_csv first.")
         
+        mode = parse_mode or self.parse_mode
+        if mode not in self.PARSE_MODES:
+            raise ValueError(f"Unknown parse mode '{mode}'. Expected one of: {', '.join(self.PARSE_MODES)}")
+        
+        logger.info("🔍 Starting to parse %d rows (%s mode)", len(self.raw_data), mode)
+        self._start_run()
+        
+        if mode == 'iterrows':
+            all_customer_data, total_invoices_processed, classes_found = self._collect_invoices_iterrows()
+        else:
+            all_customer_data, total_invoices_processed, classes_found, _ = \
+                self._collect_invoices_vectorized(self.raw_data)
+        
+        logger.info("📊 Parsing complete: %d invoices processed, %d with open balance, %d customers found",
+                    total_invoices_processed, total_invoices_processed - self.total_invoices_ignored,
+                    len(all_customer_data))
+        
+        # Now create Customer objects from parsed data, a batch of customers at a time,
+        # releasing each batch's invoice lists once it is built
+        names = list(all_customer_data)
+        for batch_start in range(0, len(names), CUSTOMER_BATCH_SIZE):
+            batch = {name: all_customer_data.pop(name) for name in names[batch_start:batch_start + CUSTOMER_BATCH_SIZE]}
+            self._create_customer_objects(batch, classes_found)
+        
+        # Generate data quality report
+        self._generate_data_quality_report(total_invoices_processed, classes_found)
+        
+        logger.info("✅ Final result: %d customers created", len(self.customers))
+        return self.customers
+    
+    def parse_csv_streaming(self, file_path: str, chunksize: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Customer]:
+        """Parse a CSV in bounded chunks without keeping the whole export in memory
+        
+        The current customer is carried across chunk boundaries and the invoices
+        collected so far are handed to plan construction every time a total row
+        closes a customer section, so peak memory follows the chunk size and the
+        largest customer rather than the file size.
+        """
+        return self._parse_chunks(self.iter_csv_chunks(file_path, chunksize), file_path, chunksize)
+    
+    def parse_streaming(self, file_path: str, chunksize: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Customer]:
+        """Stream-parse a CSV or .xlsx export, picked by file extension"""
+        if is_workbook(file_path):
+            return self.parse_xlsx_streaming(file_path, chunksize)
+        return self.parse_csv_streaming(file_path, chunksize)
+    
+    def parse_xlsx_streaming(self, file_path: str, chunksize: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Customer]:
+        """Parse an .xlsx export the way parse_csv_streaming parses a CSV
+        
+        Worksheet rows are streamed from a read-only workbook, so a large
+        workbook is never loaded whole.
+        """
+        return self._parse_chunks(self.iter_xlsx_chunks(file_path, chunksize), file_path, chunksize)
+    
+    def _parse_chunks(self, chunks, file_path: str, chunksize: int) -> Dict[str, Customer]:
+        """Streaming attribution over consecutive frames of one export"""
+        self.raw_data = None
+        self.total_rows_processed = 0
+        self._start_run()
+        
+        pending = {}  # Customer name -> invoices not yet turned into plans
+        current_customer = None
+        total_invoices_processed = 0
+        classes_found = set()
+        
+        logger.info("🔍 Streaming %s in chunks of %d rows", file_path, chunksize)
+        
+        for chunk in chunks:
+            self.total_rows_processed += len(chunk)
+            rows = self._classify_rows(chunk, current_customer)
+            
+            # Everything up to the last total row in this chunk is complete
+            total_positions = np.flatnonzero(rows['row_type'].to_numpy() == ROW_TOTAL)
+            split_at = total_positions[-1] + 1 if len(total_positions) else 0
+            
+            for part, closes_section in ((slice(0, split_at), True), (slice(split_at, None), False)):
+                part_rows = rows.iloc[part]
+                if part_rows.empty:
+                    continue
+                
+                customer_data, invoices_processed, part_classes, current_customer = \
+                    self._collect_invoices_vectorized(chunk.iloc[part], current_customer, rows=part_rows)
+                total_invoices_processed += invoices_processed
+                classes_found.update(part_classes)
+                
+                for customer_name, invoices in customer_data.items():
+                    pending.setdefault(customer_name, []).extend(invoices)
+                
+                if closes_section:
+                    self._flush_pending_customers(pending, classes_found)
+        
+        self._flush_pending_customers(pending, classes_found)
+        
+        logger.info("📊 Streaming parse complete: %d rows read, %d invoices processed, %d with open balance",
+                    self.total_rows_processed, total_invoices_processed,
+                    total_invoices_processed - self.total_invoices_ignored)
+        
+        self._generate_data_quality_report(total_invoices_processed, classes_found)
+        
+        logger.info("✅ Final result: %d customers created", len(self.customers))
+        return self.customers
+    
+    def to_snapshot(self) -> Dict:
+        """Everything parsing produced, for snapshots.write_snapshot / ParseCache"""
+        return {
+            'parser_version': PARSER_VERSION,
+            'customers': self.customers,
+            'raw_rows': self.raw_rows,
+            'errors_found': self.errors_found,
+            'data_quality_report': self.data_quality_report,
+            'total_rows_processed': self.total_rows_processed,
+            'total_invoices_ignored': self.total_invoices_ignored
+        }
+    
+    def restore_snapshot(self, snapshot: Dict) -> Dict[str, Customer]:
+        """Load the output of an earlier parse instead of parsing again"""
+        if snapshot.get('parser_version') != PARSER_VERSION:
+            raise ValueError(f"Snapshot is from parser version {snapshot.get('parser_version')}, "
+                             f"expected {PARSER_VERSION}")
+        
+        self.raw_data = None
+        self.customers = snapshot['customers']
+        self.raw_rows = snapshot['raw_rows']
+        self.errors_found = snapshot['errors_found']
+        self.data_quality_report = snapshot['data_quality_report']
+        self.total_rows_processed = snapshot['total_rows_processed']
+        self.total_invoices_ignored = snapshot['total_invoices_ignored']
+        self.customer_fingerprints = {}
+        return self.customers
+    
+    def merge_parsed(self, parsers: List['EnhancedPaymentPlanParser']) -> Dict[str, Customer]:
+        """Combine the output of parsers that each read one export (or one section
+        run of an export, see split_sections) into this parser
+        
+        Customers found in several inputs get their plans rebuilt from the
+        combined invoices, exactly as if the inputs had been read back to back.
+        Errors, counters and the data quality report cover all inputs.
+        """
+        self.raw_data = None
+        self.customers = {}
+        self.customer_fingerprints = {}
+        self.errors_found = ErrorLog()
+        self.total_rows_processed = 0
+        self.total_invoices_ignored = 0
+        total_invoices_processed = 0
+        classes_found = set()
+        combined = {}  # Customers seen in more than one file -> invoices from every file
+        
+        for parsed in parsers:
+            self.errors_found.extend(parsed.errors_found)
+            self.total_rows_processed += parsed.total_rows_processed
+            self.total_invoices_ignored += parsed.total_invoices_ignored
+            self.terms_normalizer.hits += parsed.terms_normalizer.hits
+            self.terms_normalizer.misses += parsed.terms_normalizer.misses
+            
+            report = parsed.data_quality_report
+            if report:
+                total_invoices_processed += report.total_invoices_processed
+                classes_found.update(report.classes_found)
+            
+            for customer_name, customer in parsed.customers.items():
+                existing = self.customers.get(customer_name)
+                if existing is None:
+                    self.customers[customer_name] = customer
+                    continue
+                if customer_name not in combined:
+                    combined[customer_name] = [inv for plan in existing.payment_plans for inv in plan.invoices]
+                combined[customer_name].extend(inv for plan in customer.payment_plans for inv in plan.invoices)
+        
+        # Rebuild shared customers once, after their typos from every file are dropped
+        self._discard_typos(*combined)
+        self._create_customer_objects(combined, classes_found)
+        
+        logger.info("🔗 Merged %d parsed inputs: %d customers", len(parsers), len(self.customers))
+        
+        self._generate_data_quality_report(total_invoices_processed, classes_found)
+        return self.customers
+    
+    def split_sections(self, frame: pd.DataFrame, parts: int) -> List[pd.DataFrame]:
+        """Cut a loaded export into at most `parts` runs of whole customer sections
+        
+        Every cut goes right after the first customer total row at or past an even
+        share of the rows. Attribution starts over after a total row, so each run
+        parses on its own exactly as it does in place, and keeps its row labels
+        for error reporting. Only the rows around each cut are classified.
+        """
+        cuts = [0]
+        for part in range(1, parts):
+            cut = self._section_end_after(frame, max(len(frame) * part // parts, cuts[-1]))
+            if cut is None or cut >= len(frame):
+                break
+            if cut > cuts[-1]:
+                cuts.append(cut)
+        cuts.append(len(frame))
+        return [frame.iloc[start:end] for start, end in zip(cuts, cuts[1:])]
+    
+    def _section_end_after(self, frame: pd.DataFrame, position: int) -> Optional[int]:
+        """Position just past the first total row at or after `position`, if any"""
+        while position < len(frame):
+            window = frame.iloc[position:position + SECTION_SCAN_ROWS]
+            totals = np.flatnonzero(self._classify_rows(window)['row_type'].to_numpy() == ROW_TOTAL)
+            if len(totals):
+                return position + int(totals[0]) + 1
+            position += len(window)
+        return None
+    
+    def _flush_pending_customers(self, pending: Dict[str, List[Invoice]], classes_found: set):
+        """Build Customer objects for every completed section and clear the buffer
+        
+        A customer already built from an earlier section of the same name is
+        rebuilt with those invoices first: plans keep invoices grouped in
+        first-seen order, so flattening them and appending the new invoices
+        regroups exactly like a single pass would.
+        """
+        batch = {}
+        for customer_name, invoices in pending.items():
+            existing = self.customers.get(customer_name)
+            if invoices and existing is not None:
+                invoices = [inv for plan in existing.payment_plans for inv in plan.invoices] + invoices
+            batch[customer_name] = invoices
+        
+        self._discard_typos(*(name for name, invoices in pending.items() if invoices and name in self.customers))
+        self._create_customer_objects(batch, classes_found)
+        pending.clear()
+    
+    def _collect_invoices_iterrows(self) -> Tuple[Dict[str, List[Invoice]], int, set]:
+        """Reference attribution loop - walks the export one row at a time"""
         # Store all customer data as we parse
         all_customer_data = {}
         current_customer = None
         total_invoices_processed = 0
         classes_found = set()
-        
-        print(f"🔍 Starting to parse {len(self.raw_data)} rows...")
+        stored_rows = []  # Labels of rows backing the invoices, stored in one block
+        orphaned_invoices = 0
+        debug = logger.isEnabledFor(logging.DEBUG)
         
         for idx, row in self.raw_data.iterrows():
             # Skip completely empty rows
             if row.isna().all():
                 continue
                 
-            # Debug: Print processing info for first few rows
-            if idx < 10:
-                print(f"Row {idx}: _1='{row.get('_1', '')}', Type='{row.get('Type', '')}', Open Balance='{row.get('Open Balance', '')}'")
+            # Debug: Log processing info for first few rows
+            if debug and idx < 10:
+                logger.debug(f"Row {idx}: _1='{row.get('_1', '')}', Type='{row.get('Type', '')}', Open Balance='{row.get('Open Balance', '')}'")
             
             # CASE 1: Invoice row - process invoice
             if row.get('Type') == 'Invoice':
@@ -191,12 +554,14 @@ class EnhancedPaymentPlanParser:
                     
                     if invoice_customer:
                         # Parse the invoice
-                        invoice = self._parse_invoice_row(row, idx)
+                        invoice = self._parse_invoice_row(row, idx, self.raw_rows.size + len(stored_rows))
+                        stored_rows.append(idx)
                         
                         # Initialize customer data if first time seeing this customer
                         if invoice_customer not in all_customer_data:
                             all_customer_data[invoice_customer] = []
-                            print(f"📝 New customer found: {invoice_customer}")
+                            if debug:
+                                logger.debug("📝 New customer found: %s", invoice_customer)
                         
                         # Add invoice to customer
                         all_customer_data[invoice_customer].append(invoice)
@@ -205,9 +570,13 @@ class EnhancedPaymentPlanParser:
                         if invoice.class_field:
                             classes_found.add(invoice.class_field)
                         
-                        print(f"   ✅ Added invoice {invoice.invoice_number} to {invoice_customer} (${open_balance:.2f})")
+                        if debug:
+                            logger.debug("   ✅ Added invoice %s to %s ($%.2f)",
+                                         invoice.invoice_number, invoice_customer, open_balance)
                     else:
-                        print(f"   ❌ No customer found for invoice at row {idx}")
+                        orphaned_invoices += 1
+                        if debug:
+                            logger.debug("   ❌ No customer found for invoice at row %s", idx)
                 else:
                     # Track ignored invoices (paid off)
                     self.total_invoices_ignored += 1
@@ -222,138 +591,329 @@ class EnhancedPaymentPlanParser:
                 potential_customer = str(row.get('_1', '')).strip()
                 if potential_customer and not self._is_total_row_text(potential_customer):
                     current_customer = potential_customer
-                    print(f"🏷️  Customer header found: {current_customer}")
+                    if debug:
+                        logger.debug("🏷️  Customer header found: %s", current_customer)
             
             # CASE 3: Nested customer (name in _2 column)
             elif self._is_nested_customer_row(row):
                 nested_customer = str(row.get('_2', '')).strip()
                 if nested_customer and not self._is_total_row_text(nested_customer):
                     current_customer = nested_customer
-                    print(f"🏷️  Nested customer found: {current_customer}")
+                    if debug:
+                        logger.debug("🏷️  Nested customer found: %s", current_customer)
             
             # CASE 4: Total row - signals end of customer section
             elif self._is_total_row(row):
                 total_customer = self._extract_customer_from_total(row)
-                if total_customer:
-                    print(f"🏁 Total row for: {total_customer}")
+                if debug and total_customer:
+                    logger.debug("🏁 Total row for: %s", total_customer)
                 current_customer = None  # Reset current customer
         
-        print(f"\n📊 Parsing complete:")
-        print(f"   Total invoices processed: {total_invoices_processed}")
-        print(f"   Invoices with open balance: {total_invoices_processed - self.total_invoices_ignored}")
-        print(f"   Customers found: {len(all_customer_data)}")
+        if orphaned_invoices:
+            logger.warning("❌ %d open invoices had no customer and were skipped", orphaned_invoices)
         
-        # Now create Customer objects from parsed data
-        for customer_name, invoices in all_customer_data.items():
-            if invoices:  # Only create customer if they have invoices
-                print(f"\n🏗️  Creating customer object for {customer_name} with {len(invoices)} invoices")
-                self._create_customer_object(customer_name, invoices, classes_found)
+        self.raw_rows.append(self.raw_data.loc[stored_rows])
+        return all_customer_data, total_invoices_processed, classes_found
+    
+    def _collect_invoices_vectorized(self, frame: pd.DataFrame,
+                                     current_customer: Optional[str] = None,
+                                     rows: Optional[pd.DataFrame] = None
+                                     ) -> Tuple[Dict[str, List[Invoice]], int, set, Optional[str]]:
+        """Columnar attribution - same rules as _collect_invoices_iterrows
+        
+        Rows are classified and the current customer is forward-filled in a few
+        column operations, then only open invoices are turned into Invoice objects.
+        Returns the customer that is still open after the last row so a caller
+        feeding consecutive slices can carry it forward. `rows` may be passed in
+        when the caller has already classified the frame.
+        """
+        all_customer_data = {}
+        classes_found = set()
         
-        # Generate data quality report
-        self._generate_data_quality_report(total_invoices_processed, classes_found)
+        if rows is None:
+            rows = self._classify_rows(frame, current_customer)
+        invoice_rows = frame[rows['row_type'] == ROW_INVOICE]
+        invoice_info = rows.loc[invoice_rows.index]
+        total_invoices_processed = len(invoice_rows)
+        
+        # Parse both amount columns once; open invoices are built from these values
+        balances, balance_codes = self.parse_amount_column(self._column(invoice_rows, 'Open Balance'))
+        amounts, amount_codes = self.parse_amount_column(self._column(invoice_rows, 'Amount'))
+        
+        is_open = balances > 0
+        self.total_invoices_ignored += int((~is_open).sum())
+        
+        # Track parsing errors (attributed to the section customer, as the loop does)
+        row_labels = invoice_rows.index.tolist()
+        sections = invoice_info['current_customer'].tolist()
+        for i in np.flatnonzero((balance_codes != AMOUNT_OK) | (amount_codes != AMOUNT_OK)):
+            if balance_codes[i] != AMOUNT_OK:
+                error = AMOUNT_ERROR_MESSAGES[balance_codes[i]].format(invoice_rows['Open Balance'].iat[i])
+            else:
+                error = AMOUNT_ERROR_MESSAGES[amount_codes[i]].format(invoice_rows['Amount'].iat[i])
+            self._track_parsing_error(sections[i] or f"Row {row_labels[i]}", error, row_labels[i])
+        
+        orphaned = is_open & invoice_info['customer'].isna().to_numpy()
+        if orphaned.any():
+            logger.warning("❌ %d open invoices had no customer and were skipped", int(orphaned.sum()))
+            if logger.isEnabledFor(logging.DEBUG):
+                for i in np.flatnonzero(orphaned):
+                    logger.debug("   ❌ No customer found for invoice at row %s", row_labels[i])
+        
+        attributed = is_open & ~orphaned
+        open_rows = invoice_rows[attributed]
+        first_position = self.raw_rows.append(open_rows)
+        invoices = self._build_invoices(open_rows, balances[attributed], balance_codes[attributed],
+                                        amounts[attributed], amount_codes[attributed], first_position)
+        
+        for invoice, invoice_customer in zip(invoices, invoice_info['customer'].to_numpy()[attributed]):
+            if invoice_customer not in all_customer_data:
+                all_customer_data[invoice_customer] = []
+                logger.debug("📝 New customer found: %s", invoice_customer)
+            
+            all_customer_data[invoice_customer].append(invoice)
+            
+            if invoice.class_field:
+                classes_found.add(invoice.class_field)
         
-        print(f"\n✅ Final result: {len(self.customers)} customers created")
-        return self.customers
+        final_customer = rows['current_after'].iloc[-1] if len(rows) else current_customer
+        return all_customer_data, total_invoices_processed, classes_found, final_customer
+    
+    def _build_invoices(self, open_rows: pd.DataFrame, balances: np.ndarray, balance_codes: np.ndarray,
+                        amounts: np.ndarray, amount_codes: np.ndarray, first_position: int) -> List[Invoice]:
+        """Invoice objects for open rows from already-parsed columns
+        
+        Columnar counterpart of _parse_invoice_row: field errors come from the
+        parser error codes and string masks instead of per-row checks.
+        """
+        dates, date_codes = self.parse_date_column(self._column(open_rows, 'Date'))
+        numbers = self._text_values(open_rows, 'Num', '')
+        payment_terms = self._text_values(open_rows, 'FOB', None)
+        class_fields = self._text_values(open_rows, 'Class', None)
+        row_labels = open_rows.index.tolist()
+        
+        # Special markers in invoice numbers
+        number_text = pd.Series(numbers, dtype=object)
+        for marker, label in (('*', 'Asterisk marker'), ('/', 'Slash notation')):
+            for i in np.flatnonzero(number_text.str.contains(marker, regex=False).to_numpy(dtype=bool)):
+                self._track_field_error('Invoice Number', f'{label} in {numbers[i]}', numbers[i], row_labels[i])
+        
+        # Amount and date errors, reported against the original cell text
+        for field, codes, messages in (('Open Balance', balance_codes, AMOUNT_ERROR_MESSAGES),
+                                       ('Amount', amount_codes, AMOUNT_ERROR_MESSAGES),
+                                       ('Date', date_codes, DATE_ERROR_MESSAGES)):
+            for i in np.flatnonzero(codes):
+                error = messages[codes[i]].format(open_rows[field].iat[i])
+                self._track_field_error(field, error, numbers[i], row_labels[i])
+        
+        missing_class = [i for i, class_field in enumerate(class_fields) if not class_field]
+        self.errors_found.add_field_errors('Class', ['Missing class field'] * len(missing_class),
+                                           [numbers[i] for i in missing_class],
+                                           [row_labels[i] for i in missing_class])
+        
+        return [
+            Invoice(
+                invoice_number=invoice_num,
+                date=date_value,
+                payment_terms=terms,
+                original_amount=original_amount,
+                open_balance=open_balance,
+                class_field=class_field,
+                row_index=first_position + offset,
+                raw_store=self.raw_rows
+            )
+            for offset, (invoice_num, date_value, terms, original_amount, open_balance, class_field)
+            in enumerate(zip(numbers, dates.tolist(), payment_terms, amounts.tolist(),
+                             balances.tolist(), class_fields))
+        ]
+    
+    def _text_values(self, frame: pd.DataFrame, column: str, default) -> list:
+        """Column as str values, with `default` where the cell is missing"""
+        values = self._column(frame, column)
+        present = values.notna().to_numpy()
+        text = np.full(len(values), default, dtype=object)
+        text[present] = values[present].astype(object).map(str).to_numpy(dtype=object)
+        return text.tolist()
     
-    def _create_customer_object(self, customer_name: str, invoices: List[Invoice], classes_found: set):
-        """Create a Customer object with proper payment plan consolidation"""
-        if not invoices:
+    def _classify_rows(self, frame: pd.DataFrame, current_customer: Optional[str] = None) -> pd.DataFrame:
+        """Label each row (invoice, header, nested header, total) and resolve its customer
+        
+        Returns a frame aligned with `frame` holding the row type, the customer in
+        effect when the row is reached, the customer after the row and, for invoice
+        rows, the customer the invoice is attributed to.
+        """
+        is_invoice = (self._column(frame, 'Type') == 'Invoice').to_numpy()
+        has_name, name = self._name_column(frame, '_1')
+        has_nested, nested_name = self._name_column(frame, '_2')
+        name_is_total = has_name & name.str.lower().str.startswith('total').to_numpy(dtype=bool)
+        nested_is_total = has_nested & nested_name.str.lower().str.startswith('total').to_numpy(dtype=bool)
+        
+        # Same precedence as the elif chain in the reference loop
+        is_header = ~is_invoice & has_name & ~name_is_total
+        is_nested = ~is_invoice & ~is_header & has_nested & ~nested_is_total
+        is_total = ~is_invoice & ~is_header & ~is_nested & name_is_total
+        
+        row_type = np.full(len(frame), ROW_OTHER, dtype=np.int8)
+        row_type[is_invoice] = ROW_INVOICE
+        row_type[is_header] = ROW_HEADER
+        row_type[is_nested] = ROW_NESTED
+        row_type[is_total] = ROW_TOTAL
+        
+        # Rows that change the current customer; '' marks a reset at a total row
+        updates = pd.Series(None, index=frame.index, dtype=object)
+        updates[is_header & (name != '').to_numpy()] = name
+        updates[is_nested & (nested_name != '').to_numpy()] = nested_name
+        updates[is_total] = ''
+        
+        current_after = updates.ffill().fillna(current_customer or '')
+        current_before = current_after.shift(1, fill_value=current_customer or '')
+        current_after = current_after.where(current_after != '', None)
+        current_before = current_before.where(current_before != '', None)
+        
+        # Invoices carrying their own name in _1 belong to that customer
+        own_name = name.where(has_name & (name != '').to_numpy() & ~name_is_total, None)
+        customer = own_name.where(own_name.notna(), current_before).where(is_invoice, None)
+        
+        return pd.DataFrame({
+            'row_type': row_type,
+            'current_customer': current_before,
+            'current_after': current_after,
+            'customer': customer
+        }, index=frame.index)
+    
+    def _column(self, frame: pd.DataFrame, column: str) -> pd.Series:
+        """Column accessor with the same fallback as row.get() for missing columns"""
+        if column in frame.columns:
+            return frame[column]
+        return pd.Series(None, index=frame.index, dtype=object)
+    
+    def _name_column(self, frame: pd.DataFrame, column: str) -> Tuple[np.ndarray, pd.Series]:
+        """Presence mask and stripped text for a customer name column"""
+        if column not in frame.columns:
+            # row.get() returns '' for a missing column, which counts as present
+            return np.ones(len(frame), dtype=bool), pd.Series('', index=frame.index, dtype=object)
+        
+        values = frame[column]
+        present = values.notna().to_numpy()
+        text = pd.Series('', index=frame.index, dtype=object)
+        text[present] = values[present].astype(str).str.strip().astype(object)
+        return present, text
+    
+    def _create_customer_objects(self, customer_invoices: Dict[str, List[Invoice]], classes_found: set):
+        """Create Customer objects with proper payment plan consolidation for a batch of customers
+        
+        Plan and customer totals, date bounds and classes are computed for the
+        whole batch at once from an InvoiceTable.
+        """
+        customer_invoices = {name: invoices for name, invoices in customer_invoices.items() if invoices}
+        if not customer_invoices:
             return
         
         # FIXED: Group invoices by normalized payment terms to avoid over-segmentation
-        plans_by_terms = {}
-        
-        for inv in invoices:
-            # Normalize payment terms to group similar ones together
-            normalized_terms = self._normalize_terms_key(inv.payment_terms)
-            
-            if normalized_terms not in plans_by_terms:
-                plans_by_terms[normalized_terms] = []
-            plans_by_terms[normalized_terms].append(inv)
-        
-        print(f"   📋 Customer {customer_name} has {len(plans_by_terms)} distinct payment term groups:")
-        for terms, plan_invoices in plans_by_terms.items():
-            print(f"      - '{terms}': {len(plan_invoices)} invoices")
-        
-        # Create customer with consolidated payment plans
-        customer = Customer(customer_name=customer_name)
-        
-        for plan_idx, (terms_key, plan_invoices) in enumerate(plans_by_terms.items()):
-            plan_id = f"{customer_name}_plan_{plan_idx + 1}"
+        table = InvoiceTable.group(customer_invoices, self.terms_normalizer.lookup)
+        
+        plan_original, plan_open = table.plan_totals()
+        customer_original = table.customer_totals(plan_original).tolist()
+        customer_open = table.customer_totals(plan_open).tolist()
+        plan_original, plan_open = plan_original.tolist(), plan_open.tolist()
+        plan_earliest, plan_latest = table.plan_date_bounds()
+        customer_earliest, customer_latest = table.customer_date_bounds()
+        dominant_classes = table.plan_dominant_classes()
+        customer_classes = table.customer_classes()
+        
+        for customer_idx, customer_name in enumerate(table.customer_names):
+            plans = table.customer_plans(customer_idx)
             
-            # Calculate totals for this plan
-            total_original = sum(inv.original_amount for inv in plan_invoices)
-            total_open = sum(inv.open_balance for inv in plan_invoices)
+            # Incremental runs keep the previous Customer when its invoices are unchanged
+            if self.reusable_customers is not None and self.invoice_store is None:
+                fingerprint = invoice_fingerprint(table.customer_invoices(customer_idx))
+                self.customer_fingerprints[customer_name] = fingerprint
+                previous = self.reusable_customers.get(customer_name)
+                if previous is not None and previous[0] == fingerprint:
+                    self._reuse_customer(customer_name, previous[1],
+                                         [(table.plan_terms[plan], table.plan_invoices(plan)) for plan in plans])
+                    continue
             
-            # Get dates
-            dates = [inv.date for inv in plan_invoices if inv.date]
-            earliest_date = min(dates) if dates else None
-            latest_date = max(dates) if dates else None
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   📋 Customer %s has %d distinct payment term groups: %s", customer_name, len(plans),
+                             ', '.join(f"'{table.plan_terms[plan].key}': {len(table.plan_invoices(plan))} invoices"
+                                       for plan in plans))
             
-            # Parse payment terms
-            monthly_amount, frequency, typos = self.normalize_payment_terms(terms_key)
+            # Create customer with consolidated payment plans
+            customer = Customer(customer_name=customer_name)
+            if self.invoice_store is not None and customer_name in self.customers:
+                self.invoice_store.remove_customer(customer_name)  # Being rebuilt with more invoices
             
-            # Track typos
-            for typo_info in typos:
-                self._track_typo(customer_name, typo_info)
+            for plan_idx, plan in enumerate(plans):
+                plan_id = f"{customer_name}_plan_{plan_idx + 1}"
+                terms_key, monthly_amount, frequency, typos = table.plan_terms[plan]
+                
+                # Track typos
+                for typo_info in typos:
+                    self._track_typo(customer_name, typo_info)
+                
+                # Spill the invoices to disk when a store is configured; the plan reads them back on demand
+                plan_invoices = table.plan_invoices(plan)
+                if self.invoice_store is not None:
+                    plan_invoices = self.invoice_store.add_plan(customer_name, plan_id, plan_invoices)
+                
+                payment_plan = PaymentPlan(
+                    customer_name=customer_name,
+                    plan_id=plan_id,
+                    monthly_amount=monthly_amount,
+                    frequency=frequency,
+                    total_original=plan_original[plan],
+                    total_open=plan_open[plan],
+                    invoices=plan_invoices,
+                    earliest_date=plan_earliest[plan],
+                    latest_date=plan_latest[plan],
+                    class_filter=dominant_classes[plan],
+                    payment_terms_raw=terms_key if terms_key != "no_terms" else None
+                )
+                
+                customer.payment_plans.append(payment_plan)
             
-            # Determine dominant class for this plan
-            plan_classes = [inv.class_field for inv in plan_invoices if inv.class_field]
-            dominant_class = max(set(plan_classes), key=plan_classes.count) if plan_classes else None
+            # Set customer-level properties
+            customer.total_open_balance = customer_open[customer_idx]
+            customer.total_original_amount = customer_original[customer_idx]
+            customer.has_multiple_plans = len(customer.payment_plans) > 1
+            customer.all_classes = customer_classes[customer_idx]
+            customer.earliest_date = customer_earliest[customer_idx]
+            customer.latest_date = customer_latest[customer_idx]
             
-            payment_plan = PaymentPlan(
-                customer_name=customer_name,
-                plan_id=plan_id,
-                monthly_amount=monthly_amount,
-                frequency=frequency,
-                total_original=total_original,
-                total_open=total_open,
-                invoices=plan_invoices,
-                earliest_date=earliest_date,
-                latest_date=latest_date,
-                class_filter=dominant_class,
-                payment_terms_raw=terms_key if terms_key != "no_terms" else None
-            )
+            self.customers[customer_name] = customer
+            logger.debug("   ✅ Created customer with %d payment plans, total open: $%.2f",
+                         len(customer.payment_plans), customer.total_open_balance)
+    
+    def _reuse_customer(self, customer_name: str, customer: Customer, plans: List[Tuple]):
+        """Keep an unchanged customer from the previous run instead of rebuilding it
+        
+        Its invoices are pointed at this run's source rows and its typos are
+        tracked again, so the result matches a freshly built customer. `plans`
+        holds the normalized terms and invoices of each freshly grouped plan.
+        """
+        for plan, (terms, plan_invoices) in zip(customer.payment_plans, plans):
+            for kept, fresh in zip(plan.invoices, plan_invoices):
+                kept.row_index = fresh.row_index
+                kept.raw_store = fresh.raw_store
             
-            customer.payment_plans.append(payment_plan)
-        
-        # Set customer-level properties
-        customer.total_open_balance = sum(plan.total_open for plan in customer.payment_plans)
-        customer.total_original_amount = sum(plan.total_original for plan in customer.payment_plans)
-        customer.has_multiple_plans = len(customer.payment_plans) > 1
-        customer.all_classes = list(set(inv.class_field for plan in customer.payment_plans 
-                                      for inv in plan.invoices if inv.class_field))
-        
-        # Set overall dates
-        all_dates = [plan.earliest_date for plan in customer.payment_plans if plan.earliest_date]
-        customer.earliest_date = min(all_dates) if all_dates else None
-        all_dates = [plan.latest_date for plan in customer.payment_plans if plan.latest_date]
-        customer.latest_date = max(all_dates) if all_dates else None
+            for typo_info in terms.typo_issues:
+                self._track_typo(customer_name, typo_info)
         
         self.customers[customer_name] = customer
-        print(f"   ✅ Created customer with {len(customer.payment_plans)} payment plans, total open: ${customer.total_open_balance:.2f}")
+        self.reused_customers += 1
+        logger.debug("   ♻️  Reused unchanged customer %s", customer_name)
     
     def _normalize_terms_key(self, payment_terms: str) -> str:
         """Normalize payment terms to prevent over-segmentation of payment plans"""
-        if not payment_terms or pd.isna(payment_terms):
-            return "no_terms"
-        
-        terms = str(payment_terms).strip().lower()
-        
-        # Apply typo corrections
-        for typo, correction in self.payment_term_corrections.items():
-            terms = terms.replace(typo, correction)
-        
-        # Standardize common variations
-        terms = re.sub(r'\s+', ' ', terms)  # normalize whitespace
-        terms = terms.replace('per month', 'monthly')
-        terms = terms.replace('a month', 'monthly')
-        terms = terms.replace('each month', 'monthly')
-        
-        return terms if terms != "" else "no_terms"
+        return self.terms_normalizer.terms_key(payment_terms)
     
-    def _parse_invoice_row(self, row, row_index: int) -> Invoice:
-        """Parse invoice with enhanced error tracking"""
+    def _parse_invoice_row(self, row, row_index: int, store_position: Optional[int] = None) -> Invoice:
+        """Parse invoice with enhanced error tracking
+        
+        store_position is where the source row sits in self.raw_rows; the invoice
+        keeps only that position and reads the full row back on demand.
+        """
         # Parse amounts with error tracking
         open_balance, balance_error = self.parse_amount(row.get('Open Balance'))
         original_amount, amount_error = self.parse_amount(row.get('Amount'))
@@ -393,7 +953,8 @@ class EnhancedPaymentPlanParser:
             original_amount=original_amount,
             open_balance=open_balance,
             class_field=class_field,
-            raw_data=row.to_dict()
+            row_index=store_position,
+            raw_store=self.raw_rows if store_position is not None else None
         )
     
     def _is_customer_name_row(self, row) -> bool:
@@ -427,30 +988,21 @@ class EnhancedPaymentPlanParser:
     
     def _track_parsing_error(self, customer_name: str, error: str, row_index: int):
         """Track parsing errors"""
-        self.errors_found.append({
-            'customer': customer_name,
-            'error': error,
-            'row': row_index,
-            'type': 'parsing_error'
-        })
+        self.errors_found.add_parsing_error(customer_name, error, row_index)
     
     def _track_field_error(self, field_name: str, error: str, invoice_num: str, row_index: int):
         """Track field-specific errors"""
-        self.errors_found.append({
-            'field': field_name,
-            'error': error,
-            'invoice': invoice_num,
-            'row': row_index,
-            'type': 'field_error'
-        })
+        self.errors_found.add_field_error(field_name, error, invoice_num, row_index)
     
     def _track_typo(self, customer_name: str, typo_info: Dict):
         """Track typos found"""
-        self.errors_found.append({
-            'customer': customer_name,
-            'typo_info': typo_info,
-            'type': 'typo'
-        })
+        self.errors_found.add_typo(customer_name, typo_info)
+    
+    def _discard_typos(self, *customer_names: str):
+        """Drop typo records for customers that are about to be rebuilt"""
+        if not customer_names:
+            return
+        self.errors_found.discard_typos(customer_names)
     
     def _generate_data_quality_report(self, total_invoices_processed: int, classes_found: set):
         """Generate comprehensive data quality report"""
@@ -464,8 +1016,6 @@ class EnhancedPaymentPlanParser:
             classes_found=sorted(list(classes_found))
         )
         
-        # Categorize errors
-        for error in self.errors_found:
-            error_type = error.get('type', 'unknown')
-            self.data_quality_report.errors_by_type[error_type] = \
-                self.data_quality_report.errors_by_type.get(error_type, 0) + 1
\ No newline at end of file
+        # Error counts are kept by the error log as errors are recorded
+        self.data_quality_report.errors_by_type = dict(self.errors_found.errors_by_type)
+        self.data_quality_report.errors_by_severity = dict(self.errors_found.errors_by_severity)
\ No newline at end of file
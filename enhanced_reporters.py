@@ -1,6 +1,7 @@
 """Enhanced report generation functionality - Phase 1"""
 
 import json
+import logging
 import pandas as pd
 from datetime import datetime
 from typing import Dict, List
@@ -13,6 +14,9 @@ from models import (
     Customer, PaymentPlan, CustomerIssue, PaymentMetrics,
     DataQualityReport, ErrorType, IssueSeverity
 )
+from result_index import InvoiceIssueIndex, worst_severity
+
+logger = logging.getLogger(__name__)
 
 class EnhancedReportGenerator:
     """Enhanced report generator with error highlighting and class filtering"""
@@ -183,8 +187,13 @@ class EnhancedReportGenerator:
     def generate_error_highlighted_excel(self, 
                                        customers: Dict[str, Customer],
                                        all_issues: List[CustomerIssue],
-                                       filename: str = None) -> str:
-        """Generate Excel file with error highlighting"""
+                                       filename: str = None,
+                                       invoice_issues: InvoiceIssueIndex = None) -> str:
+        """Generate Excel file with error highlighting
+        
+        `invoice_issues` is the analysis' index of issues by invoice; it is
+        built from `all_issues` when not given.
+        """
         
         if not filename:
             filename = f'payment_plan_errors_{self.timestamp}.xlsx'
@@ -203,7 +212,7 @@ class EnhancedReportGenerator:
         
         # Create detailed data sheet with highlighting
         data_ws = wb.create_sheet("Data with Errors Highlighted")
-        self._create_highlighted_data_sheet(data_ws, customers, all_issues)
+        self._create_highlighted_data_sheet(data_ws, customers, all_issues, invoice_issues)
         
         # Create issues by customer sheet
         issues_ws = wb.create_sheet("Issues by Customer")
@@ -263,7 +272,8 @@ class EnhancedReportGenerator:
             for cell in ws[row_num]:
                 cell.fill = fill
     
-    def _create_highlighted_data_sheet(self, ws, customers: Dict[str, Customer], all_issues: List[CustomerIssue]):
+    def _create_highlighted_data_sheet(self, ws, customers: Dict[str, Customer], all_issues: List[CustomerIssue],
+                                       invoice_issues: InvoiceIssueIndex = None):
         """Create data sheet with error highlighting"""
         # Headers
         headers = ['Customer Name', 'Plan ID', 'Invoice Number', 'Date', 'Payment Terms', 
@@ -275,23 +285,28 @@ class EnhancedReportGenerator:
             cell.font = Font(bold=True)
         
         # Create issue lookup for quick access
-        issues_by_customer = {}
-        for issue in all_issues:
-            if issue.customer_name not in issues_by_customer:
-                issues_by_customer[issue.customer_name] = []
-            issues_by_customer[issue.customer_name].append(issue)
+        if invoice_issues is None:
+            issues_by_customer = {}
+            for issue in all_issues:
+                if issue.customer_name not in issues_by_customer:
+                    issues_by_customer[issue.customer_name] = []
+                issues_by_customer[issue.customer_name].append(issue)
+            invoice_issues = InvoiceIssueIndex(customers, issues_by_customer)
+        
+        # Highlight color by the row's most severe issue
+        fills = {
+            IssueSeverity.CRITICAL: PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid'),
+            IssueSeverity.WARNING: PatternFill(start_color='FFFFCC', end_color='FFFFCC', fill_type='solid'),
+            IssueSeverity.INFO: PatternFill(start_color='CCE5FF', end_color='CCE5FF', fill_type='solid')
+        }
         
-        # Add data with highlighting
+        # Add data with highlighting; rows are counted here since ws.max_row scans every cell
+        row_num = 1
         for customer_name, customer in customers.items():
-            customer_issues = issues_by_customer.get(customer_name, [])
-            
             for plan in customer.payment_plans:
                 for invoice in plan.invoices:
-                    # Find issues affecting this invoice
-                    invoice_issues = []
-                    for issue in customer_issues:
-                        if invoice.invoice_number in issue.affected_invoices or not issue.affected_invoices:
-                            invoice_issues.append(f"{issue.issue_type.value}: {issue.description}")
+                    # Issues listing this invoice, or listing none (customer-wide)
+                    invoice_issues_found = invoice_issues.row_issues(customer_name, invoice.invoice_number)
                     
                     row_data = [
                         customer_name,
@@ -302,27 +317,17 @@ class EnhancedReportGenerator:
                         invoice.original_amount,
                         invoice.open_balance,
                         invoice.class_field or '',
-                        '; '.join(invoice_issues) if invoice_issues else ''
+                        '; '.join(f"{issue.issue_type.value}: {issue.description}" for issue in invoice_issues_found)
                     ]
                     
                     ws.append(row_data)
+                    row_num += 1
                     
                     # Highlight row if there are issues
-                    if invoice_issues:
-                        row_num = ws.max_row
-                        # Determine highlight color based on severity
-                        has_critical = any('critical' in str(issue) for issue in customer_issues)
-                        has_warning = any('warning' in str(issue) for issue in customer_issues)
-                        
-                        if has_critical:
-                            fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
-                        elif has_warning:
-                            fill = PatternFill(start_color='FFFFCC', end_color='FFFFCC', fill_type='solid')
-                        else:
-                            fill = PatternFill(start_color='CCE5FF', end_color='CCE5FF', fill_type='solid')
-                        
-                        for cell in ws[row_num]:
-                            cell.fill = fill
+                    if invoice_issues_found:
+                        fill = fills[worst_severity(invoice_issues_found)]
+                        for column in range(1, len(headers) + 1):
+                            ws.cell(row=row_num, column=column).fill = fill
     
     def _create_issues_by_customer_sheet(self, ws, all_issues: List[CustomerIssue]):
         """Create issues by customer sheet"""
@@ -516,7 +521,7 @@ class EnhancedReportGenerator:
             'projected_completion': metrics.projected_completion.strftime('%Y-%m-%d') if metrics.projected_completion else None,
             'months_remaining': metrics.months_remaining,
             'class_field': metrics.class_field,
-            'payment_roadmap': metrics.payment_roadmap
+            'payment_roadmap': metrics.payment_roadmap.to_dict()  # Start, interval, amount and balance; not every entry
         }
     
     def _problem_customer_summary(self, customer: Customer) -> Dict:
@@ -645,7 +650,8 @@ class EnhancedReportGenerator:
                         dashboard_data: Dict,
                         all_issues: List[CustomerIssue],
                         all_metrics: List[PaymentMetrics],
-                        customers: Dict[str, Customer]):
+                        customers: Dict[str, Customer],
+                        invoice_issues: InvoiceIssueIndex = None):
         """Save all enhanced reports"""
         
         # Save quality report JSON
@@ -657,7 +663,7 @@ class EnhancedReportGenerator:
             json.dump(dashboard_data, f, indent=2, default=str)
         
         # Save enhanced error Excel file
-        error_excel_path = self.generate_error_highlighted_excel(customers, all_issues)
+        error_excel_path = self.generate_error_highlighted_excel(customers, all_issues, invoice_issues=invoice_issues)
         
         # Save metrics CSV
         if all_metrics:
@@ -675,7 +681,6 @@ class EnhancedReportGenerator:
                 index=False
             )
         
-        print(f"\nEnhanced reports saved to {self.output_dir}/")
-        print(f"Timestamp: {self.timestamp}")
-        print(f"Error-highlighted Excel: {os.path.basename(error_excel_path)}")
+        logger.info("Enhanced reports saved to %s/ (timestamp %s, error-highlighted Excel: %s)",
+                    self.output_dir, self.timestamp, os.path.basename(error_excel_path))
         return self.timestamp
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""Compact log of the problems found while parsing an export
+
+Messy exports produce an error for nearly every invoice (a missing Class alone
+is one per invoice). Instead of one dict per error, the log keeps a row of typed
+columns per error - kind, field, message, customer or invoice, source row - with
+every string stored once and referenced by id. Counts by type and severity are
+kept up to date as errors are written; the familiar dict form of an error is
+only built when someone reads it.
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Error kinds, their 'type' in the dict form and the IssueSeverity value they count under
+ERROR_PARSING, ERROR_FIELD, ERROR_TYPO = range(3)
+ERROR_TYPES = ('parsing_error', 'field_error', 'typo')
+ERROR_SEVERITIES = ('critical', 'warning', 'info')
+
+NO_VALUE = -1  # Column value for "not set" (no field, no row, no typo details)
+
+
+class ErrorLog:
+    """Parse errors in typed columns, readable as a sequence of error dicts"""
+
+    def __init__(self):
+        self.kinds = array('b')
+        self.fields = array('i')  # String id of the field name
+        self.messages = array('i')  # String id of the error message
+        self.subjects = array('i')  # String id of the customer (parsing errors, typos) or invoice number
+        self.rows = array('q')  # Source row label
+        self.details = array('i')  # Index of the typo details
+
+        self._strings = []
+        self._string_ids = {}
+        self._details = []
+        self._detail_ids = {}  # id() of a typo details dict -> index; _details keeps it alive
+
+        self.errors_by_type = {}
+        self.errors_by_severity = {}
+
+    def add_parsing_error(self, customer_name: str, error: str, row_index: int):
+        """Record an invoice row that could not be parsed or attributed"""
+        self._append(ERROR_PARSING, NO_VALUE, self._intern(error), self._intern(customer_name), row_index, NO_VALUE)
+
+    def add_field_error(self, field_name: str, error: str, invoice_num: str, row_index: int):
+        """Record a problem with one field of an invoice"""
+        self._append(ERROR_FIELD, self._intern(field_name), self._intern(error), self._intern(invoice_num),
+                     row_index, NO_VALUE)
+
+    def add_field_errors(self, field_name: str, errors: Iterable[str], invoice_nums: Iterable[str],
+                         row_indexes: Iterable[int]):
+        """Record several errors for the same field at once (aligned iterables)"""
+        field_id = self._intern(field_name)
+        count = 0
+        for error, invoice_num, row_index in zip(errors, invoice_nums, row_indexes):
+            self.kinds.append(ERROR_FIELD)
+            self.fields.append(field_id)
+            self.messages.append(self._intern(error))
+            self.subjects.append(self._intern(invoice_num))
+            self.rows.append(NO_VALUE if row_index is None else row_index)
+            self.details.append(NO_VALUE)
+            count += 1
+        self._count(ERROR_FIELD, count)
+
+    def add_typo(self, customer_name: str, typo_info: Dict):
+        """Record a payment terms typo found for a customer"""
+        detail_id = self._detail_ids.get(id(typo_info))
+        if detail_id is None:
+            detail_id = self._detail_ids[id(typo_info)] = len(self._details)
+            self._details.append(typo_info)
+        self._append(ERROR_TYPO, NO_VALUE, NO_VALUE, self._intern(customer_name), None, detail_id)
+
+    def discard_typos(self, customer_names: Iterable[str]):
+        """Drop the typos recorded for these customers"""
+        subject_ids = {self._string_ids[name] for name in customer_names if name in self._string_ids}
+        if not subject_ids:
+            return
+
+        keep = [i for i, (kind, subject) in enumerate(zip(self.kinds, self.subjects))
+                if not (kind == ERROR_TYPO and subject in subject_ids)]
+        if len(keep) == len(self.kinds):
+            return
+
+        self._count(ERROR_TYPO, len(keep) - len(self.kinds))
+        for name in ('kinds', 'fields', 'messages', 'subjects', 'rows', 'details'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in keep]))
+
+    def extend(self, errors: Iterable):
+        """Append another log (or error dicts) in order"""
+        if not isinstance(errors, ErrorLog):
+            for error in errors:
+                self.add_dict(error)
+            return
+
+        strings = [self._intern(text) for text in errors._strings]
+        details = []
+        for typo_info in errors._details:
+            detail_id = self._detail_ids.get(id(typo_info))
+            if detail_id is None:
+                detail_id = self._detail_ids[id(typo_info)] = len(self._details)
+                self._details.append(typo_info)
+            details.append(detail_id)
+
+        def remap(ids, table):
+            return array('i', [NO_VALUE if value == NO_VALUE else table[value] for value in ids])
+
+        self.kinds.extend(errors.kinds)
+        self.fields.extend(remap(errors.fields, strings))
+        self.messages.extend(remap(errors.messages, strings))
+        self.subjects.extend(remap(errors.subjects, strings))
+        self.rows.extend(errors.rows)
+        self.details.extend(remap(errors.details, details))
+        for error_type, count in errors.errors_by_type.items():
+            self._count(ERROR_TYPES.index(error_type), count)
+
+    def add_dict(self, error: Dict):
+        """Record an error given in dict form"""
+        error_type = error.get('type')
+        if error_type == 'parsing_error':
+            self.add_parsing_error(error.get('customer'), error.get('error'), error.get('row'))
+        elif error_type == 'field_error':
+            self.add_field_error(error.get('field'), error.get('error'), error.get('invoice'), error.get('row'))
+        elif error_type == 'typo':
+            self.add_typo(error.get('customer'), error.get('typo_info'))
+        else:
+            raise ValueError(f"Unknown error type '{error_type}'")
+
+    def entry(self, position: int) -> Dict:
+        """The error at `position` in the dict form parsers have always produced"""
+        kind = self.kinds[position]
+        if kind == ERROR_PARSING:
+            return {
+                'customer': self._string(self.subjects[position]),
+                'error': self._string(self.messages[position]),
+                'row': self._row(position),
+                'type': 'parsing_error'
+            }
+        if kind == ERROR_FIELD:
+            return {
+                'field': self._string(self.fields[position]),
+                'error': self._string(self.messages[position]),
+                'invoice': self._string(self.subjects[position]),
+                'row': self._row(position),
+                'type': 'field_error'
+            }
+        return {
+            'customer': self._string(self.subjects[position]),
+            'typo_info': self._details[self.details[position]],
+            'type': 'typo'
+        }
+
+    def to_dicts(self) -> List[Dict]:
+        """Every error as a dict, in the order recorded"""
+        return [self.entry(i) for i in range(len(self.kinds))]
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self.entry(i) for i in range(len(self.kinds)))
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.entry(i) for i in range(len(self.kinds))[position]]
+        if position < 0:
+            position += len(self.kinds)
+        if not 0 <= position < len(self.kinds):
+            raise IndexError("error log index out of range")
+        return self.entry(position)
+
+    def __getstate__(self) -> Dict:
+        # Typo details are matched by id(), which means nothing in another process
+        state = self.__dict__.copy()
+        del state['_detail_ids']
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._detail_ids = {id(typo_info): i for i, typo_info in enumerate(self._details)}
+
+    def _append(self, kind: int, field_id: int, message_id: int, subject_id: int,
+                row_index: Optional[int], detail_id: int):
+        self.kinds.append(kind)
+        self.fields.append(field_id)
+        self.messages.append(message_id)
+        self.subjects.append(subject_id)
+        self.rows.append(NO_VALUE if row_index is None else row_index)
+        self.details.append(detail_id)
+        self._count(kind, 1)
+
+    def _count(self, kind: int, count: int):
+        for counts, key in ((self.errors_by_type, ERROR_TYPES[kind]), (self.errors_by_severity, ERROR_SEVERITIES[kind])):
+            counts[key] = counts.get(key, 0) + count
+            if counts[key] <= 0:
+                del counts[key]
+
+    def _intern(self, text) -> int:
+        if text is None:
+            return NO_VALUE
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = len(self._strings)
+            self._strings.append(text)
+        return string_id
+
+    def _string(self, string_id: int):
+        return None if string_id == NO_VALUE else self._strings[string_id]
+
+    def _row(self, position: int):
+        row = self.rows[position]
+        return None if row == NO_VALUE else row
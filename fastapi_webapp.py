@@ -19,6 +19,9 @@ from payment_projections import PaymentProjectionCalculator
 
 # Import our enhanced analysis system
 from enhanced_main import EnhancedPaymentPlanAnalysisSystem
+from snapshots import ParseCache, SNAPSHOT_SUFFIX, latest_snapshot
+from ingestion import WORKBOOK_SUFFIXES
+from invoice_store import SQLiteInvoiceStore
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -42,6 +45,7 @@ TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
 UPLOADS_DIR = BASE_DIR / "uploads"
 REPORTS_DIR = BASE_DIR / "reports"
+CACHE_DIR = BASE_DIR / "cache"
 
 # Create directories if they don't exist
 for directory in [TEMPLATES_DIR, STATIC_DIR, UPLOADS_DIR, REPORTS_DIR]:
@@ -51,9 +55,47 @@ for directory in [TEMPLATES_DIR, STATIC_DIR, UPLOADS_DIR, REPORTS_DIR]:
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
+# Uploads larger than this are streamed through the parser in chunks
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024
+STREAMING_CHUNK_ROWS = 50000
+
+# Parsed uploads keyed by file content, so re-uploading the same export skips parsing
+parse_cache = ParseCache(CACHE_DIR / "parsed", max_bytes=512 * 1024 * 1024, max_entries=32)
+
+# Snapshot of the current results, reloaded on startup so a restart keeps the dashboard
+RESULTS_SNAPSHOT_DIR = CACHE_DIR / "results"
+
 # Global analysis system instance
 analysis_system = None
 current_results = None
+invoice_store = None  # Disk store behind the current results when the upload was streamed
+
+def replace_invoice_store(store: Optional[SQLiteInvoiceStore]):
+    """Make store the current invoice store, closing and deleting the previous one"""
+    global invoice_store
+    
+    previous, invoice_store = invoice_store, store
+    if previous is not None and previous is not store:
+        previous.close()
+        Path(previous.path).unlink(missing_ok=True)
+
+def save_results_snapshot(system: EnhancedPaymentPlanAnalysisSystem, timestamp: str):
+    """Snapshot the current results for a warm restart, replacing older snapshots
+    
+    Results with spilled invoices are not snapshotted (writing them would load
+    every invoice back into memory), so a restart then starts empty.
+    """
+    stale = list(RESULTS_SNAPSHOT_DIR.glob(f"*{SNAPSHOT_SUFFIX}"))
+    if system.invoice_store is None:
+        path = RESULTS_SNAPSHOT_DIR / f"results_{timestamp}{SNAPSHOT_SUFFIX}"
+        try:
+            system.save_results(path)
+            stale = [old for old in stale if old != path]
+        except Exception as e:
+            print(f"⚠️  Could not snapshot results: {e}")
+    
+    for old in stale:
+        old.unlink(missing_ok=True)
 
 def has_analysis_results() -> bool:
     """Check if we have analysis results"""
@@ -73,26 +115,39 @@ async def upload_file(file: UploadFile = File(...)):
     """Handle file upload and analysis"""
     global analysis_system, current_results
     
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    if not file.filename.lower().endswith(('.csv',) + WORKBOOK_SUFFIXES):
+        raise HTTPException(status_code=400, detail="Only CSV and Excel (.xlsx) files are allowed")
     
     # Save uploaded file
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"upload_{timestamp}_{file.filename}"
     file_path = UPLOADS_DIR / filename
+    store = None
     
     try:
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        # Initialize analysis system
-        analysis_system = EnhancedPaymentPlanAnalysisSystem(str(REPORTS_DIR))
+        # Large exports are streamed, and their invoices spilled to disk instead of held in memory
+        chunksize = None
+        if file_path.stat().st_size > STREAMING_THRESHOLD_BYTES:
+            chunksize = STREAMING_CHUNK_ROWS
+            store = SQLiteInvoiceStore(str(CACHE_DIR / f"invoices_{timestamp}.sqlite"))
+        
+        # Initialize analysis system, building on the previous upload's results
+        previous_state = analysis_system.analysis_state if analysis_system else None
+        analysis_system = EnhancedPaymentPlanAnalysisSystem(str(REPORTS_DIR), quiet=True, parse_cache=parse_cache,
+                                                            incremental=True, previous_state=previous_state,
+                                                            invoice_store=store)
         
         # Run analysis
-        results = analysis_system.analyze_file(str(file_path))
+        results = analysis_system.analyze_file(str(file_path), chunksize=chunksize)
         
         if results:
             current_results = results
+            replace_invoice_store(store)
+            store = None
+            save_results_snapshot(analysis_system, timestamp)
             return JSONResponse({
                 "success": True,
                 "message": "File uploaded and analyzed successfully",
@@ -112,9 +167,12 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
     
     finally:
-        # Clean up uploaded file
+        # Clean up uploaded file, and the invoice store of a failed analysis
         if file_path.exists():
             file_path.unlink()
+        if store is not None:
+            store.close()
+            Path(store.path).unlink(missing_ok=True)
 
 @app.get("/api/results/summary")
 async def get_results_summary():
@@ -175,6 +233,22 @@ async def get_customer_details(customer_name: str):
     
     return JSONResponse(details)
 
+@app.get("/api/plans/{plan_id}/roadmap")
+async def get_payment_roadmap(
+    plan_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(6, ge=1, le=60)
+):
+    """Get one page of a payment plan's roadmap"""
+    if not analysis_system or not current_results:
+        raise HTTPException(status_code=404, detail="No analysis results available")
+    
+    roadmap = analysis_system.get_payment_roadmap(plan_id, page, page_size)
+    if roadmap is None:
+        raise HTTPException(status_code=404, detail=f"No tracked payment plan '{plan_id}'")
+    
+    return JSONResponse(roadmap)
+
 @app.get("/api/collections/priorities")
 async def get_collection_priorities(class_filter: Optional[str] = Query(None)):
     """Get prioritized collection list"""
@@ -184,6 +258,18 @@ async def get_collection_priorities(class_filter: Optional[str] = Query(None)):
     priorities = analysis_system.get_collection_priorities(class_filter)
     return JSONResponse(priorities)
 
+@app.get("/api/trends/delinquency")
+async def get_delinquency_trend(
+    months: int = Query(24, ge=1, le=120),
+    class_filter: Optional[str] = Query(None)
+):
+    """Get month-end delinquency trend of the analyzed portfolio"""
+    if not analysis_system or not current_results:
+        raise HTTPException(status_code=404, detail="No analysis results available")
+    
+    trend = analysis_system.get_delinquency_trend(months, class_filter)
+    return JSONResponse(trend)
+
 @app.get("/api/classes")
 async def get_available_classes():
     """Get list of available classes for filtering"""
@@ -284,6 +370,9 @@ async def clear_results():
     
     analysis_system = None
     current_results = None
+    replace_invoice_store(None)
+    for snapshot in RESULTS_SNAPSHOT_DIR.glob(f"*{SNAPSHOT_SUFFIX}"):
+        snapshot.unlink(missing_ok=True)
     
     return JSONResponse({"success": True, "message": "Results cleared"})
 
@@ -393,18 +482,14 @@ async def get_customer_projections(
         raise HTTPException(status_code=404, detail="No analysis results available")
     
     try:
-        calculator = PaymentProjectionCalculator()
+        calculator = PaymentProjectionCalculator(current_results['as_of'])
         
         # Get customer data
         customers_data = current_results['all_customers']
         
         # Apply class filter if specified
         if class_filter:
-            filtered_customers = {}
-            for name, customer in customers_data.items():
-                if class_filter in customer.all_classes:
-                    filtered_customers[name] = customer
-            customers_data = filtered_customers
+            customers_data = analysis_system.customers_in_class(class_filter)
         
         # Calculate projections
         projections = calculator.calculate_customer_projections(
@@ -439,18 +524,14 @@ async def get_portfolio_projections(
         raise HTTPException(status_code=404, detail="No analysis results available")
     
     try:
-        calculator = PaymentProjectionCalculator()
+        calculator = PaymentProjectionCalculator(current_results['as_of'])
         
         # Get customer data
         customers_data = current_results['all_customers']
         
         # Apply class filter if specified
         if class_filter:
-            filtered_customers = {}
-            for name, customer in customers_data.items():
-                if class_filter in customer.all_classes:
-                    filtered_customers[name] = customer
-            customers_data = filtered_customers
+            customers_data = analysis_system.customers_in_class(class_filter)
         
         # Calculate projections
         projections = calculator.calculate_customer_projections(
@@ -476,7 +557,7 @@ async def get_single_customer_projection(
         raise HTTPException(status_code=404, detail="No analysis results available")
     
     try:
-        calculator = PaymentProjectionCalculator()
+        calculator = PaymentProjectionCalculator(current_results['as_of'])
         
         # Get customer data
         customers_data = current_results['all_customers']
@@ -516,7 +597,7 @@ async def get_projections_summary(
         raise HTTPException(status_code=404, detail="No analysis results available")
     
     try:
-        calculator = PaymentProjectionCalculator()
+        calculator = PaymentProjectionCalculator(current_results['as_of'])
         
         # Get customer data
         customers_data = current_results['all_customers']
@@ -572,7 +653,7 @@ async def export_customer_projection(
         raise HTTPException(status_code=404, detail="No analysis results available")
     
     try:
-        calculator = PaymentProjectionCalculator()
+        calculator = PaymentProjectionCalculator(current_results['as_of'])
         
         # Get customer data
         customers_data = current_results['all_customers']
@@ -660,9 +741,23 @@ async def health_check():
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
+    global analysis_system, current_results
+    
     print("🚀 Payment Plan Analysis System Starting...")
     print(f"📁 Reports directory: {REPORTS_DIR}")
     print(f"📁 Uploads directory: {UPLOADS_DIR}")
+    
+    # Warm restart: bring back the results of the last upload
+    snapshot = latest_snapshot(RESULTS_SNAPSHOT_DIR)
+    if snapshot is not None:
+        try:
+            system = EnhancedPaymentPlanAnalysisSystem(str(REPORTS_DIR), quiet=True, parse_cache=parse_cache,
+                                                       incremental=True)
+            current_results = system.load_results(snapshot)
+            analysis_system = system
+            print(f"♻️  Restored analysis results from {snapshot.name}")
+        except Exception as e:
+            print(f"⚠️  Ignoring results snapshot {snapshot.name}: {e}")
     print("✅ FastAPI application ready!")
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""State carried between consecutive analysis runs for incremental re-analysis
+
+Each run records, per customer, a fingerprint of its invoices together with
+the objects built from them (the Customer, its issues, its plan metrics). The
+next run only rebuilds, re-analyzes and re-measures customers whose fingerprint
+changed, and patches the portfolio aggregate for them.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from models import Customer, CustomerIssue, Invoice, PaymentMetrics
+from snapshots import read_snapshot, write_snapshot
+
+
+def invoice_fingerprint(invoices: Iterable[Invoice]) -> str:
+    """Stable digest of the invoice fields a customer is built from
+
+    Uses a content hash rather than hash() so fingerprints compare across
+    processes and survive being saved to disk. Dates go in as text, which reads
+    the same for datetime and Timestamp values.
+    """
+    fields = [(inv.invoice_number, str(inv.date), inv.payment_terms, inv.original_amount,
+               inv.open_balance, inv.class_field) for inv in invoices]
+    digest = hashlib.blake2b(repr(fields).encode(), digest_size=16)
+    return digest.hexdigest()
+
+
+def customer_fingerprint(customer: Customer) -> str:
+    """Fingerprint of a built customer - its plan invoices in plan order"""
+    return invoice_fingerprint(inv for plan in customer.payment_plans for inv in plan.invoices)
+
+
+@dataclass
+class CustomerRecord:
+    """What one run produced for one customer"""
+    fingerprint: str
+    customer: Customer
+    issues: List[CustomerIssue] = field(default_factory=list)
+    metrics: List[PaymentMetrics] = field(default_factory=list)
+    metrics_key: Optional[tuple] = None  # EnhancedPaymentCalculator.metrics_as_of_key when measured
+    issues_valid_until: Optional[datetime] = None  # First invoice date after the run; "future dated" changes then
+
+
+@dataclass
+class AnalysisState:
+    """Per-customer results of the previous run plus its portfolio aggregate"""
+    parser_version: str
+    as_of: datetime
+    class_filter: Optional[str] = None
+    records: Dict[str, CustomerRecord] = field(default_factory=dict)
+    portfolio: Optional[object] = None  # enhanced_calculators.PortfolioAggregate
+
+    def save(self, path) -> int:
+        """Write the state to disk (see snapshots.write_snapshot)"""
+        return write_snapshot(path, self)
+
+    @staticmethod
+    def load(path) -> 'AnalysisState':
+        """Read a state written by save()"""
+        return read_snapshot(path)
@@ -0,0 +1,171 @@
+"""Export ingestion schema - which export columns are read, how they are typed, header checks
+
+QuickBooks open-invoice exports carry more columns than the parser looks at.
+Only the columns below are read; everything is text except Type and Class,
+which hold a handful of repeated values and are stored as categoricals.
+Exports arrive as CSV or as .xlsx workbooks; both come out as the same frames.
+"""
+
+from datetime import date, datetime
+from typing import Dict, Iterator, List
+import pandas as pd
+from openpyxl import load_workbook
+
+try:
+    import pyarrow  # noqa: F401 - only needed for pd.read_csv(engine='pyarrow')
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Placeholder headers pandas gives the unnamed leading columns -> parser names
+PLACEHOLDER_COLUMNS = {
+    'Unnamed: 0': '_0',
+    'Unnamed: 1': '_1',
+    'Unnamed: 2': '_2',
+}
+
+# Columns the parser uses, by standardized name
+REQUIRED_COLUMNS = ('_1', 'Type', 'Date', 'Num', 'FOB', 'Amount', 'Open Balance')
+OPTIONAL_COLUMNS = ('_2', 'Class')
+CATEGORICAL_COLUMNS = ('Type', 'Class')
+
+CSV_ENGINES = ('auto', 'c', 'pyarrow')
+
+# Excel cells hold dates and numbers; dates are written out the way the CSV export has them
+EXCEL_DATE_FORMAT = '%m/%d/%Y'
+WORKBOOK_SUFFIXES = ('.xlsx',)
+
+
+def is_workbook(file_path) -> bool:
+    """Whether an export is an Excel workbook rather than a CSV, by extension"""
+    return str(file_path).lower().endswith(WORKBOOK_SUFFIXES)
+
+
+class IngestionSchema:
+    """Column pruning, dtypes and header validation for export CSVs"""
+
+    def __init__(self, engine: str = 'auto', categorical: bool = True):
+        if engine not in CSV_ENGINES:
+            raise ValueError(f"Unknown CSV engine '{engine}'. Expected one of: {', '.join(CSV_ENGINES)}")
+        if engine == 'pyarrow' and not PYARROW_AVAILABLE:
+            raise ValueError("CSV engine 'pyarrow' requested but pyarrow is not installed")
+
+        self.engine = engine
+        self.categorical = categorical
+
+    def read_csv(self, file_path: str) -> pd.DataFrame:
+        """Read the needed columns of an export in one frame"""
+        columns = self.validate_header(file_path)
+        engine = self.engine
+        if engine == 'auto':
+            engine = 'pyarrow' if PYARROW_AVAILABLE else 'c'
+
+        frame = pd.read_csv(file_path, header=0, usecols=list(columns),
+                            dtype=self._dtypes(columns), engine=engine)
+        return self.standardize(frame)
+
+    def iter_csv(self, file_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        """Read the needed columns in frames of at most `chunksize` rows
+
+        The pyarrow engine cannot read in chunks, so chunked reads always use the
+        C engine. Columns are typed up front so typing never depends on which
+        rows share a chunk.
+        """
+        columns = self.validate_header(file_path)
+        reader = pd.read_csv(file_path, header=0, usecols=list(columns),
+                             dtype=self._dtypes(columns), chunksize=chunksize)
+        for chunk in reader:
+            yield self.standardize(chunk)
+
+    def iter_xlsx(self, file_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        """Read the needed columns of the first worksheet in frames of at most `chunksize` rows
+        
+        The workbook is opened read-only and rows are streamed as plain values, so
+        memory follows the chunk size rather than the workbook size. The first
+        non-empty row is the header. Frames match iter_csv: the same columns, text
+        cells and a row index that continues across chunks, so rows are numbered
+        as they would be in the CSV export of the same sheet.
+        """
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next((row for row in rows if any(cell is not None and cell != '' for cell in row)), None)
+            if header is None:
+                raise ValueError("Workbook has no rows")
+            header = [f'Unnamed: {i}' if cell is None or cell == '' else str(cell) for i, cell in enumerate(header)]
+            columns = self.resolve_columns(header)
+            positions = [header.index(raw) for raw in columns]
+            dtypes = self._dtypes(columns)
+            
+            start = 0
+            block = []
+            for row in rows:
+                block.append([_cell_text(row[i]) if i < len(row) else None for i in positions])
+                if len(block) == chunksize:
+                    yield self._xlsx_frame(block, columns, dtypes, start)
+                    start += len(block)
+                    block = []
+            if block:
+                yield self._xlsx_frame(block, columns, dtypes, start)
+        finally:
+            workbook.close()
+    
+    def _xlsx_frame(self, block: List[List], columns: Dict[str, str], dtypes: Dict[str, str],
+                    start: int) -> pd.DataFrame:
+        """One chunk of worksheet rows as a standardized frame"""
+        values = list(zip(*block))
+        frame = pd.DataFrame({
+            raw: pd.Series(values[i], dtype=dtypes[raw]) for i, raw in enumerate(columns)
+        })
+        frame.index = pd.RangeIndex(start, start + len(block))
+        return self.standardize(frame)
+    
+    def validate_header(self, file_path: str) -> Dict[str, str]:
+        """Check the header row and map the raw column names to read -> parser names
+
+        Raises ValueError naming the missing columns before any data is read.
+        """
+        header = list(pd.read_csv(file_path, header=0, nrows=0).columns)
+        return self.resolve_columns(header)
+
+    def resolve_columns(self, header: List[str]) -> Dict[str, str]:
+        """Raw -> standardized names for the wanted columns present in `header`"""
+        wanted = set(REQUIRED_COLUMNS) | set(OPTIONAL_COLUMNS)
+        columns = {}
+        for raw in header:
+            name = PLACEHOLDER_COLUMNS.get(raw, raw)
+            if name in wanted and name not in columns.values():
+                columns[raw] = name
+
+        missing = [name for name in REQUIRED_COLUMNS if name not in columns.values()]
+        if missing:
+            found = ', '.join(str(col) for col in header) or 'no columns'
+            raise ValueError(f"CSV header is missing required columns: {', '.join(missing)} (found: {found})")
+        return columns
+
+    def standardize(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Rename pandas' placeholder headers to the _0/_1/_2 names used by the parser"""
+        renames = {old: new for old, new in PLACEHOLDER_COLUMNS.items() if old in frame.columns}
+        if renames:
+            frame.rename(columns=renames, inplace=True)
+        return frame
+
+    def _dtypes(self, columns: Dict[str, str]) -> Dict[str, str]:
+        """read_csv dtype mapping, keyed by raw column name"""
+        return {
+            raw: 'category' if self.categorical and name in CATEGORICAL_COLUMNS else str
+            for raw, name in columns.items()
+        }
+
+
+def _cell_text(value):
+    """Worksheet cell value as the text the CSV export carries for it"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.strftime(EXCEL_DATE_FORMAT)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
@@ -0,0 +1,178 @@
+"""Disk-backed storage for parsed invoices
+
+For exports too large to keep every Invoice object in memory, the parser can
+write each plan's invoices to a local SQLite database as the plan is built and
+give the plan an InvoiceView instead of a list. A view loads its plan's
+invoices when it is read; a small cache of recently read plans keeps the
+analyzer, calculator and reporters - which walk one plan's invoices several
+times in a row - from going back to disk for each pass.
+"""
+
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from models import Invoice
+
+DEFAULT_CACHED_PLANS = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    customer TEXT NOT NULL,
+    plan_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    invoice_number TEXT,
+    date INTEGER,
+    payment_terms TEXT,
+    original_amount REAL,
+    open_balance REAL,
+    class_field TEXT,
+    row_index INTEGER,
+    raw_store INTEGER
+);
+CREATE INDEX IF NOT EXISTS invoices_by_plan ON invoices (customer, plan_id, position);
+"""
+
+
+class SQLiteInvoiceStore:
+    """Plan invoices in a SQLite file, indexed by customer and plan
+
+    The database is scratch space for one parse: it is created empty, written
+    without a journal and removed by close() when the store created the file.
+    """
+
+    def __init__(self, path: Optional[str] = None, cached_plans: int = DEFAULT_CACHED_PLANS):
+        self._owns_file = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix='.sqlite', prefix='invoices-')
+            os.close(fd)
+        elif os.path.exists(path):
+            os.remove(path)
+
+        self.path = str(path)
+        self.cached_plans = cached_plans
+        self._lock = threading.Lock()  # Web app endpoints read from worker threads
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + _SCHEMA)
+        self._raw_stores = []  # Row stores invoices point into, referenced by index
+        self._cache = OrderedDict()  # (customer, plan_id) -> invoices, most recent last
+        self.invoice_count = 0
+
+    def add_plan(self, customer_name: str, plan_id: str, invoices: List[Invoice]) -> 'InvoiceView':
+        """Write a plan's invoices and return the view that replaces the list"""
+        rows = [
+            (customer_name, plan_id, position, inv.invoice_number,
+             None if inv.date is None else pd.Timestamp(inv.date).value,
+             inv.payment_terms, inv.original_amount, inv.open_balance, inv.class_field,
+             inv.row_index, self._raw_store_id(inv.raw_store))
+            for position, inv in enumerate(invoices)
+        ]
+        with self._lock:
+            self._connection.executemany("INSERT INTO invoices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.invoice_count += len(rows)
+        return InvoiceView(self, customer_name, plan_id, len(rows))
+
+    def remove_customer(self, customer_name: str):
+        """Drop every stored plan of a customer (before it is rebuilt)"""
+        with self._lock:
+            deleted = self._connection.execute("DELETE FROM invoices WHERE customer = ?", (customer_name,)).rowcount
+            for key in [key for key in self._cache if key[0] == customer_name]:
+                del self._cache[key]
+        self.invoice_count -= deleted
+
+    def load(self, customer_name: str, plan_id: str) -> List[Invoice]:
+        """A plan's invoices in their original order"""
+        key = (customer_name, plan_id)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+            rows = self._connection.execute(
+                "SELECT invoice_number, date, payment_terms, original_amount, open_balance, class_field, "
+                "row_index, raw_store FROM invoices WHERE customer = ? AND plan_id = ? ORDER BY position",
+                key
+            ).fetchall()
+            invoices = [
+                Invoice(
+                    invoice_number=invoice_number,
+                    date=None if date is None else pd.Timestamp(date),
+                    payment_terms=payment_terms,
+                    original_amount=original_amount,
+                    open_balance=open_balance,
+                    class_field=class_field,
+                    row_index=row_index,
+                    raw_store=None if raw_store is None else self._raw_stores[raw_store]
+                )
+                for invoice_number, date, payment_terms, original_amount, open_balance, class_field,
+                    row_index, raw_store in rows
+            ]
+
+            self._cache[key] = invoices
+            if len(self._cache) > self.cached_plans:
+                self._cache.popitem(last=False)
+            return invoices
+
+    def close(self):
+        """Close the database, removing it if the store created it"""
+        with self._lock:
+            self._cache.clear()
+            self._connection.close()
+        if self._owns_file and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _raw_store_id(self, raw_store) -> Optional[int]:
+        if raw_store is None:
+            return None
+        for store_id, known in enumerate(self._raw_stores):
+            if known is raw_store:
+                return store_id
+        self._raw_stores.append(raw_store)
+        return len(self._raw_stores) - 1
+
+    def __getstate__(self):
+        raise pickle.PicklingError("SQLiteInvoiceStore cannot be pickled; pickle the InvoiceViews instead")
+
+
+class InvoiceView(Sequence):
+    """Read-only list of one plan's invoices, loaded from the store when read
+
+    Pickles as a plain list, so snapshots and worker results stay
+    self-contained after the store is gone.
+    """
+
+    __slots__ = ('store', 'customer_name', 'plan_id', '_length')
+
+    def __init__(self, store: SQLiteInvoiceStore, customer_name: str, plan_id: str, length: int):
+        self.store = store
+        self.customer_name = customer_name
+        self.plan_id = plan_id
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        return self.store.load(self.customer_name, self.plan_id)[index]
+
+    def __iter__(self):
+        return iter(self.store.load(self.customer_name, self.plan_id))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (InvoiceView, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"InvoiceView({self.plan_id!r}, {self._length} invoices)"
+
+    def __reduce__(self):
+        return (list, (list(self),))
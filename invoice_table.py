@@ -0,0 +1,228 @@
+"""Columnar layout of parsed invoices for plan and customer aggregates
+
+An InvoiceTable lays a batch of customers' invoices out customer by customer
+and, within a customer, plan by plan in the order each plan's payment terms
+were first seen. Plans and customers are then contiguous index ranges of the
+table, so plan totals, date bounds and dominant classes come from a few array
+operations over the whole batch instead of a Python pass per plan. The
+Invoice objects stay available in the same order for building PaymentPlans.
+Customers that are already built can be laid out the same way, for checks
+that run over a whole portfolio.
+"""
+
+from functools import cached_property
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import Customer, Invoice
+
+NO_CLASS = -1  # Class code of an invoice without a Class
+NO_DATE = np.iinfo(np.int64).min  # NaT as int64 nanoseconds
+
+
+def segment_sums(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Sum of every segment values[starts[i]:starts[i + 1]], added left to right
+
+    Gives exactly what the builtin sum() gives for each segment. np.add.reduceat
+    pairs and unrolls its additions, so its totals can differ in the last digit,
+    which is enough to move a plan across a status threshold.
+    """
+    lengths = np.diff(starts)
+    order = np.argsort(-lengths, kind='stable')  # Longest first: live segments are a prefix
+    sorted_lengths = lengths[order]
+    sorted_starts = starts[:-1][order]
+    sorted_totals = np.zeros(len(lengths))
+    for offset in range(int(sorted_lengths[0]) if len(lengths) else 0):
+        live = int(np.searchsorted(-sorted_lengths, -offset, side='left'))
+        sorted_totals[:live] += values[sorted_starts[:live] + offset]
+
+    totals = np.empty(len(lengths))
+    totals[order] = sorted_totals
+    return totals
+
+
+def segment_extremes(values: np.ndarray, starts: np.ndarray, missing: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions of the first smallest and the first largest value of every segment
+
+    Integer values equal to `missing` (the dtype's minimum) are skipped; a
+    segment with nothing else gets -1. First occurrences win ties, as with the
+    builtin min() and max(). Segments must not be empty.
+    """
+    lengths = np.diff(starts)
+    result = []
+    for extreme, fill in ((np.minimum, np.iinfo(values.dtype).max), (np.maximum, missing)):
+        filled = np.where(values == missing, fill, values)
+        best = extreme.reduceat(filled, starts[:-1])
+        hits = np.flatnonzero(filled == np.repeat(best, lengths))
+        hit_segments = np.searchsorted(starts, hits, side='right') - 1
+        first = np.ones(len(hits), dtype=bool)
+        first[1:] = hit_segments[1:] != hit_segments[:-1]
+
+        positions = np.full(len(lengths), -1, dtype=np.int64)
+        positions[hit_segments[first]] = hits[first]
+        positions[best == fill] = -1  # Nothing but missing values
+        result.append(positions)
+    return result[0], result[1]
+
+
+class InvoiceTable:
+    """A batch of customers' invoices in plan order, with the columns aggregates read
+
+    Plan p covers invoices[plan_starts[p]:plan_starts[p + 1]] and customer c
+    covers plans customer_plan_starts[c] to customer_plan_starts[c + 1].
+    """
+
+    def __init__(self, invoices: List[Invoice], customer_names: List[str], customer_plan_starts: np.ndarray,
+                 plan_starts: np.ndarray, plan_keys: List[str], plan_terms: Optional[List] = None):
+        self.invoices = invoices
+        self.customer_names = customer_names
+        self.customer_plan_starts = customer_plan_starts
+        self.plan_starts = plan_starts
+        self._plan_bounds = plan_starts.tolist()
+        self._customer_plan_bounds = customer_plan_starts.tolist()
+        self.plan_terms = plan_terms  # What the terms lookup returned for each plan's first invoice, when grouped
+        self.customer_starts = plan_starts[customer_plan_starts]  # Position of each customer's first invoice
+
+        plan_lengths = np.diff(plan_starts)
+        self.plan_ids = np.repeat(np.arange(len(plan_lengths), dtype=np.int32), plan_lengths)
+        self.customer_ids = np.repeat(np.arange(len(customer_names), dtype=np.int32), np.diff(self.customer_starts))
+
+        # Value columns
+        self.original_amount = np.array([inv.original_amount for inv in invoices], dtype=np.float64)
+        self.open_balance = np.array([inv.open_balance for inv in invoices], dtype=np.float64)
+        self.dates = np.array([NO_DATE if inv.date is None else inv.date.value for inv in invoices], dtype=np.int64)
+
+        # Class codes index self.classes; plans inherit terms codes from their key
+        class_codes = {}
+        self.class_codes = np.array([class_codes.setdefault(inv.class_field, len(class_codes))
+                                     if inv.class_field else NO_CLASS for inv in invoices], dtype=np.int32)
+        self.classes = list(class_codes)
+        terms_codes = {}
+        plan_terms_codes = [terms_codes.setdefault(key, len(terms_codes)) for key in plan_keys]
+        self.terms_codes = np.array(plan_terms_codes, dtype=np.int32)[self.plan_ids]
+        self.terms_keys = list(terms_codes)
+
+    @classmethod
+    def group(cls, customer_invoices: Dict[str, List[Invoice]], lookup: Callable) -> 'InvoiceTable':
+        """Lay out invoices by customer, then by plan
+
+        `lookup` maps an invoice's raw payment terms to normalized terms with a
+        `key`; invoices whose terms share a key form one plan. It is called once
+        per distinct raw value.
+        """
+        customer_names = list(customer_invoices)
+        invoices = [inv for name in customer_names for inv in customer_invoices[name]]
+        counts = np.array([len(customer_invoices[name]) for name in customer_names], dtype=np.int64)
+
+        terms_by_raw = {raw: lookup(raw) for raw in dict.fromkeys(inv.payment_terms for inv in invoices)}
+        key_codes = {}
+        keys = np.array([key_codes.setdefault(terms_by_raw[inv.payment_terms].key, len(key_codes))
+                         for inv in invoices], dtype=np.int64)
+
+        # A plan is a (customer, key) pair; pairs are numbered by first appearance
+        customers = np.repeat(np.arange(len(customer_names), dtype=np.int64), counts)
+        pairs, first_seen, pair_of_invoice = np.unique(customers * max(len(key_codes), 1) + keys,
+                                                       return_index=True, return_inverse=True)
+        plan_order = np.argsort(first_seen, kind='stable')
+        plan_of_pair = np.empty(len(pairs), dtype=np.int64)
+        plan_of_pair[plan_order] = np.arange(len(pairs))
+        plan_of_invoice = plan_of_pair[pair_of_invoice]
+
+        layout = np.argsort(plan_of_invoice, kind='stable')
+        plan_lengths = np.bincount(plan_of_invoice, minlength=len(pairs))
+        plan_starts = np.concatenate(([0], np.cumsum(plan_lengths)))
+        plan_customers = customers[first_seen[plan_order]]
+        customer_plan_starts = np.concatenate(([0], np.cumsum(np.bincount(plan_customers,
+                                                                          minlength=len(customer_names)))))
+
+        ordered = [invoices[i] for i in layout.tolist()]
+        plan_terms = [terms_by_raw[ordered[start].payment_terms] for start in plan_starts[:-1].tolist()]
+        return cls(ordered, customer_names, customer_plan_starts, plan_starts,
+                   [terms.key for terms in plan_terms], plan_terms)
+
+    @classmethod
+    def from_customers(cls, customers: List[Customer]) -> 'InvoiceTable':
+        """Lay out built customers' invoices as their plans already group them"""
+        plans = [plan for customer in customers for plan in customer.payment_plans]
+        invoices = [inv for plan in plans for inv in plan.invoices]
+        plan_starts = np.concatenate(([0], np.cumsum([len(plan.invoices) for plan in plans], dtype=np.int64)))
+        customer_plan_starts = np.concatenate(([0], np.cumsum([len(customer.payment_plans) for customer in customers],
+                                                              dtype=np.int64)))
+        return cls(invoices, [customer.customer_name for customer in customers], customer_plan_starts,
+                   plan_starts, [plan.payment_terms_raw or 'no_terms' for plan in plans])
+
+    @cached_property
+    def invoice_numbers(self) -> np.ndarray:
+        """Invoice numbers as an object array"""
+        numbers = np.empty(len(self.invoices), dtype=object)
+        numbers[:] = [inv.invoice_number for inv in self.invoices]
+        return numbers
+
+    @cached_property
+    def plan_positions(self) -> np.ndarray:
+        """Position of every invoice within its plan, from 0"""
+        return np.arange(len(self.invoices)) - self.plan_starts[:-1][self.plan_ids]
+
+    def customer_plans(self, customer: int) -> range:
+        """Plan numbers of one customer"""
+        return range(self._customer_plan_bounds[customer], self._customer_plan_bounds[customer + 1])
+
+    def customer_invoices(self, customer: int) -> List[Invoice]:
+        """One customer's invoices, plan by plan"""
+        return self.invoices[self._plan_bounds[self._customer_plan_bounds[customer]]:
+                             self._plan_bounds[self._customer_plan_bounds[customer + 1]]]
+
+    def plan_invoices(self, plan: int) -> List[Invoice]:
+        """One plan's invoices in their original order"""
+        return self.invoices[self._plan_bounds[plan]:self._plan_bounds[plan + 1]]
+
+    def plan_totals(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Original amount and open balance of every plan"""
+        return segment_sums(self.original_amount, self.plan_starts), segment_sums(self.open_balance, self.plan_starts)
+
+    def customer_totals(self, plan_values: np.ndarray) -> np.ndarray:
+        """Per-plan values added up per customer, plan by plan"""
+        return segment_sums(plan_values, self.customer_plan_starts)
+
+    def plan_date_bounds(self) -> Tuple[List[Optional[object]], List[Optional[object]]]:
+        """Earliest and latest invoice date of every plan (None without dates)"""
+        return self._date_bounds(self.plan_starts)
+
+    def customer_date_bounds(self) -> Tuple[List[Optional[object]], List[Optional[object]]]:
+        """Earliest and latest invoice date of every customer"""
+        return self._date_bounds(self.customer_starts)
+
+    def plan_dominant_classes(self) -> List[Optional[str]]:
+        """Most common class of every plan; ties go to the class seen first"""
+        has_class = np.flatnonzero(self.class_codes != NO_CLASS)
+        pairs, first_seen, counts = np.unique(self.plan_ids[has_class].astype(np.int64) * len(self.classes)
+                                              + self.class_codes[has_class],
+                                              return_index=True, return_counts=True)
+        plans = pairs // max(len(self.classes), 1)
+        order = np.lexsort((first_seen, -counts, plans))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = plans[order][1:] != plans[order][:-1]
+
+        dominant = [None] * (len(self.plan_starts) - 1)
+        for plan, code in zip(plans[order][first].tolist(), (pairs % max(len(self.classes), 1))[order][first].tolist()):
+            dominant[plan] = self.classes[code]
+        return dominant
+
+    def customer_classes(self) -> List[List[str]]:
+        """Distinct classes of every customer, in the order they appear"""
+        has_class = np.flatnonzero(self.class_codes != NO_CLASS)
+        pairs, first_seen = np.unique(self.customer_ids[has_class].astype(np.int64) * len(self.classes)
+                                      + self.class_codes[has_class], return_index=True)
+        order = np.argsort(first_seen, kind='stable')
+
+        classes = [[] for _ in self.customer_names]
+        width = max(len(self.classes), 1)
+        for pair in pairs[order].tolist():
+            classes[pair // width].append(self.classes[pair % width])
+        return classes
+
+    def _date_bounds(self, starts: np.ndarray) -> Tuple[List, List]:
+        earliest, latest = segment_extremes(self.dates, starts, NO_DATE)
+        return ([self.invoices[i].date if i >= 0 else None for i in earliest.tolist()],
+                [self.invoices[i].date if i >= 0 else None for i in latest.tolist()])
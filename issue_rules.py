@@ -0,0 +1,213 @@
+"""Plan-level data quality checks, evaluated over a whole portfolio at once
+
+Each check is an IssueRule: a function from a RuleContext (the portfolio's
+InvoiceTable, its plans and the analysis date) to a boolean mask over every
+invoice, or over every plan for per_plan rules. find_plan_issues evaluates
+the rules and builds one CustomerIssue per rule for every plan the mask
+touches. A new check is added by registering a rule; rules run, and a plan's
+issues are listed, in registration order.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from invoice_table import InvoiceTable, NO_CLASS, NO_DATE
+from models import CustomerIssue, ErrorType, IssueSeverity, PaymentFrequency, PaymentPlan
+
+# How a rule lists the invoices behind an issue
+AFFECTED_NUMBERS = 'numbers'  # Invoice numbers (every invoice of the plan for per_plan rules)
+AFFECTED_POSITIONS = 'positions'  # "Invoice 3" - for invoices that have no usable number
+AFFECTED_NONE = 'none'
+
+
+class RuleContext:
+    """What rules look at: the invoice table, its plans in table order and the analysis date"""
+
+    def __init__(self, table: InvoiceTable, plans: List[PaymentPlan], today: datetime):
+        self.table = table
+        self.plans = plans
+        self.today = today
+
+    @cached_property
+    def today_value(self) -> int:
+        """The analysis date in the table's date units"""
+        return pd.Timestamp(self.today).value
+
+    @cached_property
+    def numbers(self) -> pd.Series:
+        """Invoice numbers as a Series, for vectorized string checks"""
+        return pd.Series(self.table.invoice_numbers, dtype=object)
+
+    def plan_values(self, attribute: str) -> np.ndarray:
+        """One attribute of every plan"""
+        return np.array([getattr(plan, attribute) for plan in self.plans])
+
+
+@dataclass(frozen=True)
+class IssueRule:
+    """A data quality check and the issue it reports
+
+    description and impact are format strings given the plan (`plan`) and the
+    number of affected invoices (`count`).
+    """
+    issue_type: ErrorType
+    severity: IssueSeverity
+    check: Callable[[RuleContext], np.ndarray]  # Invoice mask, or plan mask when per_plan
+    description: str
+    impact: str
+    suggested_fix: Optional[str] = None
+    field_name: Optional[str] = None
+    per_plan: bool = False
+    affected: str = AFFECTED_NUMBERS
+    current_value: Optional[Callable[[PaymentPlan], Optional[str]]] = None
+
+
+ISSUE_RULES: List[IssueRule] = []
+
+
+def register_rule(rule: IssueRule) -> IssueRule:
+    """Add a check to the rules every analyzer runs by default"""
+    ISSUE_RULES.append(rule)
+    return rule
+
+
+def find_plan_issues(table: InvoiceTable, plans: List[PaymentPlan], today: datetime,
+                     rules: Optional[List[IssueRule]] = None) -> List[List[CustomerIssue]]:
+    """Issues of every plan in the table (plans in table order), in rule order"""
+    context = RuleContext(table, plans, today)
+    plan_issues = [[] for _ in plans]
+
+    for rule in ISSUE_RULES if rules is None else rules:
+        mask = np.asarray(rule.check(context), dtype=bool)
+        if rule.per_plan:
+            hit_plans = np.flatnonzero(mask)
+            invoice_mask = mask[table.plan_ids] if rule.affected != AFFECTED_NONE else None
+        else:
+            invoice_mask = mask
+            hit_plans = np.flatnonzero(np.bincount(table.plan_ids[mask], minlength=len(plans)))
+        if not len(hit_plans):
+            continue
+
+        # Affected invoices, grouped by plan (the table keeps each plan's invoices together)
+        if invoice_mask is None or rule.affected == AFFECTED_NONE:
+            labels = []
+            starts = stops = np.zeros(len(hit_plans), dtype=np.int64)
+        else:
+            hits = np.flatnonzero(invoice_mask)
+            if rule.affected == AFFECTED_POSITIONS:
+                labels = [f'Invoice {position + 1}' for position in table.plan_positions[hits].tolist()]
+            else:
+                labels = table.invoice_numbers[hits].tolist()
+            hit_plan_ids = table.plan_ids[hits]
+            starts = np.searchsorted(hit_plan_ids, hit_plans, side='left')
+            stops = np.searchsorted(hit_plan_ids, hit_plans, side='right')
+
+        for plan_index, start, stop in zip(hit_plans.tolist(), starts.tolist(), stops.tolist()):
+            plan = plans[plan_index]
+            affected = labels[start:stop]
+            plan_issues[plan_index].append(CustomerIssue(
+                customer_name=plan.customer_name,
+                issue_type=rule.issue_type,
+                severity=rule.severity,
+                description=rule.description.format(plan=plan, count=len(affected)),
+                affected_invoices=affected,
+                impact=rule.impact.format(plan=plan, count=len(affected)),
+                suggested_fix=rule.suggested_fix,
+                field_name=rule.field_name,
+                current_value=rule.current_value(plan) if rule.current_value else None
+            ))
+
+    return plan_issues
+
+
+# Built-in checks, in the order a plan's issues are listed
+
+register_rule(IssueRule(
+    issue_type=ErrorType.NO_PAYMENT_TERMS,
+    severity=IssueSeverity.CRITICAL,
+    check=lambda ctx: (ctx.plan_values('monthly_amount') == 0)
+                      | (ctx.plan_values('frequency') == PaymentFrequency.UNDEFINED),
+    per_plan=True,
+    description='Plan {plan.plan_id}: No payment terms specified',
+    impact='Cannot calculate payment schedule for ${plan.total_open:,.2f} balance',
+    suggested_fix='Add payment amount and frequency to FOB field',
+    field_name='FOB',
+    current_value=lambda plan: plan.payment_terms_raw
+))
+
+register_rule(IssueRule(
+    issue_type=ErrorType.FUTURE_DATED,
+    severity=IssueSeverity.WARNING,
+    check=lambda ctx: (ctx.table.dates != NO_DATE) & (ctx.table.dates > ctx.today_value),
+    description='Plan {plan.plan_id}: Has future-dated invoices',
+    impact='Payment calculations may be incorrect',
+    suggested_fix='Verify invoice dates and correct if needed',
+    field_name='Date'
+))
+
+register_rule(IssueRule(
+    issue_type=ErrorType.ASTERISK_INVOICE,
+    severity=IssueSeverity.INFO,
+    check=lambda ctx: ctx.numbers.str.contains('*', regex=False).to_numpy(dtype=bool, na_value=False),
+    description='Plan {plan.plan_id}: Invoice numbers contain asterisk (*)',
+    impact='May indicate special handling required',
+    suggested_fix='Review if asterisk notation is intentional'
+))
+
+register_rule(IssueRule(
+    issue_type=ErrorType.MISSING_INVOICE_NUMBERS,
+    severity=IssueSeverity.INFO,
+    check=lambda ctx: (ctx.numbers.isna() | (ctx.numbers.str.strip() == '')).to_numpy(dtype=bool),
+    affected=AFFECTED_POSITIONS,
+    description='Plan {plan.plan_id}: {count} invoices have no invoice number',
+    impact='May complicate tracking specific invoices',
+    suggested_fix='Add unique invoice numbers',
+    field_name='Num'
+))
+
+register_rule(IssueRule(
+    issue_type=ErrorType.MISSING_CLASS,
+    severity=IssueSeverity.WARNING,
+    check=lambda ctx: ctx.table.class_codes == NO_CLASS,
+    description='Plan {plan.plan_id}: {count} invoices missing class designation',
+    impact='Cannot filter or categorize these invoices properly',
+    suggested_fix='Add class designation (BR, TSA, KL, etc.)',
+    field_name='Class'
+))
+
+register_rule(IssueRule(
+    issue_type=ErrorType.INVALID_AMOUNT,
+    severity=IssueSeverity.CRITICAL,
+    check=lambda ctx: (ctx.table.open_balance < 0) | (ctx.table.original_amount < 0),
+    description='Plan {plan.plan_id}: Invoices with negative amounts',
+    impact='Negative amounts will cause calculation errors',
+    suggested_fix='Correct negative amounts or review invoice entries',
+    field_name='Amount/Open Balance'
+))
+
+# Open balance above the original amount is an impossible scenario
+register_rule(IssueRule(
+    issue_type=ErrorType.INVALID_AMOUNT,
+    severity=IssueSeverity.CRITICAL,
+    check=lambda ctx: (ctx.table.open_balance > ctx.table.original_amount) & (ctx.table.original_amount > 0),
+    description='Plan {plan.plan_id}: Open balance exceeds original amount',
+    impact='Impossible balance scenario - data error',
+    suggested_fix='Review and correct amount fields',
+    field_name='Open Balance vs Amount'
+))
+
+register_rule(IssueRule(
+    issue_type=ErrorType.NESTED_CUSTOMER,
+    severity=IssueSeverity.WARNING,
+    check=lambda ctx: ctx.plan_values('is_nested').astype(bool),
+    per_plan=True,
+    affected=AFFECTED_NONE,
+    description='Plan {plan.plan_id}: Nested under {plan.parent_customer}',
+    impact='May need to be combined with parent customer',
+    suggested_fix='Decide if this should be merged with parent customer'
+))
@@ -0,0 +1,326 @@
+"""Plan metrics for a whole portfolio, at one or many as-of dates
+
+A PlanMetricsEngine lays the plans EnhancedPaymentCalculator measures out as
+NumPy columns - monthly amount, frequency, totals, earliest invoice date - and
+evaluates months elapsed, expected payments, months behind and status for
+every plan at every requested as-of date in one pass, with exactly the
+arithmetic of plan_schedule. Balances are those of the parsed
+export, so evaluating earlier dates shows where each plan's schedule stood
+then against what has been paid by now; a delinquency trend over month-ends
+comes from a single parse instead of one analysis per date.
+
+The same columns give percent paid and completion, PaymentMetrics objects
+for the plans they are requested for, and the portfolio rollups of
+calculate_portfolio_metrics as grouped reductions. Totals are added up left
+to right in plan order, so they equal the running totals of
+PortfolioAggregate to the last digit.
+"""
+
+import math
+from operator import attrgetter
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models import Customer, CustomerStatus, PaymentFrequency, PaymentMetrics, PaymentPlan, PaymentRoadmap
+from plan_schedule import DAYS_PER_MONTH, INTERVAL_MONTHS
+
+NS_PER_DAY = 86_400 * 10**9
+PAYMENT_DAY = 15  # Payments fall on the 15th, as in EnhancedPaymentCalculator
+
+# Frequency codes index the per-frequency tables below
+FREQUENCY_CODES = {
+    PaymentFrequency.MONTHLY: 0,
+    PaymentFrequency.QUARTERLY: 1,
+    PaymentFrequency.BIMONTHLY: 2,
+    PaymentFrequency.UNDEFINED: 3
+}
+PAYMENT_INTERVALS = np.array([INTERVAL_MONTHS[frequency] for frequency in FREQUENCY_CODES], dtype=np.int64)
+HAS_SCHEDULE = np.array([True, True, True, False])  # Undefined frequencies expect no payments
+
+FREQUENCY_VALUES = [frequency.value for frequency in FREQUENCY_CODES]  # By code
+FREQUENCY_VALUE_CODES = {value: code for code, value in enumerate(FREQUENCY_VALUES)}
+
+# Status codes index STATUSES
+STATUS_CURRENT, STATUS_BEHIND, STATUS_COMPLETED = 0, 1, 2
+STATUSES = [CustomerStatus.CURRENT, CustomerStatus.BEHIND, CustomerStatus.COMPLETED]
+
+
+def month_ends(end: datetime, months: int = 24) -> List[pd.Timestamp]:
+    """The last `months` month-ends on or before `end`, oldest first"""
+    return list(pd.date_range(end=pd.Timestamp(end).normalize(), periods=months, freq='ME'))
+
+
+@dataclass
+class PlanSchedule:
+    """Where every plan's schedule stands at each as-of date; arrays are (dates, plans)"""
+    as_of: List[datetime]
+    started: np.ndarray  # The plan's earliest invoice is on or before the date
+    months_elapsed: np.ndarray
+    expected_payments: np.ndarray
+    payment_difference: np.ndarray
+    months_behind: np.ndarray
+    status_codes: np.ndarray
+
+
+class PlanMetricsEngine:
+    """Schedule metrics of many plans at many as-of dates over NumPy columns"""
+
+    def __init__(self, plans: List[PaymentPlan]):
+        self.plans = plans
+        self.monthly_amount = _column(plans, 'monthly_amount')
+        self.total_original = _column(plans, 'total_original')
+        self.total_open = _column(plans, 'total_open')
+        self.actual_payments = self.total_original - self.total_open
+        self.earliest = pd.DatetimeIndex([plan.earliest_date for plan in plans]).as_unit('ns').asi8
+
+        # Frequencies compare by identity, which is much cheaper than hashing each enum member
+        frequencies = _column(plans, 'frequency', object)
+        self.frequency_codes = np.zeros(len(plans), dtype=np.int64)
+        for frequency, code in FREQUENCY_CODES.items():
+            self.frequency_codes[frequencies == frequency] = code
+
+        self.customer_codes, self.customer_names = _first_seen_codes([plan.customer_name for plan in plans])
+
+    @classmethod
+    def from_customers(cls, customers: Iterable[Customer], class_filter: Optional[str] = None) -> 'PlanMetricsEngine':
+        """The plans calculate_customer_metrics measures - clean, with an amount and a start date"""
+        return cls([plan for customer in customers for plan in customer.payment_plans
+                    if not plan.has_issues and plan.monthly_amount > 0 and plan.earliest_date
+                    and (not class_filter or plan.class_filter == class_filter)])
+
+    def schedule(self, as_of_dates: List[datetime]) -> PlanSchedule:
+        """Months elapsed, expected payments, months behind and status of every plan at every date"""
+        as_of_values = np.array([pd.Timestamp(as_of).value for as_of in as_of_dates], dtype=np.int64)
+        elapsed_ns = as_of_values[:, None] - self.earliest[None, :]
+        days_elapsed = elapsed_ns // NS_PER_DAY  # Whole days, rounded down as timedelta.days is
+        months_elapsed = np.ceil(days_elapsed / DAYS_PER_MONTH).astype(np.int64)
+
+        intervals = PAYMENT_INTERVALS[self.frequency_codes]
+        expected = np.where(HAS_SCHEDULE[self.frequency_codes], (months_elapsed // intervals) * self.monthly_amount, 0.0)
+        difference = self.actual_payments - expected
+
+        behind_by = np.ceil(-difference / self.monthly_amount * intervals)
+        months_behind = np.where(difference < 0, behind_by, 0).astype(np.int64)
+
+        status_codes = np.where(months_behind > 0, STATUS_BEHIND, STATUS_CURRENT)
+        status_codes = np.where(self.total_open == 0, STATUS_COMPLETED, status_codes).astype(np.int8)
+
+        return PlanSchedule(
+            as_of=list(as_of_dates),
+            started=elapsed_ns >= 0,
+            months_elapsed=months_elapsed,
+            expected_payments=expected,
+            payment_difference=difference,
+            months_behind=months_behind,
+            status_codes=status_codes
+        )
+
+    @cached_property
+    def percent_paid(self) -> np.ndarray:
+        """Share of the original amount paid, in percent"""
+        percent = np.zeros(len(self.plans))
+        has_original = self.total_original > 0
+        percent[has_original] = self.actual_payments[has_original] / self.total_original[has_original] * 100
+        return percent
+
+    @cached_property
+    def months_remaining(self) -> np.ndarray:
+        """Months until the open balance is paid off on schedule; 0 once it is"""
+        payments_remaining = np.ceil(self.total_open / self.monthly_amount)
+        return np.where(self.total_open > 0, payments_remaining * PAYMENT_INTERVALS[self.frequency_codes],
+                        0).astype(np.int64)
+
+    def payment_metrics(self, as_of: datetime, positions: Optional[Iterable[int]] = None) -> List[PaymentMetrics]:
+        """calculate_plan_metrics of the plans at `positions` (default all), in plan order"""
+        schedule = self.schedule([as_of])
+        months_elapsed = schedule.months_elapsed[0].tolist()
+        expected = schedule.expected_payments[0].tolist()
+        difference = schedule.payment_difference[0].tolist()
+        months_behind = schedule.months_behind[0].tolist()
+        status_codes = schedule.status_codes[0].tolist()
+        actual = self.actual_payments.tolist()
+        percent_paid = self.percent_paid.tolist()
+        months_remaining = self.months_remaining.tolist()
+        intervals = PAYMENT_INTERVALS[self.frequency_codes].tolist()
+
+        # Completion falls on the payment day, months_remaining months from the as-of month;
+        # roadmaps start on the payment day of the as-of month
+        first_month = as_of.year * 12 + as_of.month - 1
+        payment_day = as_of.replace(day=PAYMENT_DAY)
+
+        metrics = []
+        for i in range(len(self.plans)) if positions is None else positions:
+            plan = self.plans[i]
+            frequency = plan.frequency.value
+            completion_month = first_month + months_remaining[i]
+            if months_remaining[i] > 0:
+                roadmap = PaymentRoadmap(start=payment_day, interval_months=intervals[i], amount=plan.monthly_amount,
+                                         balance=plan.total_open, frequency=frequency, as_of=as_of)
+            else:
+                roadmap = PaymentRoadmap()
+            metrics.append(PaymentMetrics(
+                customer_name=plan.customer_name,
+                plan_id=plan.plan_id,
+                monthly_payment=plan.monthly_amount,
+                frequency=frequency,
+                total_owed=plan.total_open,
+                original_amount=plan.total_original,
+                percent_paid=round(percent_paid[i], 1),
+                months_elapsed=months_elapsed[i],
+                expected_payments=round(expected[i], 2),
+                actual_payments=round(actual[i], 2),
+                payment_difference=round(difference[i], 2),
+                months_behind=months_behind[i],
+                status=STATUSES[status_codes[i]],
+                projected_completion=payment_day.replace(year=completion_month // 12, month=completion_month % 12 + 1)
+                if months_remaining[i] > 0 else None,
+                months_remaining=months_remaining[i],
+                class_field=plan.class_filter,
+                payment_roadmap=roadmap
+            ))
+        return metrics
+
+    def portfolio_metrics(self, as_of: datetime) -> Dict:
+        """calculate_portfolio_metrics of every plan's metrics at `as_of`, straight from the columns"""
+        schedule = self.schedule([as_of])
+        status_codes = schedule.status_codes[0]
+
+        # PaymentMetrics carry differences rounded to cents; only behind plans' are read
+        difference = schedule.payment_difference[0].copy()
+        behind = np.flatnonzero(status_codes == STATUS_BEHIND)
+        difference[behind] = [round(value, 2) for value in difference[behind].tolist()]
+
+        return _rollup(
+            customer_codes=self.customer_codes,
+            customer_count=len(self.customer_names),
+            total_owed=self.total_open,
+            monthly_payment=self.monthly_amount,
+            frequency_codes=self.frequency_codes,
+            class_keys=[plan.class_filter or 'Unknown' for plan in self.plans],
+            status_codes=status_codes,
+            payment_difference=difference,
+            months_behind=schedule.months_behind[0]
+        )
+
+    def delinquency_trend(self, as_of_dates: List[datetime]) -> List[dict]:
+        """Portfolio delinquency at each date, oldest first as given
+
+        Only plans started by a date count at that date. Behind amounts are
+        capped at the balance owed and customers are behind when any of their
+        plans is, as in the portfolio metrics.
+        """
+        schedule = self.schedule(as_of_dates)
+        behind_amount = np.minimum(-schedule.payment_difference, self.total_open)
+
+        trend = []
+        for row, as_of in enumerate(schedule.as_of):
+            started = schedule.started[row]
+            behind = started & (schedule.status_codes[row] == STATUS_BEHIND)
+            customers_tracked = int(np.count_nonzero(np.bincount(self.customer_codes[started],
+                                                                 minlength=len(self.customer_names))))
+            customers_behind = int(np.count_nonzero(np.bincount(self.customer_codes[behind],
+                                                                minlength=len(self.customer_names))))
+            plans_behind = int(np.count_nonzero(behind))
+            months_behind = int(schedule.months_behind[row][behind].sum())
+
+            trend.append({
+                'as_of': pd.Timestamp(as_of).strftime('%Y-%m-%d'),
+                'plans_tracked': int(np.count_nonzero(started)),
+                'plans_behind': plans_behind,
+                'customers_tracked': customers_tracked,
+                'customers_behind': customers_behind,
+                'percentage_behind': customers_behind / customers_tracked * 100 if customers_tracked else 0,
+                'expected_payments': round(float(schedule.expected_payments[row][started].sum()), 2),
+                'total_behind_amount': round(float(behind_amount[row][behind].sum()), 2),
+                'average_months_behind': math.ceil(months_behind / plans_behind) if plans_behind else 0
+            })
+        return trend
+
+
+def portfolio_rollup(metrics: List[PaymentMetrics]) -> Dict:
+    """Portfolio metrics of some plans' metrics, in the calculate_portfolio_metrics format"""
+    customer_codes, customers = _first_seen_codes([metric.customer_name for metric in metrics])
+    behind = np.array([metric.status is CustomerStatus.BEHIND for metric in metrics], dtype=bool)
+    completed = np.array([metric.status is CustomerStatus.COMPLETED for metric in metrics], dtype=bool)
+    return _rollup(
+        customer_codes=customer_codes,
+        customer_count=len(customers),
+        total_owed=np.array([metric.total_owed for metric in metrics], dtype=np.float64),
+        monthly_payment=np.array([metric.monthly_payment for metric in metrics], dtype=np.float64),
+        frequency_codes=np.array([FREQUENCY_VALUE_CODES[metric.frequency] for metric in metrics], dtype=np.int64),
+        class_keys=[metric.class_field or 'Unknown' for metric in metrics],
+        status_codes=np.where(behind, STATUS_BEHIND, np.where(completed, STATUS_COMPLETED, STATUS_CURRENT)),
+        payment_difference=np.array([metric.payment_difference for metric in metrics], dtype=np.float64),
+        months_behind=np.array([metric.months_behind for metric in metrics], dtype=np.int64)
+    )
+
+
+def _column(items: List, attribute: str, dtype=np.float64) -> np.ndarray:
+    """One attribute of every item as an array"""
+    return np.fromiter(map(attrgetter(attribute), items), dtype, len(items))
+
+
+def _first_seen_codes(keys: List) -> Tuple[np.ndarray, List]:
+    """Codes numbering the distinct keys in order of first appearance, and those keys"""
+    codes, distinct = pd.factorize(np.array(keys, dtype=object))
+    return codes.astype(np.int64), list(distinct)
+
+
+def _running_total(values: np.ndarray) -> float:
+    """values added up left to right, as a running total += gives"""
+    return float(np.cumsum(values)[-1]) if len(values) else 0
+
+
+def _grouped_totals(values: np.ndarray, codes: np.ndarray, groups: int) -> List[float]:
+    """Running total of the values of each group"""
+    order = np.argsort(codes, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=groups)))).tolist()
+    ordered = values[order]
+    return [_running_total(ordered[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _buckets(codes: np.ndarray, distinct: List, total_owed: np.ndarray) -> Dict:
+    """Plan count and amount owed per key, keys in order of first appearance"""
+    counts = np.bincount(codes, minlength=len(distinct)).tolist()
+    totals = _grouped_totals(total_owed, codes, len(distinct))
+    return {key: {'count': count, 'total_owed': total} for key, count, total in zip(distinct, counts, totals)}
+
+
+def _rollup(customer_codes: np.ndarray, customer_count: int, total_owed: np.ndarray, monthly_payment: np.ndarray,
+            frequency_codes: np.ndarray, class_keys: List[str], status_codes: np.ndarray,
+            payment_difference: np.ndarray, months_behind: np.ndarray) -> Dict:
+    """Portfolio totals, customer status counts and class/frequency buckets of plan columns"""
+    behind = status_codes == STATUS_BEHIND
+    monthly_share = np.where(HAS_SCHEDULE[frequency_codes],
+                             monthly_payment / PAYMENT_INTERVALS[frequency_codes], 0.0)
+    behind_amount = np.minimum(np.abs(payment_difference[behind]), total_owed[behind])
+
+    # A customer's worst plan status counts: behind, then completed, then current
+    customers_behind = np.bincount(customer_codes[behind], minlength=customer_count) > 0
+    customers_completed = np.bincount(customer_codes[status_codes == STATUS_COMPLETED],
+                                      minlength=customer_count) > 0
+    behind_count = int(np.count_nonzero(customers_behind))
+    completed_count = int(np.count_nonzero(customers_completed & ~customers_behind))
+
+    behind_plans = int(np.count_nonzero(behind))
+    behind_months = int(months_behind[behind].sum())
+    return {
+        'total_customers': customer_count,
+        'total_plans': len(total_owed),
+        'total_outstanding': _running_total(total_owed),
+        'expected_monthly': _running_total(monthly_share[HAS_SCHEDULE[frequency_codes]]),
+        'customers_current': customer_count - behind_count - completed_count,
+        'customers_behind': behind_count,
+        'customers_completed': completed_count,
+        'average_months_behind': math.ceil(behind_months / behind_plans if behind_plans else 0),
+        'total_behind_amount': _running_total(behind_amount),
+        'percentage_behind': (behind_count / customer_count * 100) if customer_count else 0,
+        'plans_by_class': _buckets(*_first_seen_codes(class_keys), total_owed),
+        'plans_by_frequency': _buckets(*_first_seen_codes([FREQUENCY_VALUES[code] for code in frequency_codes.tolist()]),
+                                       total_owed)
+    }
@@ -1,9 +1,12 @@
 """Enhanced data models for the payment plan analysis system - Phase 1"""
 
+from bisect import bisect_right
+from collections.abc import Sequence
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from typing import List, Optional, Dict, Union
 from enum import Enum
+import math
 
 class IssueSeverity(Enum):
     CRITICAL = "critical"
@@ -39,7 +42,39 @@ class ErrorType(Enum):
     MISSING_CUSTOMER_NAME = "missing_customer_name"
     FORMATTING_ERROR = "formatting_error"
 
-@dataclass
+class RawRowStore:
+    """Columnar copy of the export rows behind parsed invoices
+    
+    Invoices hold a position into this store instead of a dict of the whole
+    row; a row is only materialized when something reads Invoice.raw_data.
+    """
+    
+    def __init__(self):
+        self._starts = []  # First position of each block
+        self._blocks = []
+        self.size = 0
+    
+    def append(self, frame) -> int:
+        """Add a block of rows and return the position of its first row"""
+        start = self.size
+        if len(frame):
+            self._starts.append(start)
+            self._blocks.append(frame.reset_index(drop=True))
+            self.size += len(frame)
+        return start
+    
+    def row(self, position: int) -> Dict:
+        """Materialize one stored row as a column -> value dict"""
+        if position < 0 or position >= self.size:
+            raise IndexError(f"Row {position} is not in the store")
+        block_idx = bisect_right(self._starts, position) - 1
+        return self._blocks[block_idx].iloc[position - self._starts[block_idx]].to_dict()
+
+# The classes built per invoice, plan and customer (and their metrics) use
+# __slots__: a large export creates hundreds of thousands of them, and a
+# per-instance __dict__ is most of their size. Enum fields hold the shared
+# enum members, so each costs one slot.
+@dataclass(slots=True)
 class Invoice:
     """Represents a single invoice - enhanced with Class field"""
     invoice_number: str
@@ -48,7 +83,15 @@ class Invoice:
     original_amount: float
     open_balance: float
     class_field: Optional[str] = None  # The "Class" column (BR, TSA, KL, etc.)
-    raw_data: Dict = field(default_factory=dict)
+    row_index: Optional[int] = None  # Position of the source row in raw_store
+    raw_store: Optional[RawRowStore] = field(default=None, repr=False, compare=False)
+    
+    @property
+    def raw_data(self) -> Dict:
+        """Full source row, materialized from the parser's row store on demand"""
+        if self.raw_store is None or self.row_index is None:
+            return {}
+        return self.raw_store.row(self.row_index)
 
 @dataclass
 class CustomerIssue:
@@ -76,7 +119,7 @@ class CustomerIssue:
             'current_value': self.current_value
         }
 
-@dataclass
+@dataclass(slots=True)
 class PaymentPlan:
     """Enhanced payment plan supporting multiple plans per customer"""
     customer_name: str
@@ -94,8 +137,10 @@ class PaymentPlan:
     is_nested: bool = False
     parent_customer: Optional[str] = None
     payment_terms_raw: Optional[str] = None  # Store original payment terms string
+    # (key, plan_schedule.ScheduleFacts) of the last as-of date the schedule was computed for
+    schedule_cache: Optional[tuple] = field(default=None, repr=False, compare=False)
 
-@dataclass
+@dataclass(slots=True)
 class Customer:
     """New model to represent a customer with potentially multiple payment plans"""
     customer_name: str
@@ -108,7 +153,68 @@ class Customer:
     earliest_date: Optional[datetime] = None
     latest_date: Optional[datetime] = None
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class PaymentRoadmap(Sequence):
+    """A plan's upcoming payments, described by where they start rather than listed
+    
+    Payment k (from 0) is due `interval_months * k` months after `start` and
+    pays `amount`, or whatever is left of `balance` for the last one; at most
+    max_payments are scheduled. Entries are computed in closed form when they
+    are indexed, sliced or iterated, as the dicts roadmaps always held, so a
+    page of them costs only its own entries.
+    """
+    start: Optional[datetime] = None  # First payment date, on the payment day
+    interval_months: int = 1
+    amount: float = 0.0
+    balance: float = 0.0
+    frequency: str = 'monthly'
+    as_of: Optional[datetime] = None  # Payments dated before this are overdue
+    max_payments: int = 60  # Limit to 5 years
+    
+    def __len__(self) -> int:
+        if self.amount <= 0 or self.balance <= 0:
+            return 0
+        return min(math.ceil(self.balance / self.amount), self.max_payments)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._entry(i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Roadmap payment out of range")
+        return self._entry(index)
+    
+    def page(self, number: int, size: int = 6) -> List[Dict]:
+        """Entries of one page of `size` payments; page 1 is the next `size` payments"""
+        return self[(number - 1) * size:number * size]
+    
+    def to_dict(self) -> Dict:
+        """The descriptor itself, for JSON"""
+        return {
+            'start': self.start.strftime('%Y-%m-%d') if self.start else None,
+            'interval_months': self.interval_months,
+            'amount': self.amount,
+            'balance': self.balance,
+            'frequency': self.frequency,
+            'total_payments': len(self)
+        }
+    
+    def _entry(self, index: int) -> Dict:
+        months = self.start.month - 1 + index * self.interval_months
+        date = self.start.replace(year=self.start.year + months // 12, month=months % 12 + 1)
+        balance = self.balance - index * self.amount  # Left before this payment
+        payment = min(self.amount, balance)
+        return {
+            'payment_number': index + 1,
+            'date': date.strftime('%Y-%m-%d'),
+            'expected_payment': round(payment, 2),
+            'remaining_balance': round(balance - payment, 2),
+            'is_overdue': self.as_of is not None and date < self.as_of,
+            'description': f'Payment {index + 1} - {self.frequency}'
+        }
+
+@dataclass(slots=True)
 class PaymentMetrics:
     """Enhanced metrics with plan-specific tracking"""
     customer_name: str
@@ -127,7 +233,7 @@ class PaymentMetrics:
     projected_completion: Optional[datetime]
     months_remaining: float
     class_field: Optional[str] = None
-    payment_roadmap: List[Dict] = field(default_factory=list)  # Payment timeline
+    payment_roadmap: PaymentRoadmap = field(default_factory=PaymentRoadmap)  # Payment timeline
 
 @dataclass
 class DataQualityReport:
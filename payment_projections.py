@@ -3,7 +3,9 @@ FIXED Payment Projections Calculator - Handles Behind Customers Properly
 - Uses 15th of month for all payment dates
 - Provides scenarios for customers who need renegotiation
 - Always uses whole months (no decimals)
-- Caps deficits at balance owed
+- Months behind, payment counts and intervals come from the plan's shared
+  schedule (plan_schedule), so they match the plan's metrics when both are
+  evaluated as of the same date
 """
 
 from datetime import datetime, timedelta
@@ -12,6 +14,7 @@ from typing import List, Dict, Optional
 from dataclasses import dataclass
 import calendar
 import math
+from plan_schedule import plan_schedule
 
 @dataclass
 class PaymentProjection:
@@ -43,13 +46,9 @@ class CustomerProjection:
 class PaymentProjectionCalculator:
     """FIXED Payment projection calculator with proper behind customer handling"""
     
-    def __init__(self):
-        self.frequency_months = {
-            'monthly': 1,
-            'quarterly': 3, 
-            'bimonthly': 2,
-            'undefined': 1
-        }
+    def __init__(self, as_of: Optional[datetime] = None):
+        # Months behind and projected payment dates are relative to this date
+        self.as_of = as_of or datetime.now()
         self.payment_day = 15  # All payments on 15th of month
     
     def calculate_customer_projections(self, customers_data: Dict, months_ahead: int = 12, scenario: str = 'current') -> List[CustomerProjection]:
@@ -124,50 +123,8 @@ class PaymentProjectionCalculator:
             return self._project_current_customer(customer, valid_plans, months_ahead)
     
     def _calculate_months_behind_for_plan(self, plan) -> int:
-        """Calculate how many months behind a plan is - FIXED to whole numbers"""
-        if not plan.earliest_date:
-            return 0
-        
-        # Calculate months elapsed since first invoice
-        days_elapsed = (datetime.now() - plan.earliest_date).days
-        months_elapsed = math.ceil(days_elapsed / 30.44)  # Always round up
-        
-        # Calculate expected payments
-        if plan.frequency.value == 'monthly':
-            expected_payments = months_elapsed * plan.monthly_amount
-        elif plan.frequency.value == 'quarterly':
-            quarterly_periods = months_elapsed // 3
-            expected_payments = quarterly_periods * plan.monthly_amount
-        elif plan.frequency.value == 'bimonthly':
-            bimonthly_periods = months_elapsed // 2
-            expected_payments = bimonthly_periods * plan.monthly_amount
-        else:
-            expected_payments = months_elapsed * plan.monthly_amount
-        
-        # Calculate actual payments
-        actual_payments = plan.total_original - plan.total_open
-        
-        # Calculate months behind
-        payment_deficit = expected_payments - actual_payments
-        
-        if payment_deficit <= 0:
-            return 0
-        
-        # FIXED: Cap deficit at total owed and convert to months
-        capped_deficit = min(payment_deficit, plan.total_open)
-        
-        if plan.monthly_amount > 0:
-            months_behind_decimal = capped_deficit / plan.monthly_amount
-            
-            # Adjust for frequency
-            if plan.frequency.value == 'quarterly':
-                months_behind_decimal *= 3
-            elif plan.frequency.value == 'bimonthly':
-                months_behind_decimal *= 2
-            
-            return math.ceil(months_behind_decimal)  # Always whole numbers
-        
-        return 0
+        """Calculate how many months behind a plan is - whole numbers, as in the plan's metrics"""
+        return plan_schedule(plan, self.as_of).months_behind
     
     def _project_behind_customer_current(self, customer, all_plans, behind_plans, months_ahead) -> CustomerProjection:
         """Project what happens if behind customer continues current behavior"""
@@ -382,15 +339,15 @@ class PaymentProjectionCalculator:
     
     def _get_payment_date_for_month(self, month_number: int) -> datetime:
         """Get payment date for a given month (always 15th)"""
-        current_date = datetime.now()
-        target_date = current_date + relativedelta(months=month_number)
+        target_date = self.as_of + relativedelta(months=month_number)
         # Always use 15th of month
         return target_date.replace(day=self.payment_day)
     
     def _calculate_plan_payment_for_month(self, plan, month: int, scenario: str) -> Optional[Dict]:
         """FIXED: Calculate payment for specific plan and month"""
         
-        frequency_months = self._get_frequency_months(plan.frequency.value)
+        schedule = plan_schedule(plan, self.as_of)
+        frequency_months = schedule.interval_months
         
         # Check if this month is a payment month
         is_payment_month = ((month - 1) % frequency_months) == 0
@@ -401,8 +358,8 @@ class PaymentProjectionCalculator:
         # Calculate payment number
         payment_number = ((month - 1) // frequency_months) + 1
         
-        # Calculate total payments needed
-        total_payments_needed = math.ceil(plan.total_open / plan.monthly_amount)
+        # Total payments needed to pay off the open balance
+        total_payments_needed = schedule.payments_remaining
         
         if payment_number > total_payments_needed:
             return None
@@ -435,19 +392,12 @@ class PaymentProjectionCalculator:
             'remaining_balance': round(remaining_balance, 2)
         }
     
-    def _get_frequency_months(self, frequency: str) -> int:
-        """Get payment frequency in months"""
-        return self.frequency_months.get(frequency.lower(), 1)
-    
     def _get_plan_completion_month(self, plan) -> int:
         """Calculate completion month for current plan"""
         if plan.monthly_amount <= 0:
             return 0
         
-        frequency_months = self._get_frequency_months(plan.frequency.value)
-        total_payments = math.ceil(plan.total_open / plan.monthly_amount)
-        
-        return ((total_payments - 1) * frequency_months) + 1
+        return plan_schedule(plan, self.as_of).completion_month
     
     def _get_plan_completion_month_restart(self, plan) -> int:
         """Calculate completion month if plan restarts today"""
@@ -492,7 +442,7 @@ class PaymentProjectionCalculator:
             
             total_expected += month_total
             
-            month_date = datetime.now() + relativedelta(months=month)
+            month_date = self.as_of + relativedelta(months=month)
             
             monthly_summaries.append({
                 'month': month,
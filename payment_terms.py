@@ -0,0 +1,157 @@
+"""Payment terms normalization - compiled patterns with a bounded lookup cache
+
+Exports carry a few hundred distinct FOB strings spread over tens of thousands
+of invoices, so each distinct string is normalized once and served from cache.
+"""
+
+import re
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import pandas as pd
+from models import PaymentFrequency
+
+# Known misspellings in the FOB column. Corrections are applied in this order,
+# one after the other, so later entries also see the output of earlier ones.
+PAYMENT_TERM_CORRECTIONS = {
+    'quaterly': 'quarterly',
+    'qtrly': 'quarterly',
+    'montly': 'monthly',
+    'monthl;y': 'monthly',
+    'bimonthly': 'bimonthly',
+    'bi-monthly': 'bimonthly',
+    'a month': 'monthly',
+    'month': 'monthly',
+    'per month': 'monthly'
+}
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+class NormalizedTerms(NamedTuple):
+    """Everything the parser needs from one raw FOB string"""
+    key: str  # Grouping key for payment plans ("no_terms" when blank)
+    amount: float
+    frequency: PaymentFrequency
+    typo_issues: Tuple[Dict, ...]
+
+
+class PaymentTermsNormalizer:
+    """Normalizes payment terms text with precompiled patterns and an LRU cache"""
+
+    def __init__(self, corrections: Optional[Dict[str, str]] = None, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.corrections = dict(corrections or PAYMENT_TERM_CORRECTIONS)
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+        # One matcher for every typo; text without a match skips the correction pass
+        typos = sorted(self.corrections, key=len, reverse=True)
+        self._typo_pattern = re.compile('|'.join(re.escape(typo) for typo in typos))
+        self._whitespace_pattern = re.compile(r'\s+')
+        self._amount_pattern = re.compile(r'(\d+(?:\.\d{2})?)')
+        self._frequency_patterns = [
+            (PaymentFrequency.BIMONTHLY, re.compile(r'bimonthly|bi-monthly')),
+            (PaymentFrequency.QUARTERLY, re.compile(r'quarterly|qtrly')),
+            (PaymentFrequency.MONTHLY, re.compile(r'monthly|month|per month|a month')),
+        ]
+
+    def lookup(self, raw_terms) -> NormalizedTerms:
+        """Grouping key, amount, frequency and typos for a raw FOB value in one call"""
+        cache_key = None if pd.isna(raw_terms) else raw_terms
+
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(cache_key)
+            return cached
+
+        self.misses += 1
+        key = self.terms_key(raw_terms)
+        amount, frequency, typo_issues = self.parse_terms(key)
+        result = NormalizedTerms(key, amount, frequency, tuple(typo_issues))
+
+        self._cache[cache_key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def terms_key(self, payment_terms) -> str:
+        """Normalize payment terms to prevent over-segmentation of payment plans"""
+        if not payment_terms or pd.isna(payment_terms):
+            return "no_terms"
+
+        terms = self._apply_corrections(str(payment_terms).strip().lower())
+
+        # Standardize common variations
+        terms = self._whitespace_pattern.sub(' ', terms)
+        terms = terms.replace('per month', 'monthly')
+        terms = terms.replace('a month', 'monthly')
+        terms = terms.replace('each month', 'monthly')
+
+        return terms if terms != "" else "no_terms"
+
+    def parse_terms(self, terms) -> Tuple[float, PaymentFrequency, List[Dict]]:
+        """Amount, frequency and issues found in a payment terms string"""
+        issues_found = []
+
+        if pd.isna(terms) or not terms:
+            return (0.0, PaymentFrequency.UNDEFINED, issues_found)
+
+        original_terms = str(terms).strip()
+        terms_lower = self._apply_corrections(original_terms.lower(), issues_found, original_terms)
+
+        amount_match = self._amount_pattern.search(terms_lower)
+        amount = float(amount_match.group(1)) if amount_match else 0.0
+
+        for frequency, pattern in self._frequency_patterns:
+            if pattern.search(terms_lower):
+                break
+        else:
+            frequency = PaymentFrequency.UNDEFINED
+            if amount > 0:
+                issues_found.append({
+                    'original': original_terms,
+                    'issue': 'unclear_frequency',
+                    'suggested': 'Specify monthly, quarterly, or bimonthly',
+                    'field': 'payment_terms',
+                    'type': 'unclear_terms'
+                })
+
+        return (amount, frequency, issues_found)
+
+    def _apply_corrections(self, text: str, issues_found: Optional[List[Dict]] = None,
+                           original_terms: Optional[str] = None) -> str:
+        """Apply typo corrections in order, recording each real typo when asked"""
+        if not self._typo_pattern.search(text):
+            return text
+
+        for typo, correction in self.corrections.items():
+            if typo in text:
+                if issues_found is not None and typo != correction:
+                    issues_found.append({
+                        'original': original_terms,
+                        'typo': typo,
+                        'suggested': correction,
+                        'field': 'payment_terms',
+                        'type': 'typo'
+                    })
+                text = text.replace(typo, correction)
+        return text
+
+    def cache_info(self) -> Dict:
+        """Hit/miss counters for the lookup cache"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'max_size': self.cache_size,
+            'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0
+        }
+
+    def clear_cache(self):
+        """Drop cached entries and reset the counters"""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,102 @@
+"""Where one payment plan's schedule stands as of a date
+
+Months elapsed, expected payments, months behind, payments remaining and the
+payment interval are what EnhancedPaymentCalculator builds a plan's metrics
+and roadmap from and what PaymentProjectionCalculator builds its projections
+from. plan_schedule() computes them once per plan and as-of date and keeps
+them on the plan, keyed by the plan fields they depend on, so a projection
+that asks once per projected month reuses them. Given the same as-of date -
+an analysis run's results['as_of'] - the two calculators agree about a plan.
+PlanMetricsEngine evaluates the same arithmetic over many plans at once.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from models import PaymentFrequency, PaymentPlan
+
+DAYS_PER_MONTH = 30.44  # Average days per month
+
+# Months per payment; undefined frequencies are laid out monthly but expect no payments
+INTERVAL_MONTHS = {
+    PaymentFrequency.MONTHLY: 1,
+    PaymentFrequency.QUARTERLY: 3,
+    PaymentFrequency.BIMONTHLY: 2,
+    PaymentFrequency.UNDEFINED: 1
+}
+
+
+@dataclass(slots=True)
+class ScheduleFacts:
+    """A plan's schedule as of one date; months are whole, always rounded up"""
+    as_of: datetime
+    interval_months: int
+    months_elapsed: Optional[int]  # None without an earliest invoice date
+    expected_payments: float
+    actual_payments: float
+    payment_difference: float  # Actual minus expected; negative when behind
+    months_behind: int
+    payments_remaining: int  # Payments of the plan amount that pay off the open balance
+
+    @property
+    def months_remaining(self) -> int:
+        """Months until the open balance is paid off on schedule"""
+        return self.payments_remaining * self.interval_months
+
+    @property
+    def completion_month(self) -> int:
+        """Projected month (1 = the next payment's) of the final payment"""
+        return (self.payments_remaining - 1) * self.interval_months + 1
+
+
+def plan_schedule(plan: PaymentPlan, as_of: datetime) -> ScheduleFacts:
+    """The plan's ScheduleFacts as of `as_of`, from the plan's cache when still valid"""
+    key = (as_of, plan.monthly_amount, plan.frequency, plan.total_original, plan.total_open, plan.earliest_date)
+    cached = plan.schedule_cache
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    facts = _compute_schedule(plan, as_of)
+    plan.schedule_cache = (key, facts)
+    return facts
+
+
+def _compute_schedule(plan: PaymentPlan, as_of: datetime) -> ScheduleFacts:
+    interval_months = INTERVAL_MONTHS.get(plan.frequency, 1)
+    actual_payments = plan.total_original - plan.total_open
+
+    if plan.earliest_date:
+        months_elapsed = math.ceil((as_of - plan.earliest_date).days / DAYS_PER_MONTH)
+    else:
+        months_elapsed = None
+
+    # One payment per interval so far; nothing is expected without a start or terms
+    if months_elapsed is None or plan.frequency is PaymentFrequency.UNDEFINED:
+        expected_payments = 0.0
+    else:
+        expected_payments = (months_elapsed // interval_months) * plan.monthly_amount
+    payment_difference = actual_payments - expected_payments
+
+    # Each missed payment is a whole interval behind
+    if months_elapsed is None or payment_difference >= 0 or plan.monthly_amount <= 0:
+        months_behind = 0
+    else:
+        months_behind = math.ceil(-payment_difference / plan.monthly_amount * interval_months)
+
+    if plan.monthly_amount > 0 and plan.total_open > 0:
+        payments_remaining = math.ceil(plan.total_open / plan.monthly_amount)
+    else:
+        payments_remaining = 0
+
+    return ScheduleFacts(
+        as_of=as_of,
+        interval_months=interval_months,
+        months_elapsed=months_elapsed,
+        expected_payments=expected_payments,
+        actual_payments=actual_payments,
+        payment_difference=payment_difference,
+        months_behind=months_behind,
+        payments_remaining=payments_remaining
+    )
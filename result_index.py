@@ -0,0 +1,133 @@
+"""Lookup tables over the results of an analysis
+
+A ResultIndex is built once an analysis finishes (or its results are
+restored) and maps customers, plan ids, classes, issue types and severities
+to the customers, plans, issues and metrics they select, so accessors answer
+from a dict lookup instead of scanning every result. Lists keep the order of
+the analysis: customers as parsed, issues as EnhancedIssueAnalyzer.issues
+lists them.
+
+A plan's issues count towards the plan's dominant class; customer-level issues
+count towards every class the customer has invoices in, as customers do.
+
+An InvoiceIssueIndex inverts issues onto the invoices they list, for the
+error highlighting that shows every invoice row with its issues.
+"""
+
+from collections import defaultdict
+from functools import cached_property
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import Customer, CustomerIssue, ErrorType, IssueSeverity, PaymentMetrics, PaymentPlan
+
+
+class ResultIndex:
+    """Customers, plans, issues and metrics of one analysis, keyed every way they are looked up"""
+
+    def __init__(self, customers: Dict[str, Customer], issues_by_customer: Dict[str, List[CustomerIssue]]):
+        self.customers = customers
+        self.issues_by_customer = issues_by_customer
+        self.plans: Dict[str, PaymentPlan] = {}
+        self.customers_by_class: Dict[str, List[Customer]] = {}
+        self.issues_by_plan: Dict[str, List[CustomerIssue]] = {}
+        self.metrics_by_customer: Dict[str, List[PaymentMetrics]] = {}
+        self.metrics_by_plan: Dict[str, PaymentMetrics] = {}
+        self.metrics_by_class: Dict[str, List[PaymentMetrics]] = {}
+
+        by_type, by_severity, by_class = defaultdict(list), defaultdict(list), defaultdict(list)
+        for customer_name, customer in customers.items():
+            for class_name in customer.all_classes:
+                self.customers_by_class.setdefault(class_name, []).append(customer)
+
+            # Plan issues come first, plan by plan, then the customer-level issues
+            issues = issues_by_customer.get(customer_name, [])
+            issue_classes = []
+            for plan in customer.payment_plans:
+                self.plans[plan.plan_id] = plan
+                self.issues_by_plan[plan.plan_id] = plan.issues
+                issue_classes.extend([[plan.class_filter] if plan.class_filter else []] * len(plan.issues))
+            issue_classes.extend([customer.all_classes] * (len(issues) - len(issue_classes)))
+
+            for issue, classes in zip(issues, issue_classes):
+                by_type[issue.issue_type].append(issue)
+                by_severity[issue.severity].append(issue)
+                for class_name in classes:
+                    by_class[class_name].append(issue)
+
+        self.issues_by_type: Dict[ErrorType, List[CustomerIssue]] = dict(by_type)
+        self.issues_by_severity: Dict[IssueSeverity, List[CustomerIssue]] = dict(by_severity)
+        self.issues_by_class: Dict[str, List[CustomerIssue]] = dict(by_class)
+
+    @cached_property
+    def invoice_issues(self) -> 'InvoiceIssueIndex':
+        """Issues by the invoices they list, built on first use"""
+        return InvoiceIssueIndex(self.customers, self.issues_by_customer)
+
+    def add_metrics(self, metrics: Iterable[PaymentMetrics]):
+        """Index the plan metrics calculated for the analyzed customers"""
+        for metric in metrics:
+            self.metrics_by_customer.setdefault(metric.customer_name, []).append(metric)
+            self.metrics_by_plan[metric.plan_id] = metric
+            self.metrics_by_class.setdefault(metric.class_field, []).append(metric)
+
+
+SEVERITY_ORDER = (IssueSeverity.CRITICAL, IssueSeverity.WARNING, IssueSeverity.INFO)  # Most severe first
+
+
+def worst_severity(issues: List[CustomerIssue]) -> Optional[IssueSeverity]:
+    """The most severe of some issues, None without any"""
+    ranks = [SEVERITY_ORDER.index(issue.severity) for issue in issues]
+    return SEVERITY_ORDER[min(ranks)] if ranks else None
+
+
+class InvoiceIssueIndex:
+    """Issues keyed by the invoice numbers they list
+
+    Issues listing no invoices (a nested customer, mixed classes) concern every
+    invoice of their customer and are kept per customer instead. Each mapping
+    is built the first time it is looked up.
+    """
+
+    def __init__(self, customers: Dict[str, Customer], issues_by_customer: Dict[str, List[CustomerIssue]]):
+        self.customers = customers
+        self.issues_by_customer = issues_by_customer
+
+    @cached_property
+    def _listed(self) -> Dict[Tuple[str, str], List[Tuple[int, CustomerIssue]]]:
+        """(customer, invoice number) -> (position in the customer's issues, issue) of issues listing it"""
+        listed = defaultdict(list)
+        for customer_name, issues in self.issues_by_customer.items():
+            for position, issue in enumerate(issues):
+                for invoice_number in dict.fromkeys(issue.affected_invoices):  # Each number once per issue
+                    listed[customer_name, invoice_number].append((position, issue))
+        return listed
+
+    @cached_property
+    def _unlisted(self) -> Dict[str, List[Tuple[int, CustomerIssue]]]:
+        """customer -> (position, issue) of issues listing no invoices"""
+        return {customer_name: [(position, issue) for position, issue in enumerate(issues)
+                                if not issue.affected_invoices]
+                for customer_name, issues in self.issues_by_customer.items()}
+
+    @cached_property
+    def _plan_listed(self) -> Dict[Tuple[str, str], List[CustomerIssue]]:
+        """(plan id, invoice number) -> issues found on that plan listing it"""
+        plan_listed = defaultdict(list)
+        for customer in self.customers.values():
+            for plan in customer.payment_plans:
+                for issue in plan.issues:
+                    for invoice_number in dict.fromkeys(issue.affected_invoices):
+                        plan_listed[plan.plan_id, invoice_number].append(issue)
+        return plan_listed
+
+    def plan_issues(self, plan_id: str, invoice_number: str) -> List[CustomerIssue]:
+        """Issues found on one plan that list an invoice"""
+        return self._plan_listed.get((plan_id, invoice_number), [])
+
+    def row_issues(self, customer_name: str, invoice_number: str) -> List[CustomerIssue]:
+        """All of a customer's issues that concern an invoice: those listing it and those listing none"""
+        listed = self._listed.get((customer_name, invoice_number), [])
+        unlisted = self._unlisted.get(customer_name)
+        if unlisted:
+            listed = sorted(listed + unlisted, key=lambda entry: entry[0])
+        return [issue for _, issue in listed]
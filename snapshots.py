@@ -0,0 +1,181 @@
+"""On-disk snapshots of parsed results and a content-addressed cache built on them
+
+A snapshot is a compressed pickle of what the parser produced for one export
+(customers with their plans and invoices, tracked errors, the data quality
+report). ParseCache stores snapshots under the SHA-256 of the export bytes, so
+uploading the same file again skips parsing entirely. The analysis system
+saves its full results the same way, so the web app can restart warm.
+"""
+
+import gc
+import gzip
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.snapshot.gz'
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+DEFAULT_CACHE_ENTRIES = 32
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def write_snapshot(path, payload: Any, compresslevel: int = 1) -> int:
+    """Pickle and gzip `payload` to `path` atomically; returns the size written"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=compresslevel) as out:
+            pickle.dump(payload, out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path.stat().st_size
+
+
+def read_snapshot(path) -> Any:
+    """Load a snapshot written by write_snapshot"""
+    with gzip.open(path, 'rb') as source, paused_gc():
+        return pickle.load(source)
+
+
+def latest_snapshot(directory) -> Optional[Path]:
+    """Most recently written snapshot in `directory`, if there is one"""
+    paths = list(Path(directory).glob(f'*{SNAPSHOT_SUFFIX}')) if Path(directory).is_dir() else []
+    return max(paths, key=lambda path: path.stat().st_mtime, default=None)
+
+
+@contextmanager
+def paused_gc():
+    """Keep the cyclic garbage collector off while a large object graph is unpickled
+
+    Rebuilding hundreds of thousands of customers, plans and invoices otherwise
+    sets off repeated full collections that find nothing to free and more
+    than double the load time.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def file_digest(file_path) -> str:
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as source:
+        for block in iter(lambda: source.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Snapshots of parsed exports keyed by content hash, with LRU eviction
+
+    Recency is the snapshot file's modification time, touched on every hit, so
+    the order survives restarts. After each store the least recently used
+    snapshots are removed until both the entry and the byte limits hold.
+    """
+
+    def __init__(self, cache_dir, max_bytes: int = DEFAULT_CACHE_BYTES,
+                 max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def key_for_file(self, file_path, version: str) -> str:
+        """Cache key: content hash of the export plus everything the parse depends on"""
+        return f"{file_digest(file_path)}-{version}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Snapshot payload for `key`, or None on a miss or an unreadable entry"""
+        path = self._path(key)
+        try:
+            payload = read_snapshot(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            # Truncated or written by an incompatible version - drop it
+            logger.warning("⚠️  Discarding unreadable parse cache entry %s: %s", path.name, e)
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        os.utime(path)
+        return payload
+
+    def put(self, key: str, payload: Any) -> int:
+        """Store a snapshot and evict old entries; returns the snapshot size"""
+        size = write_snapshot(self._path(key), payload)
+        self._evict()
+        return size
+
+    def clear(self):
+        """Remove every snapshot"""
+        for path in self._entries():
+            self._remove(path)
+
+    def cache_info(self) -> Dict:
+        """Hit/miss counters and current footprint"""
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(self._size(path) for path in entries),
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes
+        }
+
+    def _evict(self):
+        """Drop least recently used snapshots until both limits hold"""
+        entries = sorted(self._entries(), key=self._mtime)
+        total_bytes = sum(self._size(path) for path in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            oldest = entries.pop(0)
+            total_bytes -= self._size(oldest)
+            self._remove(oldest)
+            logger.debug("🗑️  Evicted parse cache entry %s", oldest.name)
+
+    def _entries(self):
+        return list(self.cache_dir.glob(f'*{SNAPSHOT_SUFFIX}'))
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f'{key}{SNAPSHOT_SUFFIX}'
+
+    @staticmethod
+    def _mtime(path: Path) -> float:
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    @staticmethod
+    def _size(path: Path) -> int:
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,53 @@
+"""Incremental runs must produce what a fresh analysis of the same export does"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enhanced_main import EnhancedPaymentPlanAnalysisSystem
+
+EXPORT = """\
+,,,Type,Date,Num,FOB,Class,Amount,Open Balance
+,Customer A,,,,,,,,
+,Customer A,,Invoice,01/10/2025,1001,$250 per month,TSA,"3,000.00",2500.00
+,,,Invoice,02/10/2025,1002,$250 per month,TSA,1000.00,1000.00
+,Total Customer A,,,,,,,,
+,Customer B,,,,,,,,
+,Customer B,,Invoice,03/05/2024,2001,200 quarterly,BR,4800.00,1200.00
+,Total Customer B,,,,,,,,
+,Customer C,,,,,,,,
+,Customer C,,Invoice,06/20/2025,3001,$100 per month,KL,900.00,900.00
+,Total Customer C,,,,,,,,
+"""
+
+
+def _metrics(results):
+    """Every field of every plan's metrics, roadmap entries included"""
+    return {
+        metrics.plan_id: ([getattr(metrics, name) for name in metrics.__slots__ if name != 'payment_roadmap'],
+                          list(metrics.payment_roadmap))
+        for metrics in results['all_metrics']
+    }
+
+
+@pytest.mark.parametrize('first_day', [14, 15, 16])
+def test_incremental_run_matches_fresh_run_across_payment_day(tmp_path, first_day):
+    export = tmp_path / 'export.csv'
+    export.write_text(EXPORT)
+    first_as_of = datetime(2025, 7, first_day, 10)
+    next_as_of = datetime(2025, 7, first_day + 1, 10)
+
+    first = EnhancedPaymentPlanAnalysisSystem(str(tmp_path / 'first'), quiet=True, incremental=True,
+                                              as_of=first_as_of)
+    first.analyze_file(str(export))
+    incremental = EnhancedPaymentPlanAnalysisSystem(str(tmp_path / 'incremental'), quiet=True, incremental=True,
+                                                    previous_state=first.analysis_state, as_of=next_as_of)
+    fresh = EnhancedPaymentPlanAnalysisSystem(str(tmp_path / 'fresh'), quiet=True, as_of=next_as_of)
+
+    expected = _metrics(fresh.analyze_file(str(export)))
+    assert expected
+    assert _metrics(incremental.analyze_file(str(export))) == expected
@@ -0,0 +1,60 @@
+"""Analyzing plans spilled to an invoice store"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import enhanced_analyzers
+from enhanced_main import EnhancedPaymentPlanAnalysisSystem
+from invoice_store import InvoiceView, SQLiteInvoiceStore
+from invoice_table import InvoiceTable
+
+
+def _write_export(path, customers=60):
+    lines = [',,,Type,Date,Num,FOB,Class,Amount,Open Balance']
+    for number in range(customers):
+        name = f'Customer {number:03d}'
+        lines.append(f',{name},,,,,,,,')
+        for invoice in range(number % 3 + 1):
+            terms = '$250 per month' if number % 4 else '200 quarterly'
+            future = '2031' if number % 7 == 0 and invoice == 0 else '2024'
+            lines.append(f',{name},,Invoice,03/{invoice + 10}/{future},{number * 10 + invoice},{terms},TSA,'
+                         f'1000.00,{(number * 37 + invoice * 11) % 1000}.00')
+        lines.append(f',Total {name},,,,,,,,')
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def _issues(analyzer):
+    return [issue.to_dict() for issue in analyzer.issues]
+
+
+def test_spilled_plans_are_checked_in_bounded_batches(tmp_path, monkeypatch):
+    export = tmp_path / 'export.csv'
+    _write_export(export)
+    in_memory = EnhancedPaymentPlanAnalysisSystem(str(tmp_path / 'memory'), quiet=True)
+    in_memory.analyze_file(str(export))
+
+    table_sizes = []
+    from_customers = InvoiceTable.from_customers.__func__
+
+    def recording_from_customers(cls, customers):
+        table = from_customers(cls, customers)
+        table_sizes.append(len(table.invoices))
+        return table
+
+    monkeypatch.setattr(enhanced_analyzers, 'SPILLED_BATCH_INVOICES', 10)
+    monkeypatch.setattr(InvoiceTable, 'from_customers', classmethod(recording_from_customers))
+    store = SQLiteInvoiceStore()
+    try:
+        spilled = EnhancedPaymentPlanAnalysisSystem(str(tmp_path / 'spilled'), quiet=True, invoice_store=store)
+        results = spilled.analyze_file(str(export))
+
+        plans = [plan for customer in results['all_customers'].values() for plan in customer.payment_plans]
+        assert plans and all(isinstance(plan.invoices, InvoiceView) for plan in plans)
+        assert len(table_sizes) > 1
+        assert max(table_sizes) <= 10
+        assert _issues(in_memory.analyzer)
+        assert _issues(spilled.analyzer) == _issues(in_memory.analyzer)
+    finally:
+        store.close()
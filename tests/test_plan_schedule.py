@@ -0,0 +1,56 @@
+"""Metrics and projections of one analysis read the same plan schedule"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from enhanced_main import EnhancedPaymentPlanAnalysisSystem
+from models import PaymentFrequency, PaymentPlan
+from payment_projections import PaymentProjectionCalculator
+from plan_schedule import plan_schedule
+from test_incremental import EXPORT
+
+
+def test_projection_months_behind_match_metrics_of_the_run(tmp_path):
+    export = tmp_path / 'export.csv'
+    export.write_text(EXPORT)
+    system = EnhancedPaymentPlanAnalysisSystem(str(tmp_path / 'reports'), quiet=True, as_of=datetime(2025, 7, 20))
+    results = system.analyze_file(str(export))
+
+    projections = PaymentProjectionCalculator(results['as_of'])
+    plans = {plan.plan_id: plan for customer in results['all_customers'].values() for plan in customer.payment_plans}
+    assert results['all_metrics']
+    for metrics in results['all_metrics']:
+        plan = plans[metrics.plan_id]
+        assert projections._calculate_months_behind_for_plan(plan) == metrics.months_behind
+
+
+def _plan(frequency, total_original, total_open, monthly_amount=100.0):
+    return PaymentPlan('Customer', 'Customer_plan_1', monthly_amount, frequency, total_original, total_open, [],
+                       datetime(2024, 1, 10), datetime(2024, 1, 10))
+
+
+def test_undefined_frequency_expects_no_payments():
+    as_of = datetime(2025, 7, 20)
+    plan = _plan(PaymentFrequency.UNDEFINED, total_original=3000.0, total_open=3000.0)
+
+    schedule = plan_schedule(plan, as_of)
+    assert schedule.months_elapsed == 19
+    assert schedule.expected_payments == 0.0
+    assert schedule.months_behind == 0
+    assert PaymentProjectionCalculator(as_of)._calculate_months_behind_for_plan(plan) == 0
+
+
+def test_months_behind_are_not_capped_at_the_open_balance():
+    as_of = datetime(2025, 7, 20)
+    # 19 monthly payments of 100 expected, 600 paid: 1300 short with 400 left to pay
+    monthly = _plan(PaymentFrequency.MONTHLY, total_original=1000.0, total_open=400.0)
+    # 6 quarterly payments of 100 expected, 200 paid: 400 short with 300 left to pay
+    quarterly = _plan(PaymentFrequency.QUARTERLY, total_original=500.0, total_open=300.0)
+
+    projections = PaymentProjectionCalculator(as_of)
+    for plan, months_behind in ((monthly, 13), (quarterly, 12)):
+        assert plan_schedule(plan, as_of).months_behind == months_behind
+        assert projections._calculate_months_behind_for_plan(plan) == months_behind